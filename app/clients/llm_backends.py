@@ -0,0 +1,266 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from typing import Callable
+import json
+import threading
+import requests
+from core.settings import settings
+from clients.model_residency import residency
+
+SAMPLING = {"temperature": 0.2, "top_p": 0.9}
+
+
+def _error(e: Exception) -> dict:
+    return {"text": "", "eval_count": 0, "done_reason": "error", "error": str(e)}
+
+
+class LLMBackend:
+    """Text-generation backend behind `ollama_client.call_llm`.
+
+    `generate` returns {"text", "eval_count", "done_reason"} and raises on
+    transport errors; `generate_batch` returns one such dict per prompt, with
+    an "error" key instead of raising for the prompts that failed."""
+
+    name = ""
+
+    def __init__(self, max_parallel: int = 4):
+        self.max_parallel = max(1, int(max_parallel))
+
+    def generate(
+        self,
+        prompt: str,
+        model: str,
+        num_predict: int,
+        timeout: float,
+        stop: list[str] | None = None,
+        cancel: Callable[[str], bool] | None = None,
+        keep_alive: str | None = None,
+    ) -> dict:
+        raise NotImplementedError
+
+    def generate_batch(
+        self,
+        prompts: list[str],
+        model: str,
+        num_predict: int,
+        timeout: float,
+        stop: list[str] | None = None,
+        keep_alive: str | None = None,
+    ) -> list[dict]:
+        # 預設：同時送出多個請求，交給伺服器端的 parallel / continuous batching
+        def one(prompt: str) -> dict:
+            try:
+                return self.generate(prompt, model, num_predict, timeout, stop=stop, keep_alive=keep_alive)
+            except Exception as e:
+                return _error(e)
+
+        if not prompts:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(prompts), self.max_parallel)) as pool:
+            return list(pool.map(one, prompts))
+
+
+class OllamaBackend(LLMBackend):
+    """Ollama `/api/generate`, one prompt per call (batches run concurrently,
+    bounded by the server's OLLAMA_NUM_PARALLEL)."""
+
+    name = "ollama"
+
+    def _url(self) -> str:
+        return f"{settings.OLLAMA_BASE_URL.rstrip('/')}/api/generate"
+
+    def generate(self, prompt, model, num_predict, timeout, stop=None, cancel=None, keep_alive=None) -> dict:
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": cancel is not None,
+            "options": {**SAMPLING, "num_predict": num_predict, "repeat_penalty": 1.05},
+        }
+        if stop:
+            payload["options"]["stop"] = list(stop)
+        if keep_alive:
+            payload["keep_alive"] = keep_alive
+        if cancel is not None:
+            return self._stream(payload, timeout, cancel)
+
+        r = requests.post(self._url(), json=payload, timeout=timeout)
+        r.raise_for_status()
+        body = r.json()
+        residency.observe(model, body)
+        return {
+            "text": body.get("response") or "",
+            "eval_count": int(body.get("eval_count") or 0),
+            "done_reason": body.get("done_reason") or "",
+        }
+
+    def _stream(self, payload: dict, timeout: float, cancel: Callable[[str], bool]) -> dict:
+        started = monotonic()
+        parts: list[str] = []
+        chunks = 0
+        final: dict | None = None
+        with requests.post(self._url(), json=payload, timeout=timeout, stream=True) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("done"):
+                    final = chunk
+                    break
+                parts.append(chunk.get("response") or "")
+                chunks += 1
+                if cancel("".join(parts)):
+                    break
+                if monotonic() - started > timeout:
+                    raise TimeoutError(f"generation exceeded {timeout:.0f}s")
+        # 離開 with 會關閉連線，Ollama 隨即中止這次生成
+
+        if final is None:
+            return {"text": "".join(parts), "eval_count": chunks, "done_reason": "cancelled"}
+        residency.observe(payload["model"], final)
+        return {
+            "text": "".join(parts),
+            "eval_count": int(final.get("eval_count") or chunks),
+            "done_reason": final.get("done_reason") or "",
+        }
+
+
+class OpenAICompatBackend(LLMBackend):
+    """OpenAI-compatible `/v1/completions` (vLLM, llama.cpp server, TGI, ...).
+
+    With `batch_prompts`, a batch is sent as one request with a list `prompt`,
+    which continuous-batching servers schedule together; otherwise the prompts
+    are sent as concurrent requests. Only temperature / top_p are sent as
+    sampling options so strict servers accept the payload."""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        api_key: str | None = None,
+        model: str | None = None,
+        batch_prompts: bool = True,
+        max_parallel: int = 8,
+    ):
+        super().__init__(max_parallel=max_parallel)
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.batch_prompts = batch_prompts
+
+    def _url(self) -> str:
+        base = (self.base_url or settings.LLM_BASE_URL).rstrip("/")
+        if base.endswith("/v1"):
+            base = base[:-3]
+        return f"{base}/v1/completions"
+
+    def _headers(self) -> dict:
+        key = self.api_key if self.api_key is not None else settings.LLM_API_KEY
+        return {"Authorization": f"Bearer {key}"} if key else {}
+
+    def _payload(self, prompt, model: str, num_predict: int, stop: list[str] | None, stream: bool) -> dict:
+        payload = {
+            "model": self.model or model,
+            "prompt": prompt,
+            "max_tokens": num_predict,
+            "stream": stream,
+            **SAMPLING,
+        }
+        if stop:
+            payload["stop"] = list(stop)
+        return payload
+
+    def generate(self, prompt, model, num_predict, timeout, stop=None, cancel=None, keep_alive=None) -> dict:
+        payload = self._payload(prompt, model, num_predict, stop, stream=cancel is not None)
+        if cancel is not None:
+            return self._stream(payload, timeout, cancel)
+        r = requests.post(self._url(), json=payload, headers=self._headers(), timeout=timeout)
+        r.raise_for_status()
+        body = r.json()
+        choice = (body.get("choices") or [{}])[0]
+        return {
+            "text": choice.get("text") or "",
+            "eval_count": int((body.get("usage") or {}).get("completion_tokens") or 0),
+            "done_reason": choice.get("finish_reason") or "",
+        }
+
+    def _stream(self, payload: dict, timeout: float, cancel: Callable[[str], bool]) -> dict:
+        started = monotonic()
+        parts: list[str] = []
+        chunks = 0
+        finish = ""
+        with requests.post(self._url(), json=payload, headers=self._headers(),
+                           timeout=timeout, stream=True) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line or not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                choice = (json.loads(data).get("choices") or [{}])[0]
+                parts.append(choice.get("text") or "")
+                chunks += 1
+                if choice.get("finish_reason"):
+                    finish = choice["finish_reason"]
+                    break
+                if cancel("".join(parts)):
+                    finish = "cancelled"
+                    break
+                if monotonic() - started > timeout:
+                    raise TimeoutError(f"generation exceeded {timeout:.0f}s")
+        return {"text": "".join(parts), "eval_count": chunks, "done_reason": finish}
+
+    def generate_batch(self, prompts, model, num_predict, timeout, stop=None, keep_alive=None) -> list[dict]:
+        if not self.batch_prompts or len(prompts) <= 1:
+            return super().generate_batch(prompts, model, num_predict, timeout, stop=stop)
+        try:
+            r = requests.post(
+                self._url(),
+                json=self._payload(list(prompts), model, num_predict, stop, stream=False),
+                headers=self._headers(),
+                timeout=timeout,
+            )
+            r.raise_for_status()
+            body = r.json()
+        except Exception as e:
+            return [_error(e) for _ in prompts]
+
+        results = [_error(RuntimeError("missing choice")) for _ in prompts]
+        for pos, choice in enumerate(body.get("choices") or []):
+            idx = choice.get("index", pos)
+            if 0 <= idx < len(prompts):
+                # usage 只有整批總數，逐題 token 數無法得知
+                results[idx] = {
+                    "text": choice.get("text") or "",
+                    "eval_count": 0,
+                    "done_reason": choice.get("finish_reason") or "",
+                }
+        return results
+
+
+_BACKEND: LLMBackend | None = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def make_backend(name: str) -> LLMBackend:
+    name = (name or "ollama").strip().lower()
+    if name in ("openai", "openai_compat", "vllm"):
+        return OpenAICompatBackend(
+            model=settings.LLM_MODEL or None,
+            batch_prompts=settings.LLM_BATCH_PROMPTS,
+            max_parallel=settings.LLM_BATCH_PARALLEL,
+        )
+    if name != "ollama":
+        raise ValueError(f"Unknown LLM_BACKEND: {name}")
+    return OllamaBackend(max_parallel=settings.LLM_BATCH_PARALLEL)
+
+
+def get_backend() -> LLMBackend:
+    global _BACKEND
+    if _BACKEND is None:
+        with _BACKEND_LOCK:
+            if _BACKEND is None:
+                _BACKEND = make_backend(settings.LLM_BACKEND)
+    return _BACKEND
@@ -0,0 +1,215 @@
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
+import math
+import threading
+from fastapi import HTTPException, status
+from core.settings import settings
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+# Per-request admission context, set by the routers (priority + X-API-KEY caller)
+_REQUEST_CONTEXT: ContextVar[dict | None] = ContextVar("llm_request_context", default=None)
+
+
+@contextmanager
+def request_context(priority: str = "batch", caller: str = "", deadline_s: float | None = None):
+    token = _REQUEST_CONTEXT.set({
+        "priority": priority if priority in PRIORITIES else "batch",
+        "caller": caller or "",
+        "deadline_s": deadline_s,
+    })
+    try:
+        yield
+    finally:
+        _REQUEST_CONTEXT.reset(token)
+
+
+def current_context() -> dict:
+    return _REQUEST_CONTEXT.get() or {"priority": "batch", "caller": "", "deadline_s": None}
+
+
+class _Waiter:
+    __slots__ = ("priority", "caller", "granted")
+
+    def __init__(self, priority: int, caller: str):
+        self.priority = priority
+        self.caller = caller
+        self.granted = False
+
+
+class LLMScheduler:
+    """Bounded in-flight LLM generations with a priority wait queue.
+
+    Interactive traffic is always dispatched before batch traffic; inside one
+    priority class callers are served round-robin. A request whose estimated
+    queue wait exceeds its deadline is rejected immediately with 503."""
+
+    def __init__(self, max_inflight: int, service_time_s: float = 8.0, ewma_alpha: float = 0.2):
+        self.max_inflight = max(0, int(max_inflight))
+        self.service_time_s = float(service_time_s)
+        self.ewma_alpha = ewma_alpha
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._queues: dict[int, OrderedDict[str, deque]] = {p: OrderedDict() for p in sorted(PRIORITIES.values())}
+        self.admitted = 0
+        self.rejected = 0
+        self.queued_total = 0
+
+    def _queued_ahead(self, priority: int) -> int:
+        return sum(
+            len(dq)
+            for p, callers in self._queues.items() if p <= priority
+            for dq in callers.values()
+        )
+
+    def estimate_wait(self, priority: int) -> float:
+        if self.max_inflight <= 0:
+            return 0.0
+        ahead = self._queued_ahead(priority)
+        busy = max(0, self._inflight - self.max_inflight + 1)
+        if ahead == 0 and self._inflight < self.max_inflight:
+            return 0.0
+        return self.service_time_s * (ahead + busy) / self.max_inflight
+
+    def _reject(self, wait_s: float, reason: str):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"LLM busy ({reason}); estimated wait {wait_s:.1f}s",
+            headers={"Retry-After": str(max(1, math.ceil(wait_s)))},
+        )
+
+    def _next_waiter(self) -> _Waiter | None:
+        for callers in self._queues.values():
+            if callers:
+                caller, dq = next(iter(callers.items()))
+                waiter = dq.popleft()
+                if dq:
+                    callers.move_to_end(caller)
+                else:
+                    del callers[caller]
+                return waiter
+        return None
+
+    def _dispatch(self) -> None:
+        while self._inflight < self.max_inflight:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            waiter.granted = True
+            self._inflight += 1
+        self._cond.notify_all()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        callers = self._queues[waiter.priority]
+        dq = callers.get(waiter.caller)
+        if dq is not None and waiter in dq:
+            dq.remove(waiter)
+            if not dq:
+                del callers[waiter.caller]
+
+    def acquire(self, priority: str = "batch", caller: str = "", deadline_s: float | None = None) -> None:
+        if self.max_inflight <= 0:
+            return
+        prio = PRIORITIES.get(priority, PRIORITIES["batch"])
+        with self._cond:
+            if self._inflight < self.max_inflight and self._queued_ahead(max(PRIORITIES.values())) == 0:
+                self._inflight += 1
+                self.admitted += 1
+                return
+            est = self.estimate_wait(prio)
+            if deadline_s is not None and est > deadline_s:
+                self._reject(est, "queue wait exceeds deadline")
+
+            waiter = _Waiter(prio, caller)
+            self._queues[prio].setdefault(caller, deque()).append(waiter)
+            self.queued_total += 1
+            expires = None if deadline_s is None else monotonic() + deadline_s
+            while not waiter.granted:
+                remaining = None if expires is None else expires - monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._remove(waiter)
+                    self._reject(self.estimate_wait(prio), "deadline reached while queued")
+                self._cond.wait(timeout=remaining)
+            self.admitted += 1
+
+    def try_acquire(self, n: int) -> int:
+        """Takes up to `n` slots that are free right now without queueing; returns how many.
+
+        Never jumps ahead of queued waiters, so it only returns slots nobody is waiting for."""
+        if self.max_inflight <= 0:
+            return n
+        with self._cond:
+            if self._queued_ahead(max(PRIORITIES.values())):
+                return 0
+            k = max(0, min(n, self.max_inflight - self._inflight))
+            self._inflight += k
+            self.admitted += k
+            return k
+
+    def release(self, service_time_s: float | None = None, count: int = 1) -> None:
+        if self.max_inflight <= 0:
+            return
+        with self._cond:
+            self._inflight = max(0, self._inflight - count)
+            if service_time_s is not None:
+                a = self.ewma_alpha
+                self.service_time_s = (1 - a) * self.service_time_s + a * service_time_s
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: str = "batch", caller: str = "", deadline_s: float | None = None,
+             max_slots: int = 1):
+        """Holds one slot (queueing for it) plus up to `max_slots - 1` more that are
+        free right now; yields the number of slots held."""
+        self.acquire(priority=priority, caller=caller, deadline_s=deadline_s)
+        held = 1 + (self.try_acquire(max_slots - 1) if max_slots > 1 else 0)
+        t0 = monotonic()
+        try:
+            yield held
+        finally:
+            self.release(service_time_s=monotonic() - t0, count=held)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max_inflight": self.max_inflight,
+                "inflight": self._inflight,
+                "queued": {
+                    name: sum(len(dq) for dq in self._queues[p].values())
+                    for name, p in PRIORITIES.items()
+                },
+                "service_time_ewma_s": round(self.service_time_s, 3),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "queued_total": self.queued_total,
+            }
+
+
+scheduler = LLMScheduler(settings.LLM_MAX_INFLIGHT)
+
+
+def _default_deadline(priority: str) -> float:
+    if priority == "interactive":
+        return float(settings.LLM_QUEUE_DEADLINE_INTERACTIVE_S)
+    return float(settings.LLM_QUEUE_DEADLINE_BATCH_S)
+
+
+@contextmanager
+def admit(deadline_s: float | None = None, max_slots: int = 1):
+    """Hold LLM slots for the current request's priority / caller / deadline.
+
+    Yields the number of slots held: one, plus up to `max_slots - 1` free ones
+    for a batch of prompts. `deadline_s` (the request's remaining time budget)
+    can only tighten the per-class queue deadline, never extend it."""
+    ctx = current_context()
+    limit = ctx.get("deadline_s")
+    if limit is None:
+        limit = _default_deadline(ctx["priority"])
+    if deadline_s is not None:
+        limit = min(limit, deadline_s)
+    with scheduler.slot(priority=ctx["priority"], caller=ctx["caller"], deadline_s=limit,
+                        max_slots=max_slots) as held:
+        yield held
@@ -0,0 +1,159 @@
+from time import monotonic
+import threading
+import requests
+from fastapi import HTTPException, status
+from core.settings import settings
+
+# Ollama 回報的 load_duration 超過此值視為一次冷載入（模型實際被載入 / 換入）
+COLD_LOAD_MS = 1000
+WARMUP_TIMEOUT_S = 300
+
+
+def parse_policies(raw: str) -> dict[str, str]:
+    """Parses `OLLAMA_MODELS` ("model=keep_alive,model2,...") into {model: keep_alive}.
+
+    A model listed without `=` uses `OLLAMA_KEEP_ALIVE`. keep_alive takes Ollama's
+    values: a duration ("30m"), "-1" to pin the model, "0" to unload after each call."""
+    policies: dict[str, str] = {}
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, keep = item.rpartition("=")
+        if not sep:
+            name, keep = item, ""
+        name = name.strip()
+        if name:
+            policies[name] = keep.strip() or settings.OLLAMA_KEEP_ALIVE
+    return policies
+
+
+class ModelResidency:
+    """Keeps the allow-listed Ollama models resident.
+
+    The default model (and any model pinned with keep_alive "-1") is warmed at
+    startup and re-pinged whenever it has been idle for a ping interval, so
+    neither deploys nor idle periods land a model load on user latency.
+    Requests for models outside the allow-list are rejected with 400 instead
+    of loading them and evicting the resident ones."""
+
+    def __init__(self, default_model: str, policies: dict[str, str], ping_interval_s: float = 0.0):
+        self.default_model = default_model
+        self.policies = dict(policies)
+        self.policies.setdefault(default_model, settings.OLLAMA_KEEP_ALIVE)
+        self.ping_interval_s = float(ping_interval_s)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._last_used: dict[str, float] = {}
+        self.cold_loads: dict[str, int] = {}
+        self.last_load_ms: dict[str, int] = {}
+        self.warmups = 0
+        self.pings = 0
+        self.ping_errors = 0
+        self.rejected = 0
+
+    def warm_models(self) -> list[str]:
+        return [
+            m for m, keep in self.policies.items()
+            if m == self.default_model or keep == "-1"
+        ]
+
+    def resolve(self, model_name: str | None) -> tuple[str, str]:
+        """Returns the model to call and the keep_alive to send for it."""
+        model = model_name or self.default_model
+        if model not in self.policies:
+            with self._lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown model: {model} (allowed: {', '.join(sorted(self.policies))})",
+            )
+        return model, self.policies[model]
+
+    def observe(self, model: str, body: dict) -> None:
+        """Records one Ollama /api/generate response (load_duration is in ns)."""
+        load_ms = int((body or {}).get("load_duration") or 0) // 1_000_000
+        with self._lock:
+            self._last_used[model] = monotonic()
+            self.last_load_ms[model] = load_ms
+            if load_ms >= COLD_LOAD_MS:
+                self.cold_loads[model] = self.cold_loads.get(model, 0) + 1
+
+    def _load(self, model: str) -> None:
+        # 空 prompt 只會載入模型、不生成任何 token
+        url = f"{settings.OLLAMA_BASE_URL.rstrip('/')}/api/generate"
+        r = requests.post(
+            url,
+            json={"model": model, "prompt": "", "stream": False, "keep_alive": self.policies[model]},
+            timeout=WARMUP_TIMEOUT_S,
+        )
+        r.raise_for_status()
+        self.observe(model, r.json())
+
+    def warm_up(self) -> None:
+        for model in self.warm_models():
+            try:
+                self._load(model)
+                with self._lock:
+                    self.warmups += 1
+            except Exception:
+                with self._lock:
+                    self.ping_errors += 1
+
+    def ping_idle(self) -> None:
+        now = monotonic()
+        for model in self.warm_models():
+            with self._lock:
+                last = self._last_used.get(model)
+            if last is not None and now - last < self.ping_interval_s:
+                continue
+            try:
+                self._load(model)
+                with self._lock:
+                    self.pings += 1
+            except Exception:
+                with self._lock:
+                    self.ping_errors += 1
+
+    def _run(self, warmup: bool) -> None:
+        if warmup:
+            self.warm_up()
+        if self.ping_interval_s <= 0:
+            return
+        while not self._stop.wait(self.ping_interval_s):
+            self.ping_idle()
+
+    def start(self, warmup: bool = True) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(warmup,), name="ollama-residency", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "default_model": self.default_model,
+                "policies": dict(self.policies),
+                "warm_models": self.warm_models(),
+                "cold_loads": dict(self.cold_loads),
+                "cold_loads_total": sum(self.cold_loads.values()),
+                "last_load_ms": dict(self.last_load_ms),
+                "warmups": self.warmups,
+                "pings": self.pings,
+                "ping_errors": self.ping_errors,
+                "rejected": self.rejected,
+            }
+
+
+residency = ModelResidency(
+    settings.OLLAMA_DEFAULT_MODEL,
+    parse_policies(settings.OLLAMA_MODELS),
+    ping_interval_s=settings.OLLAMA_PING_INTERVAL_S,
+)
@@ -1,31 +1,157 @@
-import requests
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+from core.deadline import Deadline
 from core.settings import settings
+from clients import llm_backends, llm_scheduler
+from clients.model_residency import residency
+
+LLM_TIMEOUT_S = 120
+# call_llm / call_llm_batch 失敗時回傳的訊息前綴
+FAILURE_PREFIX = "呼叫 LLM 失敗："
+
+# Per-request generation log (eval_count / done_reason / tokens_saved of each call_llm)
+_GENERATIONS: ContextVar[list | None] = ContextVar("llm_generations", default=None)
+
+
+@contextmanager
+def track_generations():
+    log: list[dict] = []
+    token = _GENERATIONS.set(log)
+    try:
+        yield log
+    finally:
+        _GENERATIONS.reset(token)
+
+
+def _record(model_name: str, num_predict: int, eval_count: int, done_reason: str, early: bool) -> None:
+    log = _GENERATIONS.get()
+    if log is None:
+        return
+    log.append({
+        "model": model_name,
+        "num_predict": num_predict,
+        "eval_count": eval_count,
+        "done_reason": done_reason,
+        # 提早停止（stop sequence / 取消）時，num_predict 內未生成的 token 上限
+        "tokens_saved": max(0, num_predict - eval_count) if early else 0,
+    })
 
 
 def call_llm(
     prompt: str,
-    model_name: str = "cwchang/llama-3-taiwan-8b-instruct",
+    model_name: str | None = None,
     num_predict: int = 256,
+    deadline: Deadline | None = None,
+    stop: list[str] | None = None,
+    cancel: Callable[[str], bool] | None = None,
 ) -> str:
-    try:
-        ollama_url = f"{settings.OLLAMA_BASE_URL.rstrip('/')}/api/generate"
-        r = requests.post(
-            ollama_url,
-            json={
-                "model": model_name,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.2,
-                    "top_p": 0.9,
-                    "num_predict": num_predict,
-                    "repeat_penalty": 1.05,
-                },
-            },
-            timeout=120,
-        )
-        r.raise_for_status()
-        ans = (r.json().get("response") or "").strip()
-        return ans
-    except Exception as e:
-        return f"呼叫 LLM 失敗：{e}"
+    """Generates with the configured LLM backend (`LLM_BACKEND`, Ollama by default).
+
+    With `stop` or `cancel`, the response is streamed and the connection is
+    closed as soon as a stop string shows up (the text is cut before it) or
+    `cancel(text_so_far)` is true, which aborts the generation on the server
+    side. Only such an early stop is recorded as `tokens_saved`. A failed call
+    returns the failure message; see `complete` for a structured result."""
+    return _as_text(complete(prompt, model_name=model_name, num_predict=num_predict,
+                             deadline=deadline, stop=stop, cancel=cancel))
+
+
+def _as_text(result: dict) -> str:
+    if "error" in result:
+        return f"{FAILURE_PREFIX}{result['error']}"
+    return result["text"]
+
+
+def complete(
+    prompt: str,
+    model_name: str | None = None,
+    num_predict: int = 256,
+    deadline: Deadline | None = None,
+    stop: list[str] | None = None,
+    cancel: Callable[[str], bool] | None = None,
+) -> dict:
+    """Same as `call_llm`, but returns `{"text": ...}` or `{"error": ...}`."""
+    backend = llm_backends.get_backend()
+    model_name, keep_alive = _resolve_model(backend, model_name)
+    stop = [s for s in (stop or []) if s]
+    # 伺服器端 stop 與自然結束（EOS）都回 done_reason "stop"，無法分辨是否真的省下 token；
+    # 改在串流中自行比對 stop 字串，看到才中止並計入
+    if stop:
+        user_cancel = cancel
+
+        def cancel(text: str) -> bool:
+            return any(s in text for s in stop) or (user_cancel is not None and user_cancel(text))
+
+    queue_deadline = deadline.remaining_s() if deadline is not None else None
+    with llm_scheduler.admit(deadline_s=queue_deadline):
+        timeout = deadline.timeout(LLM_TIMEOUT_S) if deadline is not None else LLM_TIMEOUT_S
+        try:
+            out = backend.generate(prompt, model_name, num_predict, timeout,
+                                   cancel=cancel, keep_alive=keep_alive)
+        except Exception as e:
+            return {"error": str(e)}
+    _record(model_name, num_predict, out["eval_count"], out["done_reason"],
+            early=out["done_reason"] == "cancelled")
+    return {"text": _cut_at_stop(out["text"], stop).strip()}
+
+
+def _cut_at_stop(text: str, stop: list[str]) -> str:
+    cut = min((i for i in (text.find(s) for s in stop) if i >= 0), default=-1)
+    return text[:cut] if cut >= 0 else text
+
+
+def call_llm_batch(
+    prompts: list[str],
+    model_name: str | None = None,
+    num_predict: int = 256,
+    stop: list[str] | None = None,
+) -> list[str]:
+    """Generates several prompts, each counted against `LLM_MAX_INFLIGHT`.
+
+    Prompts are sent in rounds as large as the admission slots free at the
+    time (one list-prompt request for OpenAI-compatible servers, concurrent
+    requests for Ollama); answers come back in prompt order, failed ones as
+    the usual failure message (`complete_batch` for structured results)."""
+    return [_as_text(r) for r in complete_batch(prompts, model_name=model_name,
+                                                num_predict=num_predict, stop=stop)]
+
+
+def complete_batch(
+    prompts: list[str],
+    model_name: str | None = None,
+    num_predict: int = 256,
+    stop: list[str] | None = None,
+) -> list[dict]:
+    """Same as `call_llm_batch`, but each result is `{"text": ...}` or `{"error": ...}`."""
+    backend = llm_backends.get_backend()
+    model_name, keep_alive = _resolve_model(backend, model_name)
+    prompts = list(prompts)
+    outs: list[dict] = []
+    while len(outs) < len(prompts):
+        with llm_scheduler.admit(max_slots=len(prompts) - len(outs)) as held:
+            chunk = prompts[len(outs):len(outs) + held]
+            outs.extend(backend.generate_batch(chunk, model_name, num_predict, LLM_TIMEOUT_S,
+                                               stop=stop, keep_alive=keep_alive))
+    results = []
+    for out in outs:
+        if "error" in out:
+            results.append({"error": str(out["error"])})
+            continue
+        _record(model_name, num_predict, out["eval_count"], out["done_reason"], early=False)
+        results.append({"text": out["text"].strip()})
+    return results
+
+
+def check_model(model_name: str | None) -> str:
+    """The model a request will actually be served by; 400 for one outside `OLLAMA_MODELS`.
+
+    Services call it before doing any work so a bad `model=` fails fast."""
+    return _resolve_model(llm_backends.get_backend(), model_name)[0]
+
+
+def _resolve_model(backend: llm_backends.LLMBackend, model_name: str | None) -> tuple[str, str | None]:
+    # 模型常駐 / 允許清單只適用於 Ollama；OpenAI 相容伺服器由 LLM_MODEL 決定
+    if backend.name == "ollama":
+        return residency.resolve(model_name)
+    return model_name or settings.OLLAMA_DEFAULT_MODEL, None
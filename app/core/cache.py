@@ -0,0 +1,238 @@
+from collections import OrderedDict
+from time import time
+import json
+import os
+import sqlite3
+import threading
+from core.settings import settings
+
+_MISS = object()
+
+
+class SharedStore:
+    """Host-wide L2 cache in a SQLite file (WAL mode), shared by all workers.
+
+    Values are JSON bytes with an expiry. When the file holds more than
+    `max_bytes` of values, the least recently read entries are evicted.
+    SQLite errors are treated as misses so the cache never fails a request."""
+
+    EVICT_EVERY = 64
+    TOUCH_AFTER_S = 60
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        # 每個 thread / process 各自連線（fork 後不可沿用父程序的連線）
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT value, expires, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires, accessed = row
+            now = time()
+            if expires < now:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            if now - accessed > self.TOUCH_AFTER_S:
+                conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            return value
+        except sqlite3.Error:
+            self.errors += 1
+            return None
+
+    def set(self, key: str, value: bytes, ttl_s: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        now = time()
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now + ttl_s, now),
+            )
+        except sqlite3.Error:
+            self.errors += 1
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> None:
+        try:
+            conn = self._conn()
+            conn.execute("DELETE FROM entries WHERE expires < ?", (time(),))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            target = int(self.max_bytes * 0.9)
+            while total > self.max_bytes:
+                rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed LIMIT 256").fetchall()
+                if not rows:
+                    break
+                drop = []
+                for key, size in rows:
+                    drop.append((key,))
+                    total -= size
+                    if total <= target:
+                        break
+                conn.executemany("DELETE FROM entries WHERE key = ?", drop)
+                self.evictions += len(drop)
+        except sqlite3.Error:
+            self.errors += 1
+
+    def clear(self, prefix: str = "") -> None:
+        try:
+            self._conn().execute("DELETE FROM entries WHERE key LIKE ?", (prefix + "%",))
+        except sqlite3.Error:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        try:
+            entries, size = self._conn().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+class TieredCache:
+    """Per-process LRU (L1) in front of the optional host-wide SharedStore (L2).
+
+    Cached values are shared between callers; copy them before mutating."""
+
+    def __init__(self, name: str, l1_size: int, ttl_s: float, store: SharedStore | None = None):
+        self.name = name
+        self.l1_size = max(0, int(l1_size))
+        self.ttl_s = float(ttl_s)
+        self.store = store
+        self._l1: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+
+    def _l1_put(self, key: str, expires: float, value) -> None:
+        if self.l1_size <= 0:
+            return
+        with self._lock:
+            self._l1[key] = (expires, value)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_size:
+                self._l1.popitem(last=False)
+
+    def get(self, key: str):
+        now = time()
+        with self._lock:
+            item = self._l1.get(key)
+            if item is not None and item[0] >= now:
+                self._l1.move_to_end(key)
+                self.l1_hits += 1
+                return item[1]
+            if item is not None:
+                del self._l1[key]
+        if self.store is not None:
+            raw = self.store.get(f"{self.name}:{key}")
+            if raw is not None:
+                value = json.loads(raw)
+                self._l1_put(key, now + self.ttl_s, value)
+                with self._lock:
+                    self.l2_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return _MISS
+
+    def set(self, key: str, value) -> None:
+        self._l1_put(key, time() + self.ttl_s, value)
+        if self.store is not None:
+            raw = json.dumps(value, ensure_ascii=False).encode("utf-8")
+            self.store.set(f"{self.name}:{key}", raw, self.ttl_s)
+
+    def get_or_compute(self, key: str, compute):
+        value = self.get(key)
+        if value is _MISS:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._l1.clear()
+        if self.store is not None:
+            self.store.clear(f"{self.name}:")
+
+    def stats(self) -> dict:
+        with self._lock:
+            l1_hits, l2_hits, misses, size = self.l1_hits, self.l2_hits, self.misses, len(self._l1)
+        total = l1_hits + l2_hits + misses
+        l1_misses = l2_hits + misses
+        return {
+            "l1_size": size,
+            "l1_max": self.l1_size,
+            "l1_hits": l1_hits,
+            "l2_hits": l2_hits,
+            "misses": misses,
+            "l1_hit_rate": round(l1_hits / total, 4) if total else None,
+            "l2_hit_rate": round(l2_hits / l1_misses, 4) if self.store is not None and l1_misses else None,
+            "hit_rate": round((l1_hits + l2_hits) / total, 4) if total else None,
+        }
+
+
+_STORE: SharedStore | None = None
+_CACHES: dict[str, TieredCache] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def shared_store() -> SharedStore | None:
+    global _STORE
+    if _STORE is None and settings.SHARED_CACHE_PATH:
+        with _REGISTRY_LOCK:
+            if _STORE is None:
+                _STORE = SharedStore(settings.SHARED_CACHE_PATH, settings.SHARED_CACHE_MAX_MB * 1024 * 1024)
+    return _STORE
+
+
+def get_cache(name: str) -> TieredCache:
+    cache = _CACHES.get(name)
+    if cache is None:
+        store = shared_store()
+        with _REGISTRY_LOCK:
+            cache = _CACHES.setdefault(
+                name, TieredCache(name, settings.CACHE_L1_SIZE, settings.CACHE_TTL_S, store))
+    return cache
+
+
+def stats() -> dict:
+    out = {name: cache.stats() for name, cache in sorted(_CACHES.items())}
+    store = shared_store()
+    if store is not None:
+        out["shared_store"] = store.stats()
+    return out
@@ -0,0 +1,74 @@
+from time import monotonic
+from fastapi import Request
+
+BUDGET_HEADER = "X-Time-Budget-Ms"
+BUDGET_PARAM = "budget_ms"
+
+
+class Deadline:
+    """Per-request time budget shared by lookup, expansion and generation.
+
+    A Deadline without a budget never expires, so code paths behave exactly
+    as before when the caller does not ask for one."""
+
+    def __init__(self, budget_ms: int | None = None):
+        self.budget_ms = budget_ms if budget_ms and budget_ms > 0 else None
+        self.started = monotonic()
+        self.expires = None if self.budget_ms is None else self.started + self.budget_ms / 1000.0
+        self.skipped: list[str] = []
+        self.degraded: str | None = None
+
+    @classmethod
+    def from_request(cls, request: Request, budget_ms: int | None = None) -> "Deadline":
+        """Budget from the `X-Time-Budget-Ms` header, else `budget_ms` (the route's
+        validated query parameter), else the raw `budget_ms` query parameter."""
+        raw = request.headers.get(BUDGET_HEADER)
+        if not raw:
+            raw = budget_ms if budget_ms is not None else request.query_params.get(BUDGET_PARAM)
+        try:
+            value = int(float(raw)) if raw not in (None, "") else None
+        except (TypeError, ValueError):
+            value = None
+        return cls(value)
+
+    @property
+    def bounded(self) -> bool:
+        return self.expires is not None
+
+    def remaining_s(self) -> float | None:
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - monotonic())
+
+    def remaining_ms(self) -> int | None:
+        rem = self.remaining_s()
+        return None if rem is None else int(rem * 1000)
+
+    def is_short(self, need_ms: int) -> bool:
+        rem = self.remaining_s()
+        return rem is not None and rem * 1000 < need_ms
+
+    def timeout(self, cap_s: float, floor_s: float = 1.0) -> float:
+        rem = self.remaining_s()
+        if rem is None:
+            return cap_s
+        return max(floor_s, min(cap_s, rem))
+
+    def skip(self, stage: str) -> None:
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+
+    def degrade(self, how: str) -> None:
+        self.degraded = how
+
+    def debug(self) -> list[dict]:
+        if not self.bounded:
+            return []
+        info = {
+            "budget_ms": self.budget_ms,
+            "remaining_ms": self.remaining_ms(),
+            "skipped": list(self.skipped),
+        }
+        if self.degraded:
+            info["degraded"] = self.degraded
+        return [{"deadline": info}]
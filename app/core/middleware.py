@@ -1,8 +1,14 @@
+from pathlib import Path
+import hashlib
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from core.settings import Settings
 from core.security import warn_if_api_key_unset
 
+BUILD_HEADER = "X-Server-Build"
+APP_DIR = Path(__file__).resolve().parents[1]
+
 
 def setup_cors(app: FastAPI, settings: Settings) -> None:
     app.add_middleware(
@@ -10,5 +16,63 @@ def setup_cors(app: FastAPI, settings: Settings) -> None:
         allow_origins=settings.FRONTEND_ORIGINS,
         allow_methods=["GET", "POST", "OPTIONS"],
         allow_headers=["Content-Type", "X-API-KEY"],
+        expose_headers=[BUILD_HEADER],
     )
     warn_if_api_key_unset(settings)
+
+
+def setup_compression(app: FastAPI, settings: Settings) -> None:
+    """Compresses responses of at least RESPONSE_COMPRESS_MIN_BYTES (0 = off).
+
+    Uses brotli (falling back to gzip for clients without `br`) when the
+    optional `brotli-asgi` package is installed, gzip otherwise."""
+    if settings.RESPONSE_COMPRESS_MIN_BYTES <= 0:
+        return
+    try:
+        from brotli_asgi import BrotliMiddleware
+    except ImportError:
+        app.add_middleware(GZipMiddleware, minimum_size=settings.RESPONSE_COMPRESS_MIN_BYTES)
+        return
+    app.add_middleware(BrotliMiddleware, minimum_size=settings.RESPONSE_COMPRESS_MIN_BYTES, gzip_fallback=True)
+
+
+def server_build(settings: Settings) -> str:
+    """SERVER_BUILD if set, else a hash of the app sources and the generation model settings.
+
+    Evaluation clients key stored predictions on it, so any change that can
+    alter answers (code, prompts, model) yields a new build id."""
+    if settings.SERVER_BUILD:
+        return settings.SERVER_BUILD
+    h = hashlib.sha256()
+    for path in sorted(APP_DIR.rglob("*.py")):
+        rel = path.relative_to(APP_DIR)
+        if rel.parts[0] == "tests":
+            continue
+        h.update(str(rel).encode())
+        h.update(path.read_bytes())
+    h.update(f"{settings.LLM_BACKEND}|{settings.LLM_MODEL}|{settings.OLLAMA_DEFAULT_MODEL}".encode())
+    return h.hexdigest()[:12]
+
+
+class BuildHeaderMiddleware:
+    """Adds X-Server-Build to every HTTP response (pure ASGI, no body buffering)."""
+
+    def __init__(self, app, settings: Settings):
+        self.app = app
+        # Starlette 在第一個請求時才建立 middleware stack，不增加 import 時間
+        self.header = (BUILD_HEADER.lower().encode(), server_build(settings).encode())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        async def send_with_build(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [self.header]
+            await send(message)
+
+        await self.app(scope, receive, send_with_build)
+
+
+def setup_build_header(app: FastAPI, settings: Settings) -> None:
+    app.add_middleware(BuildHeaderMiddleware, settings=settings)
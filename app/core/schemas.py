@@ -0,0 +1,74 @@
+"""Request and response models for the QA endpoints.
+
+Routes declare the response models with `response_model_exclude_unset=True`, so FastAPI
+serializes with pydantic-core straight to JSON bytes and keys the service did
+not return (lean-mode `debug`, `note`, `job`) are left out. Unknown keys are
+kept (`extra="allow"`), so adding a field in a service never drops it silently.
+"""
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict
+
+
+class _Open(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+
+class QueryResult(_Open):
+    term: str | None = None
+    conceptId: str | None = None
+    subgraph_size: int = 0
+    subgraph_summary: list[str] = []
+    answer: str = ""
+    relevance: float = 0.0
+    note: str | None = None
+
+
+class QueryResponse(_Open):
+    question: str | None = None
+    qtype: str | None = None
+    extracted_terms: list[str] = []
+    # debug=0（lean mode）時不回傳
+    debug: list[dict[str, Any]] | None = None
+    results: list[QueryResult]
+    job: dict[str, Any] | None = None
+
+
+class MappedTo(_Open):
+    bank_id: str | None = None
+    qtype: str | None = None
+    question: str = ""
+
+
+class CompareAnswers(_Open):
+    a_label: str
+    a_text: str
+    b_label: str
+    b_text: str
+
+
+class DemoSearchResponse(QueryResponse):
+    matched: bool = True
+    similarity: float = 1.0
+    mapped_to: MappedTo | None = None
+    answers: CompareAnswers | None = None
+
+
+class GenerateRequest(BaseModel):
+    # prompt 單題；prompts 批次（同時提供時以 prompts 為準）
+    prompt: str | None = None
+    prompts: list[str] | None = None
+    model: str | None = None
+    num_predict: int = 256
+    stop: list[str] | None = None
+
+
+class GenerateResult(_Open):
+    text: str = ""
+    error: str | None = None
+
+
+class GenerateResponse(_Open):
+    model: str
+    results: list[GenerateResult]
+    generation: list[dict[str, Any]] = []
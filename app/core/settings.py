@@ -11,12 +11,57 @@ class Settings(BaseModel):
     NEO4J_URI: str = "bolt://host.docker.internal:7687"
     NEO4J_USER: str = "neo4j"
     NEO4J_PASSWORD: str = ""
+    NEO4J_MAX_POOL_SIZE: int = 50
+    NEO4J_ACQUISITION_TIMEOUT_S: float = 10.0
+    NEO4J_FETCH_SIZE: int = 1000
+    NEO4J_TX_RETRY_S: float = 3.0
+    # Tiered lookup: skip the CONTAINS tier once the exact tier has this many rows (0 = always run both)
+    NEO4J_LOOKUP_EXACT_ENOUGH: int = 1
 
     OLLAMA_BASE_URL: str = "http://host.docker.internal:11434"
+    # Model residency: allow-list "model=keep_alive,..." (empty = default model only)
+    OLLAMA_DEFAULT_MODEL: str = "cwchang/llama-3-taiwan-8b-instruct"
+    OLLAMA_MODELS: str = ""
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    OLLAMA_WARMUP: bool = True
+    OLLAMA_PING_INTERVAL_S: float = 240.0
     APP_API_KEY: str = ""
 
     FRONTEND_ORIGINS: list[str] = []
 
+    # scispaCy NER micro-batching (0 workers = run inline on the request thread)
+    NER_WORKERS: int = 0
+    NER_BATCH_WINDOW_MS: int = 10
+    NER_MAX_BATCH: int = 32
+
+    # LLM backend: "ollama" (/api/generate) or "openai" (OpenAI-compatible /v1/completions)
+    LLM_BACKEND: str = "ollama"
+    LLM_BASE_URL: str = ""
+    LLM_API_KEY: str = ""
+    LLM_MODEL: str = ""
+    LLM_BATCH_PROMPTS: bool = True
+    LLM_BATCH_PARALLEL: int = 4
+
+    # LLM admission control (0 in-flight = unbounded, no queueing)
+    LLM_MAX_INFLIGHT: int = 1
+    LLM_QUEUE_DEADLINE_INTERACTIVE_S: float = 20.0
+    LLM_QUEUE_DEADLINE_BATCH_S: float = 300.0
+
+    # Vocabulary / lookup / subgraph cache: per-process LRU over an optional host-wide SQLite file
+    CACHE_L1_SIZE: int = 2048
+    CACHE_TTL_S: float = 3600.0
+    SHARED_CACHE_PATH: str = ""
+    SHARED_CACHE_MAX_MB: int = 256
+
+    # Background upgrades of provisional (lite) answers
+    ANSWER_JOB_WORKERS: int = 2
+
+    # gzip / brotli for responses at least this large (0 = off)
+    RESPONSE_COMPRESS_MIN_BYTES: int = 1024
+
+    # X-Server-Build header (empty = hash of app sources + model settings)
+    SERVER_BUILD: str = ""
+
     @classmethod
     def from_env(cls) -> "Settings":
         origins_raw = os.getenv("FRONTEND_ORIGINS", "")
@@ -27,10 +72,43 @@ class Settings(BaseModel):
                 "NEO4J_URI", "bolt://host.docker.internal:7687"),
             NEO4J_USER=os.getenv("NEO4J_USER", "neo4j"),
             NEO4J_PASSWORD=os.getenv("NEO4J_PASSWORD", ""),
+            NEO4J_MAX_POOL_SIZE=int(os.getenv("NEO4J_MAX_POOL_SIZE", "50") or 50),
+            NEO4J_ACQUISITION_TIMEOUT_S=float(
+                os.getenv("NEO4J_ACQUISITION_TIMEOUT_S", "10") or 10),
+            NEO4J_FETCH_SIZE=int(os.getenv("NEO4J_FETCH_SIZE", "1000") or 1000),
+            NEO4J_TX_RETRY_S=float(os.getenv("NEO4J_TX_RETRY_S", "3") or 0),
+            NEO4J_LOOKUP_EXACT_ENOUGH=int(os.getenv("NEO4J_LOOKUP_EXACT_ENOUGH", "1") or 0),
             OLLAMA_BASE_URL=os.getenv(
                 "OLLAMA_BASE_URL", "http://host.docker.internal:11434"),
+            OLLAMA_DEFAULT_MODEL=os.getenv(
+                "OLLAMA_DEFAULT_MODEL", "") or "cwchang/llama-3-taiwan-8b-instruct",
+            OLLAMA_MODELS=os.getenv("OLLAMA_MODELS", ""),
+            OLLAMA_KEEP_ALIVE=os.getenv("OLLAMA_KEEP_ALIVE", "30m") or "30m",
+            OLLAMA_WARMUP=os.getenv("OLLAMA_WARMUP", "1").lower() not in ("0", "false", "no"),
+            OLLAMA_PING_INTERVAL_S=float(os.getenv("OLLAMA_PING_INTERVAL_S", "240") or 0),
             APP_API_KEY=os.getenv("APP_API_KEY", ""),
             FRONTEND_ORIGINS=origins,
+            NER_WORKERS=int(os.getenv("NER_WORKERS", "0") or 0),
+            NER_BATCH_WINDOW_MS=int(os.getenv("NER_BATCH_WINDOW_MS", "10") or 10),
+            NER_MAX_BATCH=int(os.getenv("NER_MAX_BATCH", "32") or 32),
+            LLM_BACKEND=os.getenv("LLM_BACKEND", "ollama") or "ollama",
+            LLM_BASE_URL=os.getenv("LLM_BASE_URL", ""),
+            LLM_API_KEY=os.getenv("LLM_API_KEY", ""),
+            LLM_MODEL=os.getenv("LLM_MODEL", ""),
+            LLM_BATCH_PROMPTS=os.getenv("LLM_BATCH_PROMPTS", "1").lower() not in ("0", "false", "no"),
+            LLM_BATCH_PARALLEL=int(os.getenv("LLM_BATCH_PARALLEL", "4") or 4),
+            LLM_MAX_INFLIGHT=int(os.getenv("LLM_MAX_INFLIGHT", "1") or 1),
+            LLM_QUEUE_DEADLINE_INTERACTIVE_S=float(
+                os.getenv("LLM_QUEUE_DEADLINE_INTERACTIVE_S", "20") or 20),
+            LLM_QUEUE_DEADLINE_BATCH_S=float(
+                os.getenv("LLM_QUEUE_DEADLINE_BATCH_S", "300") or 300),
+            CACHE_L1_SIZE=int(os.getenv("CACHE_L1_SIZE", "2048") or 0),
+            CACHE_TTL_S=float(os.getenv("CACHE_TTL_S", "3600") or 3600),
+            SHARED_CACHE_PATH=os.getenv("SHARED_CACHE_PATH", ""),
+            SHARED_CACHE_MAX_MB=int(os.getenv("SHARED_CACHE_MAX_MB", "256") or 256),
+            ANSWER_JOB_WORKERS=int(os.getenv("ANSWER_JOB_WORKERS", "2") or 2),
+            RESPONSE_COMPRESS_MIN_BYTES=int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024") or 0),
+            SERVER_BUILD=os.getenv("SERVER_BUILD", ""),
         )
 
 
@@ -1,15 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from core.settings import settings
-from core.middleware import setup_cors
+from core.middleware import setup_build_header, setup_compression, setup_cors
+from clients.model_residency import residency
+from repositories import neo4j_repository
+from services import nlp_service
 from routers.api import router as api_router
 from routers.web import router as web_router
 
 BASE_DIR = Path(__file__).resolve().parent
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 重資源不在 import 時載入：啟動階段一次載入 scispaCy、facet patterns 與詞彙（serve.py 已預載則略過）
+    nlp_service.warm_up()
+    neo4j_repository.init_driver()
+    # 背景預熱預設模型並定期 keep-alive，不阻塞啟動
+    if settings.LLM_BACKEND == "ollama":
+        residency.start(warmup=settings.OLLAMA_WARMUP)
+    yield
+    residency.stop()
+    neo4j_repository.close_driver()
+
+
+app = FastAPI(lifespan=lifespan)
 setup_cors(app, settings)
+setup_compression(app, settings)
+setup_build_header(app, settings)
 
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 app.include_router(api_router)
@@ -0,0 +1,126 @@
+"""Neo4j schema migrations for the concept lookup.
+
+Run from `app/`:
+
+    python -m repositories.neo4j_migrations                # termNorm + indexes
+    python -m repositories.neo4j_migrations --profile asthma "heart failure"
+
+The migration stores `termNorm` (lowercased, whitespace-collapsed `term`, the
+same normalization as `neo4j_repository.normalize_term`) on every Description
+and creates a RANGE index (exact tier) and a TEXT index (CONTAINS tier) on it.
+It is idempotent; re-run it after importing new descriptions. `--profile`
+prints PROFILE db hits of the legacy query against the tiered queries.
+"""
+import argparse
+from repositories import neo4j_repository as repo
+
+# 含連續空白或 tab / 換行的 term：Cypher 沒有 regex replace，交給 _collapse_whitespace
+WHITESPACE_PATTERN = r"(?s).*(\s{2,}|[\t\n\r\f]).*"
+
+# 只處理單純的 term；含 WHITESPACE_PATTERN 的列不在這裡設定，否則每次重跑都會先被寫回
+# 未壓縮空白的值、再由 _collapse_whitespace 改回來（期間 exact 查詢查不到）
+SET_TERM_NORM = """
+MATCH (d:Description)
+WHERE d.term IS NOT NULL
+  AND NOT d.term =~ $pattern
+  AND (d.termNorm IS NULL OR d.termNorm <> toLower(trim(d.term)))
+CALL {
+  WITH d
+  SET d.termNorm = toLower(trim(d.term))
+} IN TRANSACTIONS OF $batch ROWS
+"""
+
+CREATE_INDEXES = [
+    f"CREATE INDEX {repo.TERM_NORM_INDEX} IF NOT EXISTS FOR (d:Description) ON (d.termNorm)",
+    f"CREATE TEXT INDEX {repo.TERM_NORM_TEXT_INDEX} IF NOT EXISTS FOR (d:Description) ON (d.termNorm)",
+]
+
+
+def _collapse_whitespace(sess, batch: int) -> int:
+    # 含連續空白或 tab / 換行的少數 term 在 Python 端正規化；termNorm 已正確的不再寫入
+    rows = sess.run(
+        "MATCH (d:Description) WHERE d.term =~ $pattern "
+        "RETURN elementId(d) AS id, d.term AS term, d.termNorm AS termNorm",
+        pattern=WHITESPACE_PATTERN,
+    ).data()
+    stale = [{"id": r["id"], "norm": repo.normalize_term(r["term"])} for r in rows]
+    stale = [row for row, r in zip(stale, rows) if r["termNorm"] != row["norm"]]
+    for i in range(0, len(stale), batch):
+        sess.run(
+            "UNWIND $rows AS row MATCH (d) WHERE elementId(d) = row.id SET d.termNorm = row.norm",
+            rows=stale[i:i + batch],
+        ).consume()
+    return len(stale)
+
+
+def migrate(batch: int = 10000) -> None:
+    driver = repo.get_driver()
+    with driver.session() as sess:
+        # CALL ... IN TRANSACTIONS 需要 auto-commit transaction（session.run）
+        summary = sess.run(SET_TERM_NORM, batch=batch, pattern=WHITESPACE_PATTERN).consume()
+        print(f"termNorm set on {summary.counters.properties_set} descriptions")
+        print(f"whitespace-normalized {_collapse_whitespace(sess, batch)} descriptions")
+        for stmt in CREATE_INDEXES:
+            sess.run(stmt).consume()
+        sess.run("CALL db.awaitIndexes(600)").consume()
+    print("indexes online:", ", ".join([repo.TERM_NORM_INDEX, repo.TERM_NORM_TEXT_INDEX]))
+
+
+def _db_hits(plan: dict) -> int:
+    return int(plan.get("dbHits", 0)) + sum(_db_hits(child) for child in plan.get("children", []))
+
+
+class _ProfilingTx:
+    """Runs every query of a transaction function under PROFILE and sums the db hits."""
+
+    def __init__(self, sess):
+        self.sess = sess
+        self.db_hits = 0
+
+    def run(self, query: str, **params) -> list:
+        result = self.sess.run("PROFILE " + query, **params)
+        records = list(result)
+        self.db_hits += _db_hits(result.consume().profile or {})
+        return records
+
+
+def _profile(sess, query: str, **params) -> tuple[int, int]:
+    tx = _ProfilingTx(sess)
+    rows = len(tx.run(query, **params))
+    return tx.db_hits, rows
+
+
+def profile(terms: list[str], enough: int) -> None:
+    """db hits of the legacy query, each tier alone, and the production tiered lookup
+    (`_tiered_lookup_tx`: exact-enough skip, conceptId dedupe, LOOKUP_LIMIT)."""
+    print(f"{'term':30} {'legacy db hits':>15} {'exact':>10} {'contains':>10} {'tiered':>10} "
+          f"{'legacy rows':>12} {'tiered rows':>12}")
+    with repo.get_driver().session() as sess:
+        for term in terms:
+            legacy, legacy_rows = _profile(sess, repo.LOOKUP_QUERY, t=term)
+            norm = repo.normalize_term(term)
+            exact, _ = _profile(sess, repo.EXACT_LOOKUP_QUERY, t=norm, limit=repo.LOOKUP_LIMIT)
+            contains, _ = _profile(sess, repo.CONTAINS_LOOKUP_QUERY, t=norm, limit=repo.LOOKUP_LIMIT)
+            tx = _ProfilingTx(sess)
+            rows = len(repo._tiered_lookup_tx(tx, norm, enough))
+            print(f"{term[:30]:30} {legacy:>15} {exact:>10} {contains:>10} {tx.db_hits:>10} "
+                  f"{legacy_rows:>12} {rows:>12}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--batch", type=int, default=10000)
+    ap.add_argument("--profile", nargs="+", metavar="TERM",
+                    help="only PROFILE legacy vs tiered lookup for these terms")
+    args = ap.parse_args()
+    try:
+        if args.profile:
+            profile(args.profile, repo.settings.NEO4J_LOOKUP_EXACT_ENOUGH)
+        else:
+            migrate(batch=args.batch)
+    finally:
+        repo.close_driver()
+
+
+if __name__ == "__main__":
+    main()
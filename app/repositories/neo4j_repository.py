@@ -1,62 +1,291 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
 from typing import Dict, List
-from neo4j import GraphDatabase
+import threading
+from core import cache
 from core.settings import settings
 
 
 NEO4J_URI = settings.NEO4J_URI
 NEO4J_USER = settings.NEO4J_USER
 NEO4J_PASSWORD = settings.NEO4J_PASSWORD
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+
+_DRIVER = None
+_DRIVER_LOCK = threading.Lock()
+_STATS_LOCK = threading.Lock()
+_STATS = {"sessions_opened": 0, "session_reuses": 0, "tx_total": 0, "tx_inflight": 0, "tx_peak_inflight": 0}
+
+# Request-scoped session: {"session", "thread", "closed"}; set by request_session()
+_REQUEST_SESSION: ContextVar[dict | None] = ContextVar("neo4j_request_session", default=None)
+
+
+def init_driver():
+    """Creates the shared driver (called from the app lifespan; lazily otherwise)."""
+    global _DRIVER
+    with _DRIVER_LOCK:
+        if _DRIVER is None:
+            from neo4j import GraphDatabase
+            _DRIVER = GraphDatabase.driver(
+                NEO4J_URI,
+                auth=(NEO4J_USER, NEO4J_PASSWORD),
+                max_connection_pool_size=settings.NEO4J_MAX_POOL_SIZE,
+                connection_acquisition_timeout=settings.NEO4J_ACQUISITION_TIMEOUT_S,
+                fetch_size=settings.NEO4J_FETCH_SIZE,
+                # execute_read 預設會重試 30 秒；Neo4j 不可用時應快速失敗
+                max_transaction_retry_time=settings.NEO4J_TX_RETRY_S,
+            )
+    return _DRIVER
+
+
+def close_driver() -> None:
+    global _DRIVER, _TERM_NORM_READY
+    _TERM_NORM_READY = None
+    with _DRIVER_LOCK:
+        if _DRIVER is not None:
+            _DRIVER.close()
+            _DRIVER = None
+
+
+def get_driver():
+    return _DRIVER or init_driver()
+
+
+def _open_session():
+    with _STATS_LOCK:
+        _STATS["sessions_opened"] += 1
+    return get_driver().session(fetch_size=settings.NEO4J_FETCH_SIZE)
+
+
+@contextmanager
+def request_session():
+    """Shares one session across every repository call made in this request.
+
+    Nested scopes reuse the outer one. Calls from another thread (e.g. a
+    background job that copied the request context) get their own session,
+    since sessions are not thread-safe."""
+    holder = _REQUEST_SESSION.get()
+    if holder is not None and not holder["closed"] and holder["thread"] == threading.get_ident():
+        yield
+        return
+    holder = {"session": None, "thread": threading.get_ident(), "closed": False}
+    token = _REQUEST_SESSION.set(holder)
+    try:
+        yield
+    finally:
+        holder["closed"] = True
+        _REQUEST_SESSION.reset(token)
+        if holder["session"] is not None:
+            holder["session"].close()
+
+
+@contextmanager
+def _session():
+    holder = _REQUEST_SESSION.get()
+    if holder is not None and not holder["closed"] and holder["thread"] == threading.get_ident():
+        if holder["session"] is None:
+            holder["session"] = _open_session()
+        else:
+            with _STATS_LOCK:
+                _STATS["session_reuses"] += 1
+        yield holder["session"]
+        return
+    with _open_session() as sess:
+        yield sess
+
+
+def _read(work, **params):
+    """Runs `work(tx, **params)` as a managed read transaction (retried on transient errors)."""
+    with _STATS_LOCK:
+        _STATS["tx_total"] += 1
+        _STATS["tx_inflight"] += 1
+        _STATS["tx_peak_inflight"] = max(_STATS["tx_peak_inflight"], _STATS["tx_inflight"])
+    try:
+        with _session() as sess:
+            return sess.execute_read(work, **params)
+    finally:
+        with _STATS_LOCK:
+            _STATS["tx_inflight"] -= 1
+
+
+def pool_stats() -> dict:
+    stats = {
+        "max_pool_size": settings.NEO4J_MAX_POOL_SIZE,
+        "acquisition_timeout_s": settings.NEO4J_ACQUISITION_TIMEOUT_S,
+        "fetch_size": settings.NEO4J_FETCH_SIZE,
+        "driver_open": _DRIVER is not None,
+    }
+    with _STATS_LOCK:
+        stats.update(_STATS)
+    # 連線池內部狀態（driver 未公開 API；版本不符時略過）
+    try:
+        pool = _DRIVER._pool
+        with pool.lock:
+            conns = [c for dq in pool.connections.values() for c in dq]
+        stats["connections"] = len(conns)
+        stats["connections_in_use"] = sum(1 for c in conns if c.in_use)
+    except Exception:
+        pass
+    return stats
+
+
+def _vocab_terms_tx(tx, limit: int) -> list[str]:
+    rows = tx.run(
+        "MATCH (c:Concept) RETURN toLower(c.term) AS t LIMIT $limit",
+        limit=limit,
+    )
+    return [r["t"] for r in rows if r["t"]]
 
 
 def list_vocab_terms(limit: int = 300000) -> list[str]:
-    with driver.session() as sess:
-        rows = sess.run(
-            "MATCH (c:Concept) RETURN toLower(c.term) AS t LIMIT $limit",
-            limit=limit,
-        )
-        return [r["t"] for r in rows if r["t"]]
+    return cache.get_cache("vocab").get_or_compute(
+        str(limit), lambda: _read(_vocab_terms_tx, limit=limit))
+
+
+LOOKUP_QUERY = """
+// exact match first
+MATCH (d:Description)-[:DESCRIBES]->(c:Concept)
+WHERE toLower(d.term) = toLower($t)
+  AND d.typeId = '900000000000003001'
+  AND NOT toLower(d.term) CONTAINS 'screening'
+RETURN DISTINCT c.conceptId AS conceptId, d.term AS term, 100 AS score
+UNION
+// then contains
+MATCH (d:Description)-[:DESCRIBES]->(c:Concept)
+WHERE toLower(d.term) CONTAINS toLower($t)
+  AND d.typeId = '900000000000003001'
+  AND NOT toLower(d.term) CONTAINS 'screening'
+RETURN DISTINCT c.conceptId AS conceptId, d.term AS term, 50 AS score
+ORDER BY score DESC, size(term) ASC
+LIMIT 5
+"""
+
+# termNorm = normalize_term(term)，由 repositories.neo4j_migrations 寫入並建立索引
+TERM_NORM_INDEX = "description_term_norm"
+TERM_NORM_TEXT_INDEX = "description_term_norm_text"
+
+EXACT_LOOKUP_QUERY = """
+MATCH (d:Description {termNorm: $t})-[:DESCRIBES]->(c:Concept)
+WHERE d.typeId = '900000000000003001'
+  AND NOT d.termNorm CONTAINS 'screening'
+WITH DISTINCT c.conceptId AS conceptId, d.term AS term
+RETURN conceptId, term
+ORDER BY size(term) ASC
+LIMIT $limit
+"""
+
+CONTAINS_LOOKUP_QUERY = """
+MATCH (d:Description)-[:DESCRIBES]->(c:Concept)
+WHERE d.termNorm CONTAINS $t
+  AND d.typeId = '900000000000003001'
+  AND NOT d.termNorm CONTAINS 'screening'
+WITH DISTINCT c.conceptId AS conceptId, d.term AS term
+RETURN conceptId, term
+ORDER BY size(term) ASC
+LIMIT $limit
+"""
+
+# 與 LOOKUP_QUERY 相同：每個詞最多回傳 5 個概念
+LOOKUP_LIMIT = 5
+# 索引尚未 ONLINE 時（migration 可能還在跑），隔這麼久再檢查一次
+TERM_NORM_RECHECK_S = 60.0
+
+_TERM_NORM_READY: bool | None = None
+_TERM_NORM_CHECKED_AT = 0.0
+
+
+def normalize_term(term: str) -> str:
+    return " ".join((term or "").lower().split())
+
+
+def _term_norm_ready_tx(tx) -> bool:
+    rows = tx.run(
+        "SHOW INDEXES YIELD name, state WHERE name IN $names AND state = 'ONLINE' RETURN name",
+        names=[TERM_NORM_INDEX, TERM_NORM_TEXT_INDEX],
+    )
+    return len(list(rows)) == 2
+
+
+def term_norm_ready() -> bool:
+    """True once both termNorm indexes are ONLINE.
+
+    A positive answer is kept for the life of the process; a negative one is
+    re-checked after TERM_NORM_RECHECK_S, so a migration that finishes while
+    the app is running is picked up without a restart."""
+    global _TERM_NORM_READY, _TERM_NORM_CHECKED_AT
+    if _TERM_NORM_READY:
+        return True
+    if _TERM_NORM_READY is False and monotonic() - _TERM_NORM_CHECKED_AT < TERM_NORM_RECHECK_S:
+        return False
+    try:
+        _TERM_NORM_READY = _read(_term_norm_ready_tx)
+    except Exception:
+        return False
+    _TERM_NORM_CHECKED_AT = monotonic()
+    return _TERM_NORM_READY
+
+
+def _lookup_tx(tx, t: str) -> List[Dict[str, str]]:
+    result = tx.run(LOOKUP_QUERY, t=t)
+    return [{"conceptId": r["conceptId"], "term": r["term"]} for r in result]
+
+
+def _tiered_lookup_tx(tx, t: str, enough: int) -> List[Dict[str, str]]:
+    # 每個 conceptId 只保留第一次出現（exact 優先、同層內較短的 term 優先）
+    rows: List[Dict[str, str]] = []
+    seen: set = set()
+
+    def _add(result) -> None:
+        for r in result:
+            if r["conceptId"] not in seen and len(rows) < LOOKUP_LIMIT:
+                seen.add(r["conceptId"])
+                rows.append({"conceptId": r["conceptId"], "term": r["term"]})
+
+    _add(tx.run(EXACT_LOOKUP_QUERY, t=t, limit=LOOKUP_LIMIT))
+    if len(rows) >= LOOKUP_LIMIT or (enough > 0 and len(rows) >= enough):
+        return rows
+    # contains 層也會命中 exact 層已有的概念，多取幾筆補足去重後的名額
+    _add(tx.run(CONTAINS_LOOKUP_QUERY, t=t, limit=LOOKUP_LIMIT + len(rows)))
+    return rows
 
 
 def lookup_concept_ids(term: str) -> List[Dict[str, str]]:
-    """先 exact / contains；若無結果回空，模糊比對由上層處理。"""
+    """先 exact / contains；若無結果回空，模糊比對由上層處理。
+
+    termNorm 索引就緒時分層查詢：exact 已有 NEO4J_LOOKUP_EXACT_ENOUGH 筆就不跑 contains；
+    兩層合併後依 conceptId 去重，最多 LOOKUP_LIMIT 筆。"""
     term = (term or "").strip()
     if not term:
         return []
+    if term_norm_ready():
+        t, enough = normalize_term(term), settings.NEO4J_LOOKUP_EXACT_ENOUGH
+        rows = cache.get_cache("lookup").get_or_compute(
+            f"tiered:{enough}:{t}", lambda: _read(_tiered_lookup_tx, t=t, enough=enough))
+    else:
+        rows = cache.get_cache("lookup").get_or_compute(
+            f"legacy:{term.lower()}", lambda: _read(_lookup_tx, t=term))
+    # 呼叫端會 extend 結果，回傳副本以免改到快取
+    return [dict(r) for r in rows]
+
+
+SUBGRAPH_QUERY = """
+MATCH path=(c:Concept {conceptId: $conceptId})-[:HAS_RELATIONSHIP*1..3]->(related:Concept)
+WHERE ALL(r IN relationships(path) WHERE r.typeId = '116680003')   // IS-A
+OPTIONAL MATCH (c)<-[:DESCRIBES]-(cd:Description)
+OPTIONAL MATCH (related)<-[:DESCRIBES]-(rd:Description)
+WITH DISTINCT cd.term AS sourceTerm, rd.term AS targetTerm
+RETURN sourceTerm, targetTerm
+LIMIT 50
+"""
+
 
-    with driver.session() as session:
-        query = """
-        // exact match first
-        MATCH (d:Description)-[:DESCRIBES]->(c:Concept)
-        WHERE toLower(d.term) = toLower($t)
-          AND d.typeId = '900000000000003001'
-          AND NOT toLower(d.term) CONTAINS 'screening'
-        RETURN DISTINCT c.conceptId AS conceptId, d.term AS term, 100 AS score
-        UNION
-        // then contains
-        MATCH (d:Description)-[:DESCRIBES]->(c:Concept)
-        WHERE toLower(d.term) CONTAINS toLower($t)
-          AND d.typeId = '900000000000003001'
-          AND NOT toLower(d.term) CONTAINS 'screening'
-        RETURN DISTINCT c.conceptId AS conceptId, d.term AS term, 50 AS score
-        ORDER BY score DESC, size(term) ASC
-        LIMIT 5
-        """
-        result = session.run(query, t=term)
-        return [{"conceptId": r["conceptId"], "term": r["term"]} for r in result]
+def _subgraph_tx(tx, conceptId: str) -> List[Dict[str, str]]:
+    result = tx.run(SUBGRAPH_QUERY, conceptId=conceptId)
+    return [{"sourceTerm": r["sourceTerm"], "targetTerm": r["targetTerm"]} for r in result]
 
 
 def get_subgraph(concept_id: str) -> List[Dict[str, str]]:
     """Expand to depth 1..3; only IS-A (116680003)."""
-    with driver.session() as session:
-        query = """
-        MATCH path=(c:Concept {conceptId: $conceptId})-[:HAS_RELATIONSHIP*1..3]->(related:Concept)
-        WHERE ALL(r IN relationships(path) WHERE r.typeId = '116680003')   // IS-A
-        OPTIONAL MATCH (c)<-[:DESCRIBES]-(cd:Description)
-        OPTIONAL MATCH (related)<-[:DESCRIBES]-(rd:Description)
-        WITH DISTINCT cd.term AS sourceTerm, rd.term AS targetTerm
-        RETURN sourceTerm, targetTerm
-        LIMIT 50
-        """
-        result = session.run(query, conceptId=concept_id)
-        return result.data()
+    rows = cache.get_cache("subgraph").get_or_compute(
+        str(concept_id), lambda: _read(_subgraph_tx, conceptId=concept_id))
+    return [dict(r) for r in rows]
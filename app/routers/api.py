@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Request, Body
+from fastapi import APIRouter, Body, HTTPException, Request
 from typing import Dict
+from clients import llm_scheduler
+from core.schemas import DemoSearchResponse, GenerateRequest, GenerateResponse, QueryResponse
 from services import query_service
 
 router = APIRouter()
 
 
-@router.get("/query")
+def _llm_context(request: Request, priority: str):
+    return llm_scheduler.request_context(
+        priority=priority,
+        caller=request.headers.get("X-API-KEY", ""),
+    )
+
+
+@router.get("/query", response_model=QueryResponse, response_model_exclude_unset=True)
 def query(
     request: Request,
     question: str,
@@ -14,19 +23,32 @@ def query(
     model: str | None = None,
     symtx_k: int | None = None,
     no_facet_fallback: int = 0,
+    provisional: int = 0,
+    debug: int = 1,
+    budget_ms: int | None = None,
 ):
-    return query_service.query(
-        request=request,
-        question=question,
-        lite=lite,
-        max_k=max_k,
-        model=model,
-        symtx_k=symtx_k,
-        no_facet_fallback=no_facet_fallback,
-    )
+    with _llm_context(request, "batch"):
+        return query_service.query(
+            request=request,
+            question=question,
+            lite=lite,
+            max_k=max_k,
+            model=model,
+            symtx_k=symtx_k,
+            no_facet_fallback=no_facet_fallback,
+            provisional=provisional,
+            debug=debug,
+            budget_ms=budget_ms,
+        )
 
 
-@router.get("/demo/search")
+@router.get("/query/jobs/{job_id}")
+async def query_job(request: Request, job_id: str, wait_ms: int = 0):
+    # long-poll 在 event loop 上等待，不佔用 threadpool
+    return await query_service.query_job(request=request, job_id=job_id, wait_ms=wait_ms)
+
+
+@router.get("/demo/search", response_model=DemoSearchResponse, response_model_exclude_unset=True)
 def demo_search_get(
     request: Request,
     question: str,
@@ -37,41 +59,81 @@ def demo_search_get(
     model: str | None = None,
     symtx_k: int | None = None,
     no_facet_fallback: int = 0,
+    debug: int = 1,
+    budget_ms: int | None = None,
 ):
-    return query_service.demo_search_compat_response(
-        request=request,
-        question=question,
-        topic_key=topic_key,
-        qtype_hint=qtype,
-        lite=lite,
-        max_k=max_k,
-        model=model,
-        symtx_k=symtx_k,
-        no_facet_fallback=no_facet_fallback,
-    )
+    with _llm_context(request, "interactive"):
+        return query_service.demo_search_compat_response(
+            request=request,
+            question=question,
+            topic_key=topic_key,
+            qtype_hint=qtype,
+            lite=lite,
+            max_k=max_k,
+            model=model,
+            symtx_k=symtx_k,
+            no_facet_fallback=no_facet_fallback,
+            debug=debug,
+            budget_ms=budget_ms,
+        )
 
 
-@router.post("/demo/search")
+def _int_field(payload: Dict, key: str, default: int | None) -> int | None:
+    # null / "" 視同未提供
+    value = payload.get(key)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422,
+                            detail=f"{key} must be an integer")
+
+
+@router.post("/demo/search", response_model=DemoSearchResponse, response_model_exclude_unset=True)
 def demo_search_post(request: Request, payload: Dict = Body(default={})):
     question = (payload or {}).get("question", "")
-    return query_service.demo_search_compat_response(
-        request=request,
-        question=question,
-        topic_key=(payload or {}).get("topic_key"),
-        qtype_hint=(payload or {}).get("qtype"),
-        lite=int((payload or {}).get("lite", 0) or 0),
-        max_k=int((payload or {}).get("max_k", 1) or 1),
-        model=(payload or {}).get("model"),
-        symtx_k=(payload or {}).get("symtx_k"),
-        no_facet_fallback=int((payload or {}).get("no_facet_fallback", 0) or 0),
-    )
+    with _llm_context(request, "interactive"):
+        return query_service.demo_search_compat_response(
+            request=request,
+            question=question,
+            topic_key=(payload or {}).get("topic_key"),
+            qtype_hint=(payload or {}).get("qtype"),
+            lite=_int_field(payload or {}, "lite", 0),
+            max_k=_int_field(payload or {}, "max_k", 1) or 1,
+            model=(payload or {}).get("model"),
+            symtx_k=(payload or {}).get("symtx_k"),
+            no_facet_fallback=_int_field(payload or {}, "no_facet_fallback", 0),
+            debug=_int_field(payload or {}, "debug", 1),
+            budget_ms=_int_field(payload or {}, "budget_ms", None),
+        )
+
 
+@router.get("/llm_only", response_model=QueryResponse, response_model_exclude_unset=True)
+def llm_only(request: Request, question: str | None = None, model: str | None = None,
+             budget_ms: int | None = None):
+    with _llm_context(request, "batch"):
+        return query_service.llm_only(request=request, question=question, model=model, budget_ms=budget_ms)
 
-@router.get("/llm_only")
-def llm_only(request: Request, question: str | None = None, model: str | None = None):
-    return query_service.llm_only(request=request, question=question, model=model)
+
+@router.post("/generate", response_model=GenerateResponse, response_model_exclude_unset=True)
+def generate(request: Request, payload: GenerateRequest):
+    with _llm_context(request, "batch"):
+        return query_service.generate(
+            request=request,
+            prompt=payload.prompt,
+            prompts=payload.prompts,
+            model=payload.model,
+            num_predict=payload.num_predict,
+            stop=payload.stop,
+        )
 
 
 @router.get("/health")
 def health():
     return query_service.health()
+
+
+@router.get("/metrics")
+def metrics(request: Request):
+    return query_service.metrics(request=request)
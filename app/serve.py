@@ -0,0 +1,168 @@
+"""Production entrypoint: preload once, freeze the heap, fork N uvicorn workers.
+
+    python serve.py --host 0.0.0.0 --port 8000 --workers 4
+
+The master imports the app, loads the scispaCy model, warms the facet
+patterns and the Neo4j vocabulary, then calls gc.freeze() so the preloaded
+objects are never touched by the cyclic GC and stay shared copy-on-write
+between workers. Workers accept on one inherited listening socket; the
+master restarts any worker that exits unexpectedly. Send SIGUSR1 to the
+master to log per-process RSS / PSS / private memory.
+
+Without os.fork (Windows) or with --workers 1 it runs a single uvicorn process.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+log = logging.getLogger("serve")
+
+RESTART_BACKOFF_S = 1.0
+
+
+def preload():
+    """Imports and warms everything workers should share; returns the ASGI app."""
+    gc.disable()
+    t0 = time.perf_counter()
+    import main
+    from repositories import neo4j_repository
+    from services import nlp_service
+
+    warm = nlp_service.warm_up()
+    # driver 連線不可跨 fork 共用：master 用完即關，worker 在 lifespan 各自建立
+    neo4j_repository.close_driver()
+    gc.collect()
+    gc.freeze()
+    gc.enable()
+    log.info("preloaded in %.1fs (%s, %d objects frozen)",
+             time.perf_counter() - t0, warm, gc.get_freeze_count())
+    return main.app
+
+
+def _bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, args) -> None:
+    import uvicorn
+
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        log_level=args.log_level,
+        timeout_keep_alive=args.keep_alive,
+        proxy_headers=True,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _memory(pid: int) -> dict:
+    out = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as fh:
+            for line in fh:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty", "Shared_Clean", "Shared_Dirty"):
+                    out[key] = int(rest.split()[0]) // 1024
+    except OSError:
+        pass
+    return out
+
+
+def memory_report(pids: list[int]) -> None:
+    for label, pid in [("master", os.getpid())] + [("worker", p) for p in pids]:
+        log.info("%s %d memory MiB %s", label, pid, _memory(pid))
+
+
+def _fork_worker(app, sock, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # 不可沿用 master 的 _stop：它持有較早 fork 的兄弟 worker pid，且會吞掉訊號
+        # （uvicorn 啟動後會再裝上自己的 handler）
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            _run_worker(app, sock, args)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def run_prefork(args) -> None:
+    app = preload()
+    sock = _bind(args.host, args.port)
+    workers: dict[int, float] = {}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGUSR1, lambda *_: memory_report(list(workers)))
+
+    for _ in range(args.workers):
+        workers[_fork_worker(app, sock, args)] = time.monotonic()
+    log.info("master %d serving http://%s:%d with %d workers", os.getpid(), args.host, args.port, args.workers)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if stopping or started is None:
+            continue
+        log.warning("worker %d exited (status %d); restarting", pid, status)
+        if time.monotonic() - started < RESTART_BACKOFF_S:
+            time.sleep(RESTART_BACKOFF_S)
+        workers[_fork_worker(app, sock, args)] = time.monotonic()
+    sock.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Preforking production server for the QA API.")
+    ap.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", "1") or 1),
+                    help="worker processes (default: WEB_WORKERS or 1; 0 = one per CPU)")
+    ap.add_argument("--keep-alive", type=int, default=5)
+    ap.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = ap.parse_args()
+    if args.workers <= 0:
+        args.workers = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    if args.workers == 1 or not hasattr(os, "fork"):
+        import uvicorn
+
+        uvicorn.run(preload(), host=args.host, port=args.port,
+                    log_level=args.log_level, timeout_keep_alive=args.keep_alive, proxy_headers=True)
+        return
+    run_prefork(args)
+
+
+if __name__ == "__main__":
+    main()
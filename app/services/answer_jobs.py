@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, time
+import asyncio
+import contextvars
+import threading
+import uuid
+from core.settings import settings
+
+JOB_TTL_S = 600
+MAX_JOBS = 2000
+
+_JOBS: "OrderedDict[str, dict]" = OrderedDict()
+# long-poll 中的 (event loop, future)；工作完成時由 worker thread 以 call_soon_threadsafe 喚醒
+_WAITERS: dict[str, list[tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+_LOCK = threading.Lock()
+_EXECUTOR: ThreadPoolExecutor | None = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(
+                    max_workers=max(1, settings.ANSWER_JOB_WORKERS),
+                    thread_name_prefix="answer-job",
+                )
+    return _EXECUTOR
+
+
+def _evict_expired() -> None:
+    now = monotonic()
+    while _JOBS:
+        job_id, job = next(iter(_JOBS.items()))
+        if len(_JOBS) <= MAX_JOBS and now - job["_created"] < JOB_TTL_S:
+            break
+        _JOBS.pop(job_id, None)
+        _wake(_WAITERS.pop(job_id, []))
+
+
+def _wake(waiters) -> None:
+    for loop, fut in waiters:
+        try:
+            loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+        except RuntimeError:
+            # event loop 已關閉
+            pass
+
+
+def _public(job: dict) -> dict:
+    return {k: v for k, v in job.items() if not k.startswith("_")}
+
+
+def submit(generate, provisional_answer: str) -> dict:
+    """Runs `generate()` (-> (answer, note)) in the background and returns the job handle.
+
+    The caller's context (LLM priority / X-API-KEY) is carried into the worker thread."""
+    job_id = uuid.uuid4().hex
+    job = {
+        "id": job_id,
+        "status": "pending",
+        "provisional_answer": provisional_answer,
+        "answer": None,
+        "note": None,
+        "created_at": time(),
+        "_created": monotonic(),
+    }
+    with _LOCK:
+        _evict_expired()
+        _JOBS[job_id] = job
+
+    ctx = contextvars.copy_context()
+
+    def _run():
+        t0 = monotonic()
+        try:
+            answer, note = ctx.run(generate)
+            update = {"status": "done", "answer": answer, "note": note}
+        except Exception as e:
+            update = {"status": "error", "error": str(e)}
+        update["generation_ms"] = int((monotonic() - t0) * 1000)
+        with _LOCK:
+            if job_id in _JOBS:
+                _JOBS[job_id].update(update)
+            waiters = _WAITERS.pop(job_id, [])
+        _wake(waiters)
+
+    _executor().submit(_run)
+    return {"id": job_id, "status": "pending", "poll": f"/query/jobs/{job_id}"}
+
+
+async def get(job_id: str, wait_ms: int = 0) -> dict | None:
+    """Returns the job state; with `wait_ms` it long-polls until the job finishes.
+
+    The wait is an awaited future on the caller's event loop, so a long-poll
+    does not hold a threadpool thread."""
+    loop = asyncio.get_running_loop()
+    with _LOCK:
+        _evict_expired()
+        job = _JOBS.get(job_id)
+        if job is None:
+            return None
+        if wait_ms <= 0 or job["status"] != "pending":
+            return _public(job)
+        fut = loop.create_future()
+        _WAITERS.setdefault(job_id, []).append((loop, fut))
+    try:
+        await asyncio.wait_for(fut, timeout=wait_ms / 1000.0)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        with _LOCK:
+            waiters = _WAITERS.get(job_id)
+            if waiters is not None:
+                waiters[:] = [w for w in waiters if w[1] is not fut]
+                if not waiters:
+                    _WAITERS.pop(job_id, None)
+    with _LOCK:
+        job = _JOBS.get(job_id)
+        return _public(job) if job else None
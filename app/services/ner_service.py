@@ -0,0 +1,188 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from time import monotonic
+import atexit
+import logging
+import multiprocessing
+import queue
+import threading
+from core.settings import settings
+
+log = logging.getLogger("ner_service")
+
+# ========== scispaCy model location (shared with nlp_service) ==========
+MODEL_PATH = (
+    Path(__file__).resolve().parents[1]
+    / "models"
+    / "en_core_sci_lg-0.5.4"
+    / "en_core_sci_lg"
+    / "en_core_sci_lg-0.5.4"
+)
+
+# ========== Worker-process side ==========
+_worker_nlp = None
+
+
+def _init_worker(model_path: str) -> None:
+    global _worker_nlp
+    from spacy.util import load_model_from_path
+    _worker_nlp = load_model_from_path(Path(model_path))
+
+
+def _pipe_entities(texts: list[str]) -> list[list[str]]:
+    docs = _worker_nlp.pipe(texts, batch_size=max(1, len(texts)))
+    return [[ent.text for ent in doc.ents] for doc in docs]
+
+
+# ========== Request side: collect questions within a short window ==========
+class NerBatcher:
+    """Collects texts arriving within `window_ms`, runs them through `nlp.pipe`
+    as one batch in a worker process, and resolves each caller's own Future."""
+
+    def __init__(
+        self,
+        workers: int,
+        window_ms: int = 10,
+        max_batch: int = 32,
+        model_path: Path | str = MODEL_PATH,
+    ):
+        self.workers = max(1, int(workers))
+        self.window_s = max(0, int(window_ms)) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self.model_path = str(model_path)
+        self._queue: queue.Queue = queue.Queue()
+        self._pool: ProcessPoolExecutor | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        # 與 _lock 分開：shutdown 持有 _lock 等待 collector thread，而 collector 可能正在重建 pool
+        self._pool_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.restarts = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._pool = self._new_pool()
+            self._thread = threading.Thread(target=self._collect_loop, name="ner-batcher", daemon=True)
+            self._thread.start()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn: workers must not inherit the parent's threads, sockets or driver
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_path,),
+        )
+
+    def _replace_broken_pool(self, broken: ProcessPoolExecutor) -> None:
+        """A worker died (e.g. OOM): the pool stays broken forever, so start a new one."""
+        with self._pool_lock:
+            if self._pool is not broken:
+                # 已由其他批次重建，或 batcher 已關閉
+                return
+            self._pool = self._new_pool()
+            self.restarts += 1
+        log.warning("NER worker pool broken; restarted it (%d restarts)", self.restarts)
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+            with self._pool_lock:
+                pool, self._pool = self._pool, None
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, text: str) -> Future:
+        self.start()
+        fut: Future = Future()
+        self._queue.put((text or "", fut))
+        return fut
+
+    def entities(self, text: str, timeout: float | None = 30.0) -> list[str]:
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect_loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            stop = False
+            deadline = monotonic() + self.window_s
+            while len(batch) < self.max_batch:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch: list[tuple[str, Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        texts = [text for text, _ in batch]
+        pool = self._pool
+        try:
+            try:
+                job = pool.submit(_pipe_entities, texts)
+            except BrokenProcessPool:
+                self._replace_broken_pool(pool)
+                pool = self._pool
+                job = pool.submit(_pipe_entities, texts)
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+
+        def _resolve(done: Future) -> None:
+            try:
+                results = done.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # 這一批交給呼叫端改走 inline NER，下一批送進新的 pool
+                    self._replace_broken_pool(pool)
+                for _, fut in batch:
+                    fut.set_exception(e)
+                return
+            for (_, fut), ents in zip(batch, results):
+                fut.set_result(ents)
+
+        job.add_done_callback(_resolve)
+
+
+_BATCHER: NerBatcher | None = None
+_BATCHER_LOCK = threading.Lock()
+
+
+def get_batcher() -> NerBatcher | None:
+    """Returns the shared batcher, or None when NER_WORKERS=0 (inline NER)."""
+    global _BATCHER
+    if settings.NER_WORKERS <= 0:
+        return None
+    if _BATCHER is None:
+        with _BATCHER_LOCK:
+            if _BATCHER is None:
+                _BATCHER = NerBatcher(
+                    workers=settings.NER_WORKERS,
+                    window_ms=settings.NER_BATCH_WINDOW_MS,
+                    max_batch=settings.NER_MAX_BATCH,
+                )
+                atexit.register(_BATCHER.shutdown)
+    return _BATCHER
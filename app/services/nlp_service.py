@@ -1,21 +1,37 @@
 from typing import List, Dict
-from spacy.util import load_model_from_path
-from pathlib import Path
 import re
 import difflib
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+from core.deadline import Deadline
+from core.settings import settings
 from repositories import neo4j_repository
+from services import ner_service
+from services.ner_service import MODEL_PATH
 
-# ========== Load scispaCy model ==========
-MODEL_PATH = (
-    Path(__file__).resolve().parents[1]
-    / "models"
-    / "en_core_sci_lg-0.5.4"
-    / "en_core_sci_lg"
-    / "en_core_sci_lg-0.5.4"
-)
-nlp = load_model_from_path(
-    MODEL_PATH
-)
+# 等待 NER batcher 的上限（請求有時間預算時取兩者較小者）
+NER_TIMEOUT_S = 30.0
+
+# ========== scispaCy model (loaded on first use or by warm_up) ==========
+_NLP = None
+_NLP_LOCK = threading.Lock()
+
+
+def get_nlp():
+    global _NLP
+    if _NLP is None:
+        with _NLP_LOCK:
+            if _NLP is None:
+                from spacy.util import load_model_from_path
+                _NLP = load_model_from_path(MODEL_PATH)
+    return _NLP
+
+
+def __getattr__(name: str):
+    # 相容舊用法 nlp_service.nlp
+    if name == "nlp":
+        return get_nlp()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ========== Aliases for common terms ==========
 ALIASES = {
@@ -203,7 +219,17 @@ def compile_kw_fix2():
     return patterns, neg_pat
 
 
-_FACET_PATTERNS, _NEGATION_PAT = compile_kw_fix2()
+_FACET_PATTERNS = None
+_NEGATION_PAT = None
+
+
+def _facet_patterns():
+    global _FACET_PATTERNS, _NEGATION_PAT
+    if _FACET_PATTERNS is None:
+        _FACET_PATTERNS, _NEGATION_PAT = compile_kw_fix2()
+    return _FACET_PATTERNS, _NEGATION_PAT
+
+
 _QTYPE_WEIGHTS = {"hi": 2, "lo": 1, "zh": 2}
 _IGNORE_NEGATION = True
 _NEGATION_WIN = 24
@@ -214,13 +240,13 @@ def negated_nearby(text: str, start_idx: int) -> bool:
         return False
     s = max(0, start_idx - _NEGATION_WIN)
     window = text[s:start_idx]
-    return bool(_NEGATION_PAT.search(window))
+    return bool(_facet_patterns()[1].search(window))
 
 
 def kw_score(text: str, facet: str) -> int:
     t = (text or "").lower()
     score = 0
-    pats = _FACET_PATTERNS[facet]
+    pats = _facet_patterns()[0][facet]
     for bucket in ("hi", "lo", "zh"):
         w = _QTYPE_WEIGHTS.get(bucket, 1)
         for pat in pats.get(bucket, []):
@@ -298,11 +324,29 @@ def overlap_ratio(q: str, pairs: list[str], topn: int = 8) -> float:
     return (hits / max(1, toks))
 
 
-def extract_terms(text: str) -> List[str]:
+def extract_terms(text: str, deadline: Deadline | None = None) -> List[str]:
+    """Entities (batched NER when enabled) plus Latin-script spans of `text`.
+
+    With a bounded `deadline`, the wait on the NER batcher is capped by the
+    remaining budget; a batcher that times out then yields no entities instead
+    of falling back to loading scispaCy inline."""
     raw = []
-    doc = nlp(text)
-    for ent in doc.ents:
-        raw.append(ent.text.lower().strip())
+    batcher = ner_service.get_batcher()
+    ents = None
+    if batcher is not None:
+        timeout = deadline.timeout(NER_TIMEOUT_S) if deadline is not None else NER_TIMEOUT_S
+        try:
+            ents = batcher.entities(text, timeout=timeout)
+        except FutureTimeout:
+            if deadline is not None and deadline.bounded:
+                deadline.skip("ner")
+                ents = []
+        except Exception:
+            ents = None
+    if ents is None:
+        ents = [ent.text for ent in get_nlp()(text).ents]
+    for ent in ents:
+        raw.append(ent.lower().strip())
 
     # Mixed Chinese/English prompts from frontend templates often keep disease names in Latin script.
     for m in _LATIN_TERM_RE.finditer(text or ""):
@@ -366,6 +410,28 @@ def ensure_vocab_terms() -> None:
         _VOCAB_READY = True
 
 
+def warm_up() -> dict:
+    """Builds what the first request would otherwise build (serve.py runs this before forking).
+
+    With `NER_WORKERS>0` the NER worker processes load their own scispaCy
+    model, so the request process does not load one (the inline fallback
+    still loads it lazily if the batcher fails)."""
+    global _VOCAB_TERMS, _VOCAB_READY
+    batched = settings.NER_WORKERS > 0
+    if not batched:
+        get_nlp()("What are the symptoms of asthma?")
+    for q in ("What is asthma?", "What are the symptoms of asthma?", "How is asthma treated?"):
+        detect_qtype(q)
+    if not _VOCAB_READY:
+        try:
+            _VOCAB_TERMS = neo4j_repository.list_vocab_terms(limit=100000)
+            _VOCAB_READY = True
+        except Exception:
+            # Neo4j 尚未就緒：交給 worker 第一次 fuzzy 查詢時再載入
+            pass
+    return {"vocab_terms": len(_VOCAB_TERMS), "ner": "batched" if batched else "inline"}
+
+
 def fuzzy_candidates(term: str, n: int = 5, cutoff: float = 0.82) -> list[str]:
     ensure_vocab_terms()
     if not _VOCAB_TERMS:
@@ -374,14 +440,15 @@ def fuzzy_candidates(term: str, n: int = 5, cutoff: float = 0.82) -> list[str]:
     return difflib.get_close_matches(t, _VOCAB_TERMS, n=n, cutoff=cutoff)
 
 
-def lookup_concept_ids(term: str) -> List[Dict[str, str]]:
+def lookup_concept_ids(term: str, allow_fuzzy: bool = True) -> List[Dict[str, str]]:
     term = (term or "").strip()
     if not term or is_noise_term(term):
         return []
     matches = neo4j_repository.lookup_concept_ids(term)
     toks = re.findall(r"[a-z]+", term.lower())
     can_fuzzy = (
-        1 <= len(toks) <= 2
+        allow_fuzzy
+        and 1 <= len(toks) <= 2
         and len(term) >= 5
         and not any(tok in NOISE_TERMS for tok in toks)
     )
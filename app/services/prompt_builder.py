@@ -2,6 +2,13 @@ from typing import List
 from collections import Counter
 import re
 
+# research 模式輸出在第一個「一般性補充」段落處截斷（見 query_service._finalize_research_answer）
+SECTION_MARKERS = [
+    "\n[一般性補充",
+    "\n## 一般性補充",
+    "\n一般性補充：",
+]
+
 
 def facet_limits(qtype: str):
     if qtype == "definition":
@@ -13,6 +20,17 @@ def facet_limits(qtype: str):
     return dict(max_items=8, max_chars=300, num_predict=260)
 
 
+def stop_sequences(mode: str, qtype: str) -> list[str]:
+    """Stop sequences for text the mode post-processor would discard anyway.
+
+    research mode drops everything from the first supplement section, for every
+    qtype. user mode keeps that section (up to 3 lines), so it cannot be cut by a
+    fixed string and is cancelled while streaming instead."""
+    if mode == "research":
+        return list(SECTION_MARKERS)
+    return []
+
+
 def facet_text(qtype: str) -> str:
     if qtype == "symptoms":
         return "症狀"
@@ -1,21 +1,32 @@
 from typing import List, Dict
 from time import perf_counter
 import re
-from fastapi import Request
+from fastapi import Request, HTTPException, status
+from core import cache
+from core.deadline import Deadline
 from core.security import require_api_key
 from core.settings import settings
 from repositories import neo4j_repository
-from clients import ollama_client
-from services import nlp_service, prompt_builder
+from clients import llm_scheduler, model_residency, ollama_client
+from services import answer_jobs, nlp_service, prompt_builder
 
 
 ENABLE_FALLBACK = True
 ENABLE_LOW_OVERLAP = False
-SECTION_MARKERS = [
-    "\n[一般性補充",
-    "\n## 一般性補充",
-    "\n一般性補充：",
-]
+DEFAULT_MODEL = settings.OLLAMA_DEFAULT_MODEL
+# 時間預算門檻（僅在呼叫端提供 budget 時生效）
+DEADLINE_FUZZY_MIN_MS = 3000
+DEADLINE_EXPANSION_MIN_MS = 2000
+DEADLINE_GENERATION_MIN_MS = 4000
+JOB_MAX_WAIT_MS = 30000
+GENERATE_MAX_PROMPTS = 32
+GENERATE_MAX_TOKENS = 1024
+SECTION_MARKERS = prompt_builder.SECTION_MARKERS
+USER_SUPPLEMENT_MAX_LINES = 3
+_USER_SUPPLEMENT_RE = re.compile(
+    r"(?:^|\n)(?:\[\s*一般性補充[^\]]*\]|##\s*一般性補充|一般性補充：)",
+    flags=re.I,
+)
 
 
 def _ensure_user_sections(answer: str) -> str:
@@ -26,11 +37,7 @@ def _ensure_user_sections(answer: str) -> str:
     text = re.sub(r"\[\s*一般性補充（?\s*非\s*Evidence\s*）?\s*\]", second_title, text, flags=re.I)
     text = re.sub(r"^\s*一般性補充：", second_title, text, flags=re.I | re.M)
 
-    split_match = re.search(
-        r"(?:^|\n)(?:\[\s*一般性補充[^\]]*\]|##\s*一般性補充|一般性補充：)",
-        text,
-        flags=re.I,
-    )
+    split_match = _USER_SUPPLEMENT_RE.search(text)
     if split_match:
         first = text[:split_match.start()].strip()
         second = text[split_match.end():].strip()
@@ -43,8 +50,8 @@ def _ensure_user_sections(answer: str) -> str:
 
     second = re.sub(r"^\s*[-:：]\s*", "", second).strip()
     second_lines = [line.strip() for line in second.splitlines() if line.strip()]
-    if len(second_lines) > 3:
-        second = "\n".join(second_lines[:3])
+    if len(second_lines) > USER_SUPPLEMENT_MAX_LINES:
+        second = "\n".join(second_lines[:USER_SUPPLEMENT_MAX_LINES])
     elif second_lines:
         second = "\n".join(second_lines)
     if second and not second.startswith(("-", "1.", "1、", "1)")):
@@ -53,6 +60,17 @@ def _ensure_user_sections(answer: str) -> str:
     return f"[根據知識圖譜]\n{first}\n\n{second_title}\n{second}"
 
 
+def _user_supplement_complete(text: str) -> bool:
+    """True once the streamed user-mode answer has all the supplement lines
+    _ensure_user_sections keeps; anything generated after that is discarded."""
+    split_match = _USER_SUPPLEMENT_RE.search(text or "")
+    if not split_match:
+        return False
+    rest = text[split_match.end():]
+    finished = rest.split("\n")[:-1]
+    return sum(1 for line in finished if line.strip()) >= USER_SUPPLEMENT_MAX_LINES
+
+
 def _finalize_research_answer(text: str) -> str:
     output = (text or "").strip()
     if not output:
@@ -177,6 +195,43 @@ def _natural_lite_answer(question: str, pairs: list[str], qtype: str) -> str:
     )
 
 
+def _call_llm_or_lite(
+    prompt: str,
+    question: str,
+    pairs: list[str],
+    qtype: str,
+    num_predict: int,
+    model_name: str = DEFAULT_MODEL,
+    deadline: Deadline | None = None,
+    mode: str | None = None,
+) -> str:
+    """呼叫 LLM；時間預算不足、排隊過久或生成逾時時改回傳 _natural_lite_answer。
+
+    依 mode 送出 stop sequences，user 模式則在補充段落寫滿後提早中止串流。"""
+    controls = {
+        "stop": prompt_builder.stop_sequences(mode or "", qtype),
+        "cancel": _user_supplement_complete if mode == "user" else None,
+    }
+    if deadline is None or not deadline.bounded:
+        return ollama_client.call_llm(prompt, model_name=model_name, num_predict=num_predict, **controls)
+
+    if deadline.is_short(DEADLINE_GENERATION_MIN_MS):
+        deadline.degrade("lite_answer_budget_short")
+        return _natural_lite_answer(question, pairs[:10], qtype)
+    try:
+        ans = ollama_client.call_llm(prompt, model_name=model_name, num_predict=num_predict,
+                                     deadline=deadline, **controls)
+    except HTTPException as e:
+        if e.status_code != status.HTTP_503_SERVICE_UNAVAILABLE:
+            raise
+        deadline.degrade("lite_answer_llm_queue_full")
+        return _natural_lite_answer(question, pairs[:10], qtype)
+    if nlp_service.is_bad_answer(ans) and deadline.is_short(DEADLINE_GENERATION_MIN_MS):
+        deadline.degrade("lite_answer_llm_timeout")
+        return _natural_lite_answer(question, pairs[:10], qtype)
+    return ans
+
+
 def generate_answer(question: str, subgraph: list, lite: int = 0, qtype: str = "definition") -> str:
     return generate_answer_with_mode(question=question, subgraph=subgraph, lite=lite, qtype=qtype, mode="research")
 
@@ -187,6 +242,7 @@ def generate_answer_with_mode(
     lite: int = 0,
     qtype: str = "definition",
     mode: str = "research",
+    deadline: Deadline | None = None,
 ) -> str:
     if not subgraph:
         return "--找不到足夠的知識圖資訊來回答問題。--"
@@ -208,7 +264,55 @@ def generate_answer_with_mode(
         mode=mode,
     )
     limits = prompt_builder.facet_limits(qtype)
-    return ollama_client.call_llm(prompt, num_predict=limits["num_predict"])
+    return _call_llm_or_lite(
+        prompt,
+        question=question,
+        pairs=top_pairs,
+        qtype=qtype,
+        num_predict=limits["num_predict"],
+        deadline=deadline,
+        mode=mode,
+    )
+
+
+def _generate_kg_answer(
+    request: Request,
+    question: str,
+    pairs: list[str],
+    qtype: str,
+    mode: str,
+    model: str | None = None,
+    deadline: Deadline | None = None,
+    timing: dict | None = None,
+) -> tuple[str, str | None]:
+    prompt = prompt_builder.build_prompt_kg_with_mode(
+        qtype=qtype,
+        question=question,
+        pairs=pairs,
+        mode=mode,
+    )
+    limits = prompt_builder.facet_limits(qtype)
+    ans = _call_llm_or_lite(
+        prompt,
+        question=question,
+        pairs=pairs,
+        qtype=qtype,
+        num_predict=limits["num_predict"],
+        model_name=(model or DEFAULT_MODEL),
+        deadline=deadline,
+        mode=mode,
+    )
+    if ENABLE_FALLBACK and nlp_service.is_bad_answer(ans):
+        t_fallback = perf_counter()
+        # 背景 job 不帶 deadline：不可改讀請求本身的預算
+        ans = llm_only(request=request, question=question, model=model, qtype_hint=qtype,
+                       deadline=deadline if deadline is not None else Deadline(),
+                       pairs=pairs)["results"][0]["answer"]
+        if timing is not None:
+            # 第二次生成（LLM-only）的時間，已含在 generation 內
+            timing["fallback_llm"] = int((perf_counter() - t_fallback) * 1000)
+        return ans, "fallback_llm_only_after_bad_llm"
+    return ans, None
 
 
 def llm_only(
@@ -216,8 +320,18 @@ def llm_only(
     question: str | None = None,
     model: str | None = None,
     qtype_hint: str | None = None,
+    deadline: Deadline | None = None,
+    pairs: list[str] | None = None,
+    budget_ms: int | None = None,
 ):
+    """LLM-only answer. With a bounded `deadline` (the /query fallbacks, or the
+    request's own budget for a direct call), a short budget, a full queue or a
+    timed-out generation degrades to the lite answer built from `pairs`, like
+    the KG answer does."""
     require_api_key(request, settings)
+    model = ollama_client.check_model(model)
+    if deadline is None:
+        deadline = Deadline.from_request(request, budget_ms)
     hint = (
         qtype_hint
         or request.query_params.get("qtype_hint")
@@ -248,10 +362,14 @@ def llm_only(
 
 請先給出清楚定義，再補 2 到 3 個重點特徵或分類資訊。"""
     llm_tokens = {"definition": 180, "symptoms": 220, "treatments": 220}
-    ans = ollama_client.call_llm(
+    ans = _call_llm_or_lite(
         prompt,
-        model_name=model or "cwchang/llama-3-taiwan-8b-instruct",
+        question=question,
+        pairs=pairs or [],
+        qtype=qtype,
         num_predict=llm_tokens.get(qtype, 200),
+        model_name=model or DEFAULT_MODEL,
+        deadline=deadline,
     )
     return {
         "question": question,
@@ -263,31 +381,102 @@ def llm_only(
             "subgraph_summary": [],
             "answer": ans,
             "relevance": 1.0
-        }]
+        }],
+        **({"debug": deadline.debug()} if deadline.bounded else {})
     }
 
 
-def query(request: Request,
-          question: str,
-          topic_key: str | None = None,
-          qtype_hint: str | None = None,
-          mode: str = "research",
-          lite: int = 0,
-          max_k: int = 1,
-          model: str | None = None,
-          symtx_k: int | None = None,
-          no_facet_fallback: int = 0):
+def generate(
+    request: Request,
+    prompt: str | None = None,
+    prompts: list[str] | None = None,
+    model: str | None = None,
+    num_predict: int = 256,
+    stop: list[str] | None = None,
+):
+    """Completes caller-built prompts as-is: no QA prompt template, no qtype detection.
+
+    `prompts` are generated together in one admission slot; a failed prompt
+    comes back with `error` instead of `text`."""
+    require_api_key(request, settings)
+    items = [str(p or "") for p in (prompts if prompts is not None else [prompt])]
+    if not items or not all(p.strip() for p in items):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="prompt is required")
+    if len(items) > GENERATE_MAX_PROMPTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {GENERATE_MAX_PROMPTS} prompts per request")
+    model = ollama_client.check_model(model)
+    num_predict = min(max(1, int(num_predict or 256)), GENERATE_MAX_TOKENS)
+    stop = [s for s in (stop or []) if s] or None
+    with ollama_client.track_generations() as generations:
+        if prompts is not None:
+            results = ollama_client.complete_batch(items, model_name=model, num_predict=num_predict, stop=stop)
+        else:
+            results = [ollama_client.complete(items[0], model_name=model, num_predict=num_predict, stop=stop)]
+    results = [{"text": "", "error": r["error"]} if "error" in r else {"text": r["text"]} for r in results]
+    return {"model": model, "results": results, "generation": generations}
+
+
+def _timing_ms(t0: float, **stages) -> dict:
+    """debug 的 timing_ms 項目：lookup / generation / fallback_llm（有執行的階段）與 total，單位毫秒。"""
+    timing = {k: v for k, v in stages.items() if v is not None}
+    timing["total"] = int((perf_counter() - t0) * 1000)
+    return {"timing_ms": timing}
+
+
+def query(request: Request, question: str, debug: int = 1, **kwargs):
+    with neo4j_repository.request_session(), ollama_client.track_generations() as generations:
+        resp = _query(request, question, **kwargs)
+    if not debug:
+        # lean mode：不回傳診斷資訊
+        resp.pop("debug", None)
+    elif generations:
+        resp["debug"].append({"generation": {
+            "calls": list(generations),
+            "tokens_saved": sum(g["tokens_saved"] for g in generations),
+        }})
+    return resp
+
+
+def _provisional_answer(question: str, pairs: list[str], qtype: str, mode: str, generate) -> tuple[str, dict]:
+    """Lite answer from `pairs` (a placeholder when there are none) for the response,
+    and the job handle of `generate()` (-> (answer, note)) running in the background."""
+    ans = _natural_lite_answer(question, pairs[:10], qtype)
+
+    def _upgrade():
+        final, final_note = generate()
+        return _finalize_answer_by_mode(final, mode), final_note
+
+    return ans, answer_jobs.submit(_upgrade, provisional_answer=_finalize_answer_by_mode(ans, mode))
+
+
+def _query(request: Request,
+           question: str,
+           topic_key: str | None = None,
+           qtype_hint: str | None = None,
+           mode: str = "research",
+           lite: int = 0,
+           max_k: int = 1,
+           model: str | None = None,
+           symtx_k: int | None = None,
+           no_facet_fallback: int = 0,
+           deadline: Deadline | None = None,
+           provisional: int = 0,
+           budget_ms: int | None = None):
     require_api_key(request, settings)
+    model = ollama_client.check_model(model)
     mode = (request.query_params.get("mode") or mode or "research").strip().lower()
     if mode not in {"research", "user"}:
         mode = "research"
+    if deadline is None:
+        deadline = Deadline.from_request(request, budget_ms)
 
     t0 = perf_counter()
     qtype = (qtype_hint or "").strip().lower()
     if qtype not in {"definition", "symptoms", "treatments"}:
         qtype = nlp_service.detect_qtype(question)
 
-    terms = nlp_service.extract_terms(question)
+    terms = nlp_service.extract_terms(question, deadline=deadline)
     if topic_key:
         topic_terms = nlp_service.merge_terms([topic_key], [])
         topic_norm = _normalize_lookup_term(topic_terms[0] if topic_terms else topic_key)
@@ -305,24 +494,46 @@ def query(request: Request,
             prioritized_terms.append(clean_term)
         terms = prioritized_terms
 
+    def _llm_only_answer(pairs: list[str], note: str, deadline: Deadline | None = None):
+        # 背景 job（deadline=None）不受請求的時間預算限制
+        ans = llm_only(request=request, question=question, model=model, qtype_hint=qtype,
+                       deadline=deadline if deadline is not None else Deadline(),
+                       pairs=pairs)["results"][0]["answer"]
+        return ans, note
+
     if ENABLE_FALLBACK and not terms:
-        ans = llm_only(request=request, question=question, model=model, qtype_hint=qtype)["results"][0]["answer"]
+        t_gen_start = perf_counter()
+        job = None
+        if provisional:
+            ans, job = _provisional_answer(question, [], qtype, mode,
+                                           lambda: _llm_only_answer([], "no_terms_to_kg"))
+        else:
+            ans, _ = _llm_only_answer([], "no_terms_to_kg", deadline)
+        gen_ms = int((perf_counter() - t_gen_start) * 1000)
         return {
             "question": question, "qtype": qtype, "extracted_terms": [],
             "debug": [{"fallback": "no_terms_to_kg"},
-                      {"timing_ms": {"total": int((perf_counter() - t0) * 1000)}}],
+                      _timing_ms(t0, lookup=0, generation=gen_ms)] + deadline.debug(),
             "results": [{
                 "term": None, "conceptId": None, "subgraph_size": 0,
-                "subgraph_summary": [], "answer": _finalize_answer_by_mode(ans, mode), "relevance": 0.0
-            }]
+                "subgraph_summary": [], "answer": _finalize_answer_by_mode(ans, mode), "relevance": 0.0,
+                **({"note": "provisional_lite_answer"} if job else {})
+            }],
+            **({"job": job} if job else {})
         }
 
     candidates, debug_matches = [], []
     t_lookup_start = perf_counter()
     for term in terms:
-        matches = nlp_service.lookup_concept_ids(term)
+        allow_fuzzy = not deadline.is_short(DEADLINE_FUZZY_MIN_MS)
+        if not allow_fuzzy:
+            deadline.skip("fuzzy_candidates")
+        matches = nlp_service.lookup_concept_ids(term, allow_fuzzy=allow_fuzzy)
         debug_matches.append({"input_term": term, "match_count": len(matches)})
         for m in matches:
+            if candidates and deadline.is_short(DEADLINE_EXPANSION_MIN_MS):
+                deadline.skip("extra_subgraphs")
+                break
             cid = m["conceptId"]
             matched_term = m["term"]
             sub = neo4j_repository.get_subgraph(cid)
@@ -340,17 +551,26 @@ def query(request: Request,
     lookup_ms = int((perf_counter() - t_lookup_start) * 1000)
 
     if ENABLE_FALLBACK and not candidates:
-        ans = llm_only(request=request, question=question, model=model, qtype_hint=qtype)["results"][0]["answer"]
+        t_gen_start = perf_counter()
+        job = None
+        if provisional:
+            ans, job = _provisional_answer(question, [], qtype, mode,
+                                           lambda: _llm_only_answer([], "no_candidates_from_kg"))
+        else:
+            ans, _ = _llm_only_answer([], "no_candidates_from_kg", deadline)
+        gen_ms = int((perf_counter() - t_gen_start) * 1000)
         return {
             "question": question, "qtype": qtype, "extracted_terms": terms,
             "debug": debug_matches + [
                 {"fallback": "no_candidates_from_kg"},
-                {"timing_ms": {"lookup": lookup_ms, "total": int((perf_counter() - t0) * 1000)}},
-            ],
+                _timing_ms(t0, lookup=lookup_ms, generation=gen_ms),
+            ] + deadline.debug(),
             "results": [{
                 "term": None, "conceptId": None, "subgraph_size": 0,
-                "subgraph_summary": [], "answer": _finalize_answer_by_mode(ans, mode), "relevance": 0.0
-            }]
+                "subgraph_summary": [], "answer": _finalize_answer_by_mode(ans, mode), "relevance": 0.0,
+                **({"note": "provisional_lite_answer"} if job else {})
+            }],
+            **({"job": job} if job else {})
         }
 
     candidates.sort(key=lambda x: (x["relevance"], x["subgraph_size"]), reverse=True)
@@ -379,45 +599,58 @@ def query(request: Request,
             evidence_level = "none"
     no_facet_hit = evidence_level != "strong"
 
-    if ENABLE_FALLBACK and ENABLE_LOW_OVERLAP and no_facet_hit and ratio < LOW_OVL:
+    subgraph = [{"sourceTerm": p.split(" → ")[0], "targetTerm": p.split(" → ")[1]} for p in sorted_pairs]
+
+    def _kg_answer(note: str, deadline: Deadline | None = None):
         ans = generate_answer_with_mode(
-            question=question,
-            subgraph=[{"sourceTerm": p.split(" → ")[0], "targetTerm": p.split(" → ")[1]} for p in sorted_pairs],
-            lite=0,
-            qtype=qtype,
-            mode=mode,
+            question=question, subgraph=subgraph, lite=0, qtype=qtype, mode=mode, deadline=deadline,
         )
+        return ans, note
+
+    if ENABLE_FALLBACK and ENABLE_LOW_OVERLAP and no_facet_hit and ratio < LOW_OVL:
+        t_gen_start = perf_counter()
         note = "kg_low_overlap_limited_evidence"
+        job = None
+        if provisional:
+            ans, job = _provisional_answer(question, sorted_pairs, qtype, mode, lambda: _kg_answer(note))
+        else:
+            ans, _ = _kg_answer(note, deadline)
+        gen_ms = int((perf_counter() - t_gen_start) * 1000)
         return {
             "question": question, "qtype": qtype, "extracted_terms": terms,
-            "debug": debug_matches + [{"fallback": note, "overlap": ratio, "facet_evidence_level": evidence_level}],
+            "debug": debug_matches + [{"fallback": note, "overlap": ratio, "facet_evidence_level": evidence_level},
+                                      _timing_ms(t0, lookup=lookup_ms, generation=gen_ms)]
+            + deadline.debug(),
             "results": [{
                 "term": None, "conceptId": None, "subgraph_size": 0,
                 "subgraph_summary": sorted_pairs[:3],
                 "answer": _finalize_answer_by_mode(ans, mode), "relevance": 0.0,
-                "note": note
-            }]
+                "note": "provisional_lite_answer" if job else note
+            }],
+            **({"job": job} if job else {})
         }
 
     if ENABLE_FALLBACK and (not no_facet_fallback) and qtype in ("symptoms", "treatments") and evidence_level != "strong":
+        t_gen_start = perf_counter()
+        job = None
         if mode == "research":
             ans = _research_insufficient_answer(qtype, evidence_level, sorted_pairs)
             note = f"research_{evidence_level}_evidence_insufficient"
             fallback_note = f"strategy_a_research_{evidence_level}_insufficient"
-        elif evidence_level == "none":
-            ans = llm_only(request=request, question=question, model=model, qtype_hint=qtype)["results"][0]["answer"]
-            note = "user_mode_llm_only_no_evidence"
-            fallback_note = "strategy_a_user_none_to_llm_only"
         else:
-            ans = generate_answer_with_mode(
-                question=question,
-                subgraph=[{"sourceTerm": p.split(" → ")[0], "targetTerm": p.split(" → ")[1]} for p in sorted_pairs],
-                lite=0,
-                qtype=qtype,
-                mode=mode,
-            )
-            note = "user_mode_kg_with_weak_evidence"
-            fallback_note = "strategy_a_user_weak_keep_kg"
+            if evidence_level == "none":
+                note = "user_mode_llm_only_no_evidence"
+                fallback_note = "strategy_a_user_none_to_llm_only"
+                gen_fn, args = _llm_only_answer, (sorted_pairs, note)
+            else:
+                note = "user_mode_kg_with_weak_evidence"
+                fallback_note = "strategy_a_user_weak_keep_kg"
+                gen_fn, args = _kg_answer, (note,)
+            if provisional:
+                ans, job = _provisional_answer(question, sorted_pairs, qtype, mode, lambda: gen_fn(*args))
+            else:
+                ans, _ = gen_fn(*args, deadline)
+        gen_ms = int((perf_counter() - t_gen_start) * 1000)
         return {
             "question": question,
             "qtype": qtype,
@@ -425,7 +658,8 @@ def query(request: Request,
             "debug": debug_matches + [{"fallback": fallback_note,
                                        "pairs_after_merge": len(combined_pairs),
                                        "facet_evidence_level": evidence_level},
-                                      {"timing_ms": {"lookup": lookup_ms, "total": int((perf_counter() - t0) * 1000)}}],
+                                      _timing_ms(t0, lookup=lookup_ms, generation=gen_ms)]
+            + deadline.debug(),
             "results": [{
                 "term": topk[0]["term"],
                 "conceptId": topk[0]["conceptId"],
@@ -433,47 +667,41 @@ def query(request: Request,
                 "subgraph_summary": sorted_pairs[:3],
                 "answer": _finalize_answer_by_mode(ans, mode),
                 "relevance": topk[0]["relevance"],
-                "note": note
-            }]
+                "note": "provisional_lite_answer" if job else note
+            }],
+            **({"job": job} if job else {})
         }
 
     note = None
+    job = None
+    gen_timing: dict = {}
     t_gen_start = perf_counter()
-    if lite:
-        ans = generate_answer_with_mode(
-            question=question,
-            subgraph=[{"sourceTerm": p.split(" → ")[0], "targetTerm": p.split(" → ")[1]} for p in sorted_pairs],
-            lite=1,
-            qtype=qtype,
-            mode=mode,
-        )
-    else:
-        prompt = prompt_builder.build_prompt_kg_with_mode(
-            qtype=qtype,
-            question=question,
-            pairs=sorted_pairs,
-            mode=mode,
-        )
-        limits = prompt_builder.facet_limits(qtype)
-        ans = ollama_client.call_llm(
-            prompt,
-            model_name=(model or "cwchang/llama-3-taiwan-8b-instruct"),
-            num_predict=limits["num_predict"]
+    if lite or provisional:
+        ans = generate_answer_with_mode(question=question, subgraph=subgraph, lite=1, qtype=qtype, mode=mode)
+    if provisional and not lite:
+        def _upgrade():
+            final, final_note = _generate_kg_answer(
+                request=request, question=question, pairs=sorted_pairs,
+                qtype=qtype, mode=mode, model=model,
+            )
+            return _finalize_answer_by_mode(final, mode), final_note
+
+        job = answer_jobs.submit(_upgrade, provisional_answer=_finalize_answer_by_mode(ans, mode))
+        note = "provisional_lite_answer"
+    elif not lite:
+        ans, note = _generate_kg_answer(
+            request=request, question=question, pairs=sorted_pairs,
+            qtype=qtype, mode=mode, model=model, deadline=deadline, timing=gen_timing,
         )
-        if ENABLE_FALLBACK and nlp_service.is_bad_answer(ans):
-            ans = llm_only(request=request, question=question, model=model, qtype_hint=qtype)["results"][0]["answer"]
-            note = "fallback_llm_only_after_bad_llm"
     gen_ms = int((perf_counter() - t_gen_start) * 1000)
 
     return {
         "question": question,
         "qtype": qtype,
         "extracted_terms": terms,
-        "debug": debug_matches + [{"facet_evidence_level": evidence_level}, {"timing_ms": {
-            "lookup": lookup_ms,
-            "generation": gen_ms,
-            "total": int((perf_counter() - t0) * 1000),
-        }}],
+        "debug": debug_matches + [{"facet_evidence_level": evidence_level},
+                                  _timing_ms(t0, lookup=lookup_ms, generation=gen_ms,
+                                             fallback_llm=gen_timing.get("fallback_llm"))] + deadline.debug(),
         "results": [{
             "term": topk[0]["term"],
             "conceptId": topk[0]["conceptId"],
@@ -482,7 +710,8 @@ def query(request: Request,
             "answer": _finalize_answer_by_mode(ans, mode),
             "relevance": topk[0]["relevance"],
             **({"note": note} if note else {})
-        }]
+        }],
+        **({"job": job} if job else {})
     }
 
 
@@ -495,11 +724,14 @@ def demo_search_compat_response(
     max_k: int = 1,
     model: str | None = None,
     symtx_k: int | None = None,
-    no_facet_fallback: int = 0
+    no_facet_fallback: int = 0,
+    debug: int = 1,
+    budget_ms: int | None = None,
 ):
     mode = (request.query_params.get("mode", "user") or "user").strip().lower()
     if mode not in {"user", "research"}:
         mode = "user"
+    deadline = Deadline.from_request(request, budget_ms)
 
     core = query(
         request=request,
@@ -511,21 +743,30 @@ def demo_search_compat_response(
         max_k=max_k,
         model=model,
         symtx_k=symtx_k,
-        no_facet_fallback=no_facet_fallback
+        no_facet_fallback=no_facet_fallback,
+        deadline=deadline,
+        debug=debug,
     )
 
     first = ((core.get("results") or [{}])[0] or {})
     qtype = core.get("qtype")
     answer_kg = first.get("answer", "")
-    answer_llm = llm_only(
-        request=request,
-        question=question,
-        model=model,
-        qtype_hint=(qtype_hint or qtype),
-    )["results"][0]["answer"]
+    if deadline.is_short(DEADLINE_GENERATION_MIN_MS):
+        deadline.skip("llm_only_comparison")
+        answer_llm = ""
+    else:
+        answer_llm = llm_only(
+            request=request,
+            question=question,
+            model=model,
+            qtype_hint=(qtype_hint or qtype),
+            deadline=deadline,
+        )["results"][0]["answer"]
     concept_id = first.get("conceptId")
 
     resp = dict(core)
+    if debug and deadline.bounded:
+        resp["debug"] = [d for d in core.get("debug", []) if "deadline" not in d] + deadline.debug()
     resp.update({
         "matched": True,
         "similarity": 1.0,
@@ -541,8 +782,29 @@ def demo_search_compat_response(
             "b_text": answer_llm
         }
     })
+    if not debug:
+        # lean mode：KG 答案只留在 answers.a_text，不在 results 重複一份
+        resp["results"] = [{k: v for k, v in r.items() if k != "answer"} for r in resp.get("results", [])]
     return resp
 
 
+async def query_job(request: Request, job_id: str, wait_ms: int = 0):
+    require_api_key(request, settings)
+    job = await answer_jobs.get(job_id, wait_ms=min(max(0, int(wait_ms or 0)), JOB_MAX_WAIT_MS))
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown or expired job")
+    return job
+
+
 def health():
     return {"status": "ok"}
+
+
+def metrics(request: Request):
+    require_api_key(request, settings)
+    return {
+        "llm_scheduler": llm_scheduler.scheduler.stats(),
+        "llm_residency": model_residency.residency.stats(),
+        "neo4j": neo4j_repository.pool_stats(),
+        "cache": cache.stats(),
+    }
@@ -0,0 +1,134 @@
+import asyncio
+import inspect
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import routers.api as api_router_module
+from main import app
+from services import answer_jobs
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def fresh_jobs(monkeypatch):
+    monkeypatch.setattr(answer_jobs, "_JOBS", type(answer_jobs._JOBS)())
+    monkeypatch.setattr(answer_jobs, "_WAITERS", {})
+
+
+def _get(job_id: str, wait_ms: int = 0):
+    return asyncio.run(answer_jobs.get(job_id, wait_ms=wait_ms))
+
+
+def _wait_done(job_id: str) -> dict:
+    for _ in range(200):
+        job = _get(job_id)
+        if job["status"] != "pending":
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_submit_runs_in_background_and_records_result():
+    handle = answer_jobs.submit(lambda: ("llm answer", "note"), provisional_answer="lite")
+    assert handle["status"] == "pending" and handle["poll"] == f"/query/jobs/{handle['id']}"
+    job = _wait_done(handle["id"])
+    assert job["answer"] == "llm answer" and job["note"] == "note"
+    assert job["provisional_answer"] == "lite"
+    assert not any(k.startswith("_") for k in job)
+
+
+def test_failed_generation_is_reported_as_error():
+    job = _wait_done(answer_jobs.submit(lambda: 1 / 0, provisional_answer="lite")["id"])
+    assert job["status"] == "error" and "division" in job["error"]
+
+
+def test_unknown_job_is_none_and_404():
+    assert _get("missing") is None
+    assert client.get("/query/jobs/missing").status_code == 404
+
+
+def test_expired_and_overflowing_jobs_are_evicted(monkeypatch):
+    monkeypatch.setattr(answer_jobs, "MAX_JOBS", 2)
+    ids = [answer_jobs.submit(lambda: ("a", None), provisional_answer="")["id"] for _ in range(3)]
+    assert _get(ids[0]) is None
+    assert _get(ids[2]) is not None
+
+    monkeypatch.setattr(answer_jobs, "JOB_TTL_S", 0)
+    assert _get(ids[2]) is None
+
+
+def test_long_poll_returns_when_the_job_finishes():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return "done later", None
+
+    job_id = answer_jobs.submit(slow, provisional_answer="")["id"]
+    threading.Timer(0.05, release.set).start()
+    t0 = time.monotonic()
+    job = _get(job_id, wait_ms=5000)
+    assert job["status"] == "done" and job["answer"] == "done later"
+    assert time.monotonic() - t0 < 2
+    assert answer_jobs._WAITERS == {}
+
+
+def test_long_poll_times_out_while_pending():
+    release = threading.Event()
+    job_id = answer_jobs.submit(lambda: (release.wait(5), None), provisional_answer="")["id"]
+    try:
+        assert _get(job_id, wait_ms=50)["status"] == "pending"
+        assert answer_jobs._WAITERS == {}
+    finally:
+        release.set()
+
+
+def test_long_polls_share_the_event_loop_instead_of_threads():
+    release = threading.Event()
+    job_id = answer_jobs.submit(lambda: (release.wait(5), None), provisional_answer="")["id"]
+
+    async def many_polls():
+        threads_before = threading.active_count()
+        polls = [asyncio.ensure_future(answer_jobs.get(job_id, wait_ms=5000)) for _ in range(50)]
+        await asyncio.sleep(0.05)
+        assert threading.active_count() == threads_before
+        release.set()
+        return await asyncio.gather(*polls)
+
+    assert all(job["status"] == "done" for job in asyncio.run(many_polls()))
+
+
+def test_job_route_is_async():
+    assert inspect.iscoroutinefunction(api_router_module.query_job)
+
+
+@pytest.mark.parametrize("terms, fallback", [([], "no_terms_to_kg"), (["gout"], "no_candidates_from_kg")])
+def test_provisional_fallback_returns_before_the_llm(monkeypatch, terms, fallback):
+    import services.query_service as qs
+
+    release = threading.Event()
+
+    def slow_llm(*args, **kwargs):
+        release.wait(5)
+        return "full LLM answer about gout"
+
+    monkeypatch.setattr(qs.nlp_service, "detect_qtype", lambda q: "definition")
+    monkeypatch.setattr(qs.nlp_service, "extract_terms", lambda q, deadline=None: list(terms))
+    monkeypatch.setattr(qs.nlp_service, "lookup_concept_ids", lambda term, allow_fuzzy=True: [])
+    monkeypatch.setattr(qs.ollama_client, "call_llm", slow_llm)
+
+    t0 = time.monotonic()
+    body = client.get("/query", params={"question": "what is gout", "provisional": 1}).json()
+    assert time.monotonic() - t0 < 2
+    assert {"fallback": fallback} in body["debug"]
+    assert body["results"][0]["note"] == "provisional_lite_answer"
+    assert body["results"][0]["answer"] == qs._natural_lite_answer("what is gout", [], "definition")
+
+    release.set()
+    job = client.get(f"/query/jobs/{body['job']['id']}", params={"wait_ms": 5000}).json()
+    assert job["status"] == "done" and job["note"] == fallback
+    assert job["answer"] == "full LLM answer about gout"
@@ -0,0 +1,64 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from core.cache import SharedStore, TieredCache
+
+APP_DIR = Path(__file__).resolve().parents[1]
+
+
+def test_l1_is_lru_bounded():
+    c = TieredCache("t", l1_size=2, ttl_s=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get_or_compute("a", lambda: -1) == 1
+    c.set("c", 3)
+    assert c.get_or_compute("b", lambda: "recomputed") == "recomputed"
+    stats = c.stats()
+    assert stats["l1_hits"] == 1 and stats["misses"] == 1
+    assert stats["l2_hit_rate"] is None
+
+
+def test_l2_shared_between_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    worker_a = TieredCache("subgraph", 16, 60, SharedStore(path, 1 << 20))
+    worker_b = TieredCache("subgraph", 16, 60, SharedStore(path, 1 << 20))
+    worker_a.set("42", [{"sourceTerm": "氣喘", "targetTerm": "疾病"}])
+    calls = []
+    value = worker_b.get_or_compute("42", lambda: calls.append(1))
+    assert value == [{"sourceTerm": "氣喘", "targetTerm": "疾病"}]
+    assert calls == []
+    assert worker_b.stats()["l2_hits"] == 1
+    assert worker_b.stats()["l2_hit_rate"] == 1.0
+
+
+def test_l2_visible_from_another_process(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    TieredCache("vocab", 16, 60, SharedStore(path, 1 << 20)).set("100", ["asthma", "copd"])
+    code = (
+        "from core.cache import SharedStore, TieredCache;"
+        f"c = TieredCache('vocab', 16, 60, SharedStore({path!r}, 1 << 20));"
+        "print(c.get_or_compute('100', lambda: []))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "['asthma', 'copd']"
+
+
+def test_l2_evicts_least_recently_used_over_size_limit(tmp_path):
+    store = SharedStore(str(tmp_path / "cache.sqlite3"), max_bytes=1000)
+    for i in range(10):
+        store.set(f"k{i}", b"x" * 200, ttl_s=60)
+        time.sleep(0.002)
+    store.evict()
+    stats = store.stats()
+    assert stats["bytes"] <= 1000
+    assert stats["evictions"] >= 5
+    assert store.get("k0") is None
+    assert store.get("k9") == b"x" * 200
+
+
+def test_expired_entries_are_misses(tmp_path):
+    store = SharedStore(str(tmp_path / "cache.sqlite3"), max_bytes=1 << 20)
+    store.set("k", b"v", ttl_s=-1)
+    assert store.get("k") is None
@@ -0,0 +1,124 @@
+from time import monotonic
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import services.query_service as qs
+from core.deadline import Deadline
+from main import app
+
+client = TestClient(app)
+
+
+def test_unbounded_deadline_never_expires():
+    d = Deadline(None)
+    assert not d.bounded
+    assert d.remaining_s() is None
+    assert not d.is_short(10**9)
+    assert d.timeout(120) == 120
+    assert d.debug() == []
+
+
+def test_bounded_deadline_caps_timeouts_and_reports():
+    d = Deadline(500)
+    assert d.bounded and d.is_short(1000) and not d.is_short(100)
+    assert 1.0 <= d.timeout(120) <= 1.0 + 1e-9  # 預算 < floor 時仍給 1 秒
+    d.skip("fuzzy")
+    d.skip("fuzzy")
+    d.degrade("lite_answer_budget_short")
+    info = d.debug()[0]["deadline"]
+    assert info["budget_ms"] == 500
+    assert info["skipped"] == ["fuzzy"]
+    assert info["degraded"] == "lite_answer_budget_short"
+
+
+def test_deadline_from_request_header_and_param():
+    class Req:
+        def __init__(self, headers, params):
+            self.headers = headers
+            self.query_params = params
+
+    assert Deadline.from_request(Req({"X-Time-Budget-Ms": "2500"}, {})).budget_ms == 2500
+    assert Deadline.from_request(Req({}, {"budget_ms": "800.7"})).budget_ms == 800
+    assert not Deadline.from_request(Req({}, {"budget_ms": "soon"})).bounded
+    assert not Deadline.from_request(Req({}, {"budget_ms": "0"})).bounded
+
+
+@pytest.fixture
+def no_terms(monkeypatch):
+    # 抽不到詞 → no_terms_to_kg，由 llm_only 在同一個 deadline 下生成
+    monkeypatch.setattr(qs.nlp_service, "detect_qtype", lambda q: "definition")
+    monkeypatch.setattr(qs.nlp_service, "extract_terms", lambda q, deadline=None: [])
+
+
+def _query(budget_ms: int) -> dict:
+    resp = client.get("/query", params={"question": "what is asthma", "budget_ms": budget_ms})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def _degraded(body: dict) -> str | None:
+    return next(d["deadline"] for d in body["debug"] if "deadline" in d).get("degraded")
+
+
+def test_short_budget_fallback_returns_lite_answer(no_terms, monkeypatch):
+    monkeypatch.setattr(qs.ollama_client, "call_llm", lambda *a, **k: pytest.fail("LLM called"))
+    body = _query(qs.DEADLINE_GENERATION_MIN_MS // 2)
+    assert body["debug"][0] == {"fallback": "no_terms_to_kg"}
+    assert _degraded(body) == "lite_answer_budget_short"
+    assert body["results"][0]["answer"] == qs._natural_lite_answer("what is asthma", [], "definition")
+
+
+def test_full_queue_fallback_degrades_instead_of_503(no_terms, monkeypatch):
+    def queue_full(*args, **kwargs):
+        raise HTTPException(status_code=503, detail="LLM busy", headers={"Retry-After": "5"})
+
+    monkeypatch.setattr(qs.ollama_client, "call_llm", queue_full)
+    body = _query(60_000)
+    assert _degraded(body) == "lite_answer_llm_queue_full"
+    assert body["results"][0]["answer"] == qs._natural_lite_answer("what is asthma", [], "definition")
+
+
+def test_timed_out_generation_degrades_instead_of_failure_text(no_terms, monkeypatch):
+    def times_out(*args, deadline=None, **kwargs):
+        # 生成用完了整個預算
+        deadline.expires = monotonic()
+        return qs.ollama_client.FAILURE_PREFIX + "Read timed out"
+
+    monkeypatch.setattr(qs.ollama_client, "call_llm", times_out)
+    body = _query(60_000)
+    assert _degraded(body) == "lite_answer_llm_timeout"
+    assert "失敗" not in body["results"][0]["answer"]
+
+
+def test_direct_llm_only_honours_the_request_budget(monkeypatch):
+    monkeypatch.setattr(qs.nlp_service, "detect_qtype", lambda q: "definition")
+    monkeypatch.setattr(qs.ollama_client, "call_llm", lambda *a, **k: pytest.fail("LLM called"))
+    short = qs.DEADLINE_GENERATION_MIN_MS // 2
+    for kwargs in ({"params": {"question": "what is asthma", "budget_ms": short}},
+                   {"params": {"question": "what is asthma"}, "headers": {"X-Time-Budget-Ms": str(short)}}):
+        body = client.get("/llm_only", **kwargs).json()
+        assert _degraded(body) == "lite_answer_budget_short"
+
+
+def test_budget_ms_is_a_declared_int_parameter():
+    assert client.get("/llm_only", params={"question": "q", "budget_ms": "soon"}).status_code == 422
+    paths = client.get("/openapi.json").json()["paths"]
+    for path in ("/query", "/demo/search", "/llm_only"):
+        assert "budget_ms" in [p["name"] for p in paths[path]["get"]["parameters"]]
+
+
+def test_ner_wait_is_capped_by_the_budget(monkeypatch):
+    waits = []
+
+    class SlowBatcher:
+        def entities(self, text, timeout=None):
+            waits.append(timeout)
+            raise TimeoutError
+
+    monkeypatch.setattr(qs.nlp_service.ner_service, "get_batcher", lambda: SlowBatcher())
+    monkeypatch.setattr(qs.nlp_service, "get_nlp", lambda: pytest.fail("inline NER under a budget"))
+    d = Deadline(2000)
+    assert qs.nlp_service.extract_terms("asthma", deadline=d) == ["asthma"]
+    assert waits[0] <= 2.0 and d.skipped == ["ner"]
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[1]
+# 可用環境變數調整（較慢的 CI 機器）
+IMPORT_TIME_BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "2500"))
+LAZY_MODULES = ("spacy", "neo4j")
+
+_PROBE = f"""
+import json, sys, time
+t0 = time.perf_counter()
+import main
+elapsed_ms = (time.perf_counter() - t0) * 1000
+print(json.dumps({{"ms": elapsed_ms, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def _import_main() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", _PROBE],
+        cwd=APP_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_import_main_has_no_heavy_side_effects():
+    assert _import_main()["loaded"] == []
+
+
+def test_import_main_within_budget():
+    # 取兩次中較快者，避免第一次冷快取（.pyc / 磁碟）造成誤判
+    ms = min(_import_main()["ms"] for _ in range(2))
+    assert ms <= IMPORT_TIME_BUDGET_MS, (
+        f"import main took {ms:.0f} ms (budget {IMPORT_TIME_BUDGET_MS} ms); "
+        "profile with: python -X importtime -c 'import main'"
+    )
@@ -0,0 +1,84 @@
+import asyncio
+import importlib.util
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+CODE_DIR = Path(__file__).resolve().parents[2] / "code"
+
+
+@pytest.fixture
+def je(monkeypatch):
+    # judge_eval 以同目錄 import predictions_store
+    monkeypatch.syspath_prepend(str(CODE_DIR))
+    spec = importlib.util.spec_from_file_location("judge_eval", CODE_DIR / "judge_eval.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeClient:
+    """chat.completions.create() returning (or raising) `reply(call_no)` after a short wait."""
+
+    def __init__(self, reply):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.reply = reply
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        out = self.reply(self.calls)
+        if isinstance(out, Exception):
+            raise out
+        return out
+
+
+def _reply(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _runner(je, reply, **kwargs):
+    client = FakeClient(reply)
+    return client, je.JudgeRunner(client, je.VerdictCache(""), rpm=60_000, backoff_s=0, **kwargs)
+
+
+def _judge_many(runner, n):
+    async def go():
+        return await asyncio.gather(*(runner.judge("q", "a", "ref") for _ in range(n)))
+
+    return asyncio.run(go())
+
+
+def test_identical_triples_share_one_call_and_are_cached(je):
+    client, runner = _runner(je, lambda n: _reply('{"score": 4, "justification": "ok"}'))
+    recs = _judge_many(runner, 5)
+    assert client.calls == 1 and all(r["score"] == 4 for r in recs)
+    assert runner._inflight == {}
+    assert runner.stats["judged"] == 1 and runner.stats["cached"] == 0
+
+
+def test_shared_failure_counts_once_and_is_retried_later(je):
+    error = je.openai.APIConnectionError(request=httpx.Request("POST", "http://judge"))
+    client, runner = _runner(je, lambda n: error, retries=1)
+    recs = _judge_many(runner, 3)
+    assert all(r["score"] is None and "APIConnectionError" in r["judge_note"] for r in recs)
+    assert runner.stats["failed"] == 1 and client.calls == 2
+    assert runner._inflight == {}
+
+    # 失敗不佔快取也不留在 _inflight：同一 triple 之後會重新評分
+    client.reply = lambda n: _reply('{"score": 5}')
+    assert _judge_many(runner, 1)[0]["score"] == 5
+
+
+@pytest.mark.parametrize("resp", [SimpleNamespace(choices=[]), SimpleNamespace(choices=[SimpleNamespace(message=None)]),
+                                  _reply(None)])
+def test_empty_or_malformed_reply_is_unparsed(je, resp):
+    client, runner = _runner(je, lambda n: resp)
+    rec = _judge_many(runner, 1)[0]
+    assert rec["score"] is None
+    assert runner.stats["unparsed"] == 1 and runner.stats["failed"] == 0
+    assert runner.cache.verdicts == {}
@@ -0,0 +1,104 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from clients.llm_backends import OpenAICompatBackend, make_backend, OllamaBackend
+
+
+@pytest.fixture
+def openai_server():
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            seen.append({"path": self.path, "auth": self.headers.get("Authorization"), "body": body})
+            prompts = body["prompt"] if isinstance(body["prompt"], list) else [body["prompt"]]
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    for tok in ["a", "b", "c", "d"]:
+                        event = {"choices": [{"index": 0, "text": tok, "finish_reason": None}]}
+                        self.wfile.write(b"data: " + json.dumps(event).encode() + b"\n\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                return
+            # 回傳順序刻意打亂，驗證以 index 對回原題
+            choices = [
+                {"index": i, "text": f"echo:{p}", "finish_reason": "stop"}
+                for i, p in reversed(list(enumerate(prompts)))
+            ]
+            out = json.dumps({"choices": choices, "usage": {"completion_tokens": 3 * len(prompts)}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v1", seen
+    server.shutdown()
+
+
+def test_single_generation(openai_server):
+    url, seen = openai_server
+    backend = OpenAICompatBackend(base_url=url, api_key="k", model="served")
+    out = backend.generate("hi", "ignored", 32, timeout=5, stop=["\n["])
+    assert out == {"text": "echo:hi", "eval_count": 3, "done_reason": "stop"}
+    req = seen[0]
+    assert req["path"] == "/v1/completions"
+    assert req["auth"] == "Bearer k"
+    assert req["body"]["model"] == "served"
+    assert req["body"]["max_tokens"] == 32
+    assert req["body"]["stop"] == ["\n["]
+
+
+def test_batch_is_one_list_prompt_request(openai_server):
+    url, seen = openai_server
+    backend = OpenAICompatBackend(base_url=url, api_key="")
+    outs = backend.generate_batch(["p0", "p1", "p2"], "m", 16, timeout=5)
+    assert [o["text"] for o in outs] == ["echo:p0", "echo:p1", "echo:p2"]
+    assert len(seen) == 1
+    assert seen[0]["body"]["prompt"] == ["p0", "p1", "p2"]
+    assert seen[0]["auth"] is None
+
+
+def test_batch_without_list_prompts_runs_concurrently(openai_server):
+    url, seen = openai_server
+    backend = OpenAICompatBackend(base_url=url, api_key="", batch_prompts=False, max_parallel=3)
+    outs = backend.generate_batch(["p0", "p1", "p2"], "m", 16, timeout=5)
+    assert [o["text"] for o in outs] == ["echo:p0", "echo:p1", "echo:p2"]
+    assert sorted(r["body"]["prompt"] for r in seen) == ["p0", "p1", "p2"]
+
+
+def test_stream_cancel(openai_server):
+    url, _ = openai_server
+    backend = OpenAICompatBackend(base_url=url, api_key="")
+    out = backend.generate("hi", "m", 32, timeout=5, cancel=lambda text: text.endswith("b"))
+    assert out == {"text": "ab", "eval_count": 2, "done_reason": "cancelled"}
+
+
+def test_batch_reports_transport_errors_per_prompt():
+    backend = OpenAICompatBackend(base_url="http://127.0.0.1:9", api_key="")
+    outs = backend.generate_batch(["a", "b"], "m", 8, timeout=1)
+    assert all(o["done_reason"] == "error" and o["error"] for o in outs)
+
+
+def test_make_backend():
+    assert isinstance(make_backend("ollama"), OllamaBackend)
+    assert isinstance(make_backend("openai"), OpenAICompatBackend)
+    with pytest.raises(ValueError):
+        make_backend("nope")
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from clients.llm_scheduler import LLMScheduler
+from core.settings import Settings
+
+
+def _wait_for_queued(sched: LLMScheduler, n: int, timeout: float = 2.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if sum(sched.stats()["queued"].values()) >= n:
+            return
+        time.sleep(0.005)
+    raise AssertionError("waiters did not queue in time")
+
+
+def test_interactive_dispatched_before_batch():
+    sched = LLMScheduler(max_inflight=1, service_time_s=0.1)
+    sched.acquire("batch", "k1")
+    order = []
+
+    def run(priority, caller, tag):
+        with sched.slot(priority, caller, deadline_s=5):
+            order.append(tag)
+
+    threads = [threading.Thread(target=run, args=("batch", "k1", "batch"))]
+    threads[0].start()
+    _wait_for_queued(sched, 1)
+    threads.append(threading.Thread(target=run, args=("interactive", "k2", "interactive")))
+    threads[1].start()
+    _wait_for_queued(sched, 2)
+
+    sched.release()
+    for t in threads:
+        t.join(timeout=2)
+    assert order == ["interactive", "batch"]
+
+
+def test_round_robin_across_callers():
+    sched = LLMScheduler(max_inflight=1, service_time_s=0.1)
+    sched.acquire("batch", "busy")
+    order = []
+
+    def run(caller, tag):
+        with sched.slot("batch", caller, deadline_s=5):
+            order.append(tag)
+
+    threads = []
+    for caller, tag in [("a", "a1"), ("a", "a2"), ("b", "b1")]:
+        t = threading.Thread(target=run, args=(caller, tag))
+        t.start()
+        threads.append(t)
+        _wait_for_queued(sched, len(threads))
+
+    sched.release()
+    for t in threads:
+        t.join(timeout=2)
+    assert order == ["a1", "b1", "a2"]
+
+
+def test_fast_rejection_with_retry_after():
+    sched = LLMScheduler(max_inflight=1, service_time_s=30.0)
+    sched.acquire("batch", "k1")
+
+    t0 = time.monotonic()
+    with pytest.raises(HTTPException) as exc:
+        sched.acquire("interactive", "k2", deadline_s=5)
+    assert time.monotonic() - t0 < 0.5
+    assert exc.value.status_code == 503
+    assert int(exc.value.headers["Retry-After"]) >= 5
+    assert sched.stats()["rejected"] == 1
+
+
+def test_unbounded_when_disabled():
+    sched = LLMScheduler(max_inflight=0)
+    for _ in range(5):
+        sched.acquire("batch", "k", deadline_s=0)
+    assert sched.stats()["inflight"] == 0
+
+
+def test_batch_slot_takes_only_free_capacity():
+    sched = LLMScheduler(max_inflight=3, service_time_s=0.1)
+    sched.acquire("batch", "other")
+    with sched.slot("batch", "k", deadline_s=1, max_slots=32) as held:
+        assert held == 2
+        assert sched.stats()["inflight"] == 3
+    assert sched.stats()["inflight"] == 1
+
+
+@pytest.mark.parametrize("raw, expected", [(None, 1), ("", 1), ("4", 4), ("0", 0)])
+def test_max_inflight_setting_defaults_to_one_when_empty(monkeypatch, raw, expected):
+    if raw is None:
+        monkeypatch.delenv("LLM_MAX_INFLIGHT", raising=False)
+    else:
+        monkeypatch.setenv("LLM_MAX_INFLIGHT", raw)
+    assert Settings.from_env().LLM_MAX_INFLIGHT == expected
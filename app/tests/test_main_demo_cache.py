@@ -0,0 +1,104 @@
+import importlib.util
+import json
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+CODE_DIR = Path(__file__).resolve().parents[2] / "code"
+
+
+@pytest.fixture
+def demo(tmp_path, monkeypatch):
+    # main_demo_cache 在 import 時掛載相對路徑 static/，並讀取相對路徑 demo_bank.json
+    (tmp_path / "static").mkdir()
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location("main_demo_cache", CODE_DIR / "main_demo_cache.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _write_bank(path: Path, questions: list[str], mtime_ns: int) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps([{"bank_id": str(i), "question": q} for i, q in enumerate(questions)]),
+                   encoding="utf-8")
+    os.utime(tmp, ns=(mtime_ns, mtime_ns))
+    os.replace(tmp, path)
+
+
+def test_best_match_matches_linear_scan(demo):
+    bank = [{"question": q} for q in ("What is asthma?", "Asthma symptoms", "How is asthma treated?")]
+    index = demo.build_bank_index(bank)
+    item, score = demo.find_best_match("asthma symptoms", index)
+    assert item is bank[1] and score == 1.0
+    # 同分時先出現者勝
+    assert demo.find_best_match("asthma", index)[0] is bank[1]
+    assert demo.find_best_match("asthma", bank)[0] is bank[1]
+
+
+def test_stopword_only_overlap_is_not_a_candidate(demo):
+    bank = [{"question": "What is asthma?"}, {"question": "What is diabetes?"}]
+    index = demo.build_bank_index(bank)
+    assert "what" not in index["postings"] and "is" not in index["postings"]
+    assert demo.top_k_matches("what is gout", index) == []
+    assert demo.find_best_match("what is gout", index) == (bank[0], 0.0)
+    # 有共同的索引 token 時，分數仍以完整 token set 計算
+    assert demo.find_best_match("what is diabetes", index) == (bank[1], 1.0)
+
+
+def test_high_df_tokens_are_pruned_from_postings(demo):
+    bank = [{"question": f"asthma question {i}"} for i in range(demo.MIN_DF_BANK_SIZE)]
+    bank.append({"question": "asthma cough"})
+    index = demo.build_bank_index(bank)
+    assert "asthma" not in index["postings"] and "question" not in index["postings"]
+    assert index["postings"]["cough"] == [len(bank) - 1]
+    item, score = demo.find_best_match("asthma cough", index)
+    assert item is bank[-1] and score == 1.0
+
+
+def test_index_reloads_on_change_by_swapping_the_whole_index(demo, tmp_path):
+    bank_path = tmp_path / "demo_bank.json"
+    assert demo.load_demo_bank_index()["bank"] == []
+
+    _write_bank(bank_path, ["What is asthma?"], mtime_ns=1_000_000_000)
+    first = demo.load_demo_bank_index()
+    assert demo.load_demo_bank_index() is first
+
+    _write_bank(bank_path, ["What is asthma?", "What is gout?"], mtime_ns=2_000_000_000)
+    second = demo.load_demo_bank_index()
+    assert second is not first
+    # 先前拿到索引的讀取端不受重建影響
+    assert len(first["bank"]) == len(first["token_sets"]) == 1
+    assert len(second["bank"]) == len(second["token_sets"]) == 2
+    assert demo.find_best_match("gout", second)[0]["bank_id"] == "1"
+
+
+def test_readers_never_see_a_half_built_index(demo, tmp_path):
+    bank_path = tmp_path / "demo_bank.json"
+    stop = threading.Event()
+    torn = []
+
+    def reader():
+        try:
+            while not stop.is_set():
+                index = demo.load_demo_bank_index()
+                if len(index["bank"]) != len(index["token_sets"]):
+                    torn.append(index)
+                elif index["bank"]:
+                    demo.find_best_match("asthma 7", index)
+        except Exception as e:
+            torn.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        for n in range(1, 40):
+            _write_bank(bank_path, [f"asthma {i}" for i in range(n)], mtime_ns=n * 1_000_000_000)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    assert torn == []
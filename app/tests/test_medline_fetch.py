@@ -0,0 +1,106 @@
+import importlib.util
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+CODE_DIR = Path(__file__).resolve().parents[2] / "code"
+
+URL = "https://wsearch.nlm.nih.gov/ws/query?db=healthTopics&term=asthma&rettype=all"
+GOOD = "<nlmSearchResult><list><document url='u'/></list></nlmSearchResult>"
+
+
+@pytest.fixture
+def mf():
+    spec = importlib.util.spec_from_file_location("medline_fetch", CODE_DIR / "medline_fetch.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class StubSession:
+    """Replays canned responses in order and records every GET."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        self.calls.append(url)
+        return self.responses.pop(0)
+
+
+def _fetcher(mf, tmp_path, *responses, **kwargs):
+    fetcher = mf.MedlineFetcher(cache_dir=str(tmp_path / "cache"), rate=0, backoff=0, **kwargs)
+    fetcher._session = StubSession(*responses)
+    return fetcher
+
+
+def _store(mf, root, url, body):
+    path = mf._entry_path(str(root), mf.url_key(url))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"url": url, "body": body}, f)
+    return path
+
+
+def test_offline_miss_raises_without_touching_the_network(mf, tmp_path):
+    fetcher = _fetcher(mf, tmp_path, mode="offline")
+    with pytest.raises(mf.CacheMiss):
+        fetcher.fetch(URL)
+    assert fetcher._session.calls == [] and fetcher.stats["misses"] == 1
+
+
+def test_offline_serves_recorded_fixtures(mf, tmp_path):
+    _store(mf, tmp_path / "fixtures", URL, GOOD)
+    fetcher = _fetcher(mf, tmp_path, mode="offline", fixtures=str(tmp_path / "fixtures"))
+    docs = fetcher.fetch(URL, mf.parse_documents)
+    assert [d.get("url") for d in docs] == ["u"]
+    assert fetcher.stats["fixture_hits"] == 1 and fetcher._session.calls == []
+
+
+def test_unparsable_cached_body_is_ignored_and_downloaded_again(mf, tmp_path):
+    path = _store(mf, tmp_path / "cache", URL, "<html>rate limited")
+    fetcher = _fetcher(mf, tmp_path, FakeResponse(text=GOOD))
+    assert len(fetcher.fetch(URL, mf.parse_documents)) == 1
+    assert fetcher.stats["invalid"] == 1 and fetcher.stats["downloads"] == 1
+    # 重新下載且可解析的內容覆寫壞掉的快取
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["body"] == GOOD
+
+
+def test_unparsable_download_is_not_cached(mf, tmp_path):
+    fetcher = _fetcher(mf, tmp_path, FakeResponse(text="<html>maintenance"))
+    with pytest.raises(Exception):
+        fetcher.fetch(URL, mf.parse_documents)
+    assert fetcher.stats["invalid"] == 1
+    assert not os.path.exists(mf._entry_path(fetcher.cache_dir, mf.url_key(URL)))
+
+
+def test_retry_honours_retry_after(mf, tmp_path, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(mf.time, "sleep", sleeps.append)
+    fetcher = _fetcher(mf, tmp_path, FakeResponse(429, headers={"Retry-After": "7"}), FakeResponse(text=GOOD))
+    assert fetcher.fetch(URL) == GOOD
+    assert sleeps == [7.0] and fetcher.stats["retries"] == 1
+    assert len(fetcher._session.calls) == 2
+
+
+def test_retry_after_parsing(mf):
+    assert mf._retry_after(None) == 0.0
+    assert mf._retry_after("3.5") == 3.5
+    assert mf._retry_after("-1") == 0.0
+    assert mf._retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # 已過去的日期
+    assert mf._retry_after("soon") == 0.0
@@ -0,0 +1,68 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from fastapi import HTTPException
+
+from clients import model_residency
+from clients.model_residency import ModelResidency, parse_policies
+
+
+def test_parse_policies_uses_default_keep_alive():
+    policies = parse_policies("a:8b=-1, b:7b , c=0")
+    assert policies["a:8b"] == "-1"
+    assert policies["b:7b"] == model_residency.settings.OLLAMA_KEEP_ALIVE
+    assert policies["c"] == "0"
+
+
+def test_unlisted_model_is_rejected():
+    res = ModelResidency("main", {"alt": "5m"})
+    assert res.resolve("alt") == ("alt", "5m")
+    with pytest.raises(HTTPException) as exc:
+        res.resolve("not-allowed")
+    assert exc.value.status_code == 400
+    assert res.resolve(None)[0] == "main"
+    assert res.stats()["rejected"] == 1
+
+
+def test_cold_loads_counted_from_load_duration():
+    res = ModelResidency("main", {})
+    res.observe("main", {"load_duration": 5_000_000_000})
+    res.observe("main", {"load_duration": 2_000_000})
+    stats = res.stats()
+    assert stats["cold_loads"] == {"main": 1}
+    assert stats["last_load_ms"]["main"] == 2
+
+
+def test_warm_up_loads_default_and_pinned_models(monkeypatch):
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            seen.append((body["model"], body["prompt"], body["keep_alive"]))
+            out = json.dumps({"response": "", "done": True, "load_duration": 3_000_000_000}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(
+        model_residency.settings, "OLLAMA_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    try:
+        res = ModelResidency("main", {"main": "30m", "pinned": "-1", "adhoc": "0"})
+        res.warm_up()
+    finally:
+        server.shutdown()
+
+    assert sorted(seen) == [("main", "", "30m"), ("pinned", "", "-1")]
+    stats = res.stats()
+    assert stats["warmups"] == 2
+    assert stats["cold_loads_total"] == 2
@@ -0,0 +1,80 @@
+import re
+
+from repositories import neo4j_migrations as mig
+from repositories import neo4j_repository as repo
+
+
+class FakeResult:
+    def __init__(self, rows, hits=0):
+        self.rows = rows
+        self.hits = hits
+
+    def data(self):
+        return list(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def consume(self):
+        return type("Summary", (), {"profile": {"dbHits": self.hits, "children": []}})()
+
+
+class FakeSession:
+    """Descriptions keyed by elementId: {"term", "termNorm"}."""
+
+    def __init__(self, nodes=None, lookup=None):
+        self.nodes = nodes or {}
+        self.lookup = lookup or {}
+        self.writes = []
+
+    def run(self, query, **params):
+        if query.startswith("MATCH (d:Description) WHERE d.term =~ $pattern"):
+            pattern = re.compile(params["pattern"])
+            return FakeResult([{"id": i, **n} for i, n in self.nodes.items() if pattern.fullmatch(n["term"])])
+        if query.startswith("UNWIND"):
+            self.writes.extend(params["rows"])
+            for row in params["rows"]:
+                self.nodes[row["id"]]["termNorm"] = row["norm"]
+            return FakeResult([])
+        query = query.removeprefix("PROFILE ")
+        rows = self.lookup.get(query, [])
+        return FakeResult(rows[:params["limit"]] if "limit" in params else rows, hits=10)
+
+
+def test_whitespace_pattern_matches_only_terms_set_term_norm_cannot_normalize():
+    pattern = re.compile(mig.WHITESPACE_PATTERN)
+    assert pattern.fullmatch("heart  failure") and pattern.fullmatch("heart\tfailure")
+    assert not pattern.fullmatch("heart failure")
+    assert "NOT d.term =~ $pattern" in mig.SET_TERM_NORM
+
+
+def test_collapse_whitespace_is_idempotent():
+    sess = FakeSession({
+        "a": {"term": "Heart   Failure", "termNorm": None},
+        "b": {"term": "Heart\tFailure", "termNorm": "heart failure"},
+        "c": {"term": "Asthma", "termNorm": "asthma"},
+    })
+    assert mig._collapse_whitespace(sess, batch=10) == 1
+    assert sess.nodes["a"]["termNorm"] == "heart failure"
+    sess.writes.clear()
+    assert mig._collapse_whitespace(sess, batch=10) == 0
+    assert sess.writes == []
+
+
+def test_profile_reports_the_production_tiered_rows(monkeypatch, capsys):
+    dup = [{"conceptId": "1", "term": "asthma"}, {"conceptId": "1", "term": "asthma nos"}]
+    sess = FakeSession(lookup={
+        repo.LOOKUP_QUERY: dup,
+        repo.EXACT_LOOKUP_QUERY: dup,
+        repo.CONTAINS_LOOKUP_QUERY: dup + [{"conceptId": str(i), "term": f"asthma {i}"} for i in range(2, 9)],
+    })
+
+    class Driver:
+        def session(self):
+            return type("Ctx", (), {"__enter__": lambda s: sess, "__exit__": lambda s, *a: None})()
+
+    monkeypatch.setattr(repo, "get_driver", lambda: Driver())
+    mig.profile(["asthma"], enough=0)
+    cols = capsys.readouterr().out.splitlines()[1].split()
+    # legacy / exact / contains / tiered db hits, legacy rows, tiered rows
+    assert cols[1:] == ["10", "10", "10", "20", "2", str(repo.LOOKUP_LIMIT)]
@@ -0,0 +1,176 @@
+import threading
+import time
+
+import pytest
+
+from core import cache
+from repositories import neo4j_repository
+
+
+class FakeTx:
+    queries: list = []
+    exact_rows: list = []
+    contains_rows: list | None = None
+    indexes_online: int = 0
+
+    def run(self, query, **params):
+        FakeTx.queries.append(query)
+        if "conceptId" in params:
+            return [{"sourceTerm": "A", "targetTerm": params["conceptId"]}]
+        if "names" in params:
+            return [{"name": n} for n in params["names"][:FakeTx.indexes_online]]
+        if query == neo4j_repository.EXACT_LOOKUP_QUERY:
+            return FakeTx.exact_rows[:params["limit"]]
+        if query == neo4j_repository.CONTAINS_LOOKUP_QUERY and FakeTx.contains_rows is not None:
+            return FakeTx.contains_rows[:params["limit"]]
+        return [{"conceptId": "1", "term": params.get("t", "x")}]
+
+
+class FakeSession:
+    def __init__(self, log):
+        self.log = log
+        self.closed = False
+
+    def execute_read(self, work, **params):
+        self.log.append("read")
+        return work(FakeTx(), **params)
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeDriver:
+    def __init__(self):
+        self.sessions = []
+        self.log = []
+
+    def session(self, **kwargs):
+        sess = FakeSession(self.log)
+        self.sessions.append(sess)
+        return sess
+
+
+@pytest.fixture
+def driver(monkeypatch):
+    fake = FakeDriver()
+    monkeypatch.setattr(neo4j_repository, "_DRIVER", fake)
+    monkeypatch.setattr(neo4j_repository, "_TERM_NORM_READY", False)
+    monkeypatch.setattr(neo4j_repository, "_TERM_NORM_CHECKED_AT", time.monotonic())
+    monkeypatch.setattr(cache, "_CACHES", {})
+    FakeTx.queries = []
+    FakeTx.exact_rows = []
+    FakeTx.contains_rows = None
+    FakeTx.indexes_online = 0
+    return fake
+
+
+def test_calls_outside_a_request_use_their_own_session(driver):
+    neo4j_repository.lookup_concept_ids("asthma")
+    neo4j_repository.get_subgraph("42")
+    assert len(driver.sessions) == 2
+    assert all(s.closed for s in driver.sessions)
+    assert driver.log == ["read", "read"]
+
+
+def test_request_session_is_shared_and_closed(driver):
+    with neo4j_repository.request_session():
+        assert neo4j_repository.lookup_concept_ids("asthma") == [{"conceptId": "1", "term": "asthma"}]
+        with neo4j_repository.request_session():
+            sub = neo4j_repository.get_subgraph("42")
+        assert sub == [{"sourceTerm": "A", "targetTerm": "42"}]
+        assert len(driver.sessions) == 1
+        assert not driver.sessions[0].closed
+    assert driver.sessions[0].closed
+
+
+def test_other_threads_do_not_share_the_request_session(driver):
+    import contextvars
+
+    with neo4j_repository.request_session():
+        neo4j_repository.lookup_concept_ids("a")
+        ctx = contextvars.copy_context()
+        t = threading.Thread(target=ctx.run, args=(neo4j_repository.lookup_concept_ids, "b"))
+        t.start()
+        t.join()
+    assert len(driver.sessions) == 2
+
+
+def test_pool_stats_counts_transactions(driver):
+    before = neo4j_repository.pool_stats()["tx_total"]
+    neo4j_repository.lookup_concept_ids("a")
+    stats = neo4j_repository.pool_stats()
+    assert stats["tx_total"] == before + 1
+    assert stats["tx_inflight"] == 0
+    assert stats["max_pool_size"] == neo4j_repository.settings.NEO4J_MAX_POOL_SIZE
+
+
+def test_legacy_query_until_term_norm_indexes_exist(driver):
+    neo4j_repository.lookup_concept_ids("Asthma")
+    assert FakeTx.queries == [neo4j_repository.LOOKUP_QUERY]
+
+
+def test_tiered_lookup_skips_contains_when_exact_is_enough(driver, monkeypatch):
+    monkeypatch.setattr(neo4j_repository, "_TERM_NORM_READY", True)
+    FakeTx.exact_rows = [{"conceptId": "195967001", "term": "Asthma"}]
+    rows = neo4j_repository.lookup_concept_ids("  Asthma ")
+    assert rows == [{"conceptId": "195967001", "term": "Asthma"}]
+    assert FakeTx.queries == [neo4j_repository.EXACT_LOOKUP_QUERY]
+
+
+def test_tiered_lookup_falls_through_to_contains(driver, monkeypatch):
+    monkeypatch.setattr(neo4j_repository, "_TERM_NORM_READY", True)
+    rows = neo4j_repository.lookup_concept_ids("Heart   Failure")
+    assert rows == [{"conceptId": "1", "term": "heart failure"}]
+    assert FakeTx.queries == [neo4j_repository.EXACT_LOOKUP_QUERY, neo4j_repository.CONTAINS_LOOKUP_QUERY]
+
+
+def test_lookups_are_cached_and_returned_as_copies(driver):
+    first = neo4j_repository.lookup_concept_ids("asthma")
+    first.append({"conceptId": "mutated"})
+    second = neo4j_repository.lookup_concept_ids("asthma")
+    assert second == [{"conceptId": "1", "term": "asthma"}]
+    assert FakeTx.queries == [neo4j_repository.LOOKUP_QUERY]
+    assert cache.stats()["lookup"]["l1_hits"] == 1
+
+
+def test_tiered_lookup_dedupes_concepts_across_tiers(driver, monkeypatch):
+    monkeypatch.setattr(neo4j_repository, "_TERM_NORM_READY", True)
+    monkeypatch.setattr(neo4j_repository.settings, "NEO4J_LOOKUP_EXACT_ENOUGH", 3)
+    FakeTx.exact_rows = [{"conceptId": "195967001", "term": "Asthma"},
+                         {"conceptId": "195967001", "term": "Bronchial asthma"}]
+    FakeTx.contains_rows = [{"conceptId": "195967001", "term": "Asthma attack"},
+                            {"conceptId": "233678006", "term": "Childhood asthma"}]
+    rows = neo4j_repository.lookup_concept_ids("asthma")
+    assert rows == [{"conceptId": "195967001", "term": "Asthma"},
+                    {"conceptId": "233678006", "term": "Childhood asthma"}]
+
+
+def test_tiered_lookup_returns_at_most_five_concepts(driver, monkeypatch):
+    monkeypatch.setattr(neo4j_repository, "_TERM_NORM_READY", True)
+    monkeypatch.setattr(neo4j_repository.settings, "NEO4J_LOOKUP_EXACT_ENOUGH", 0)
+    FakeTx.exact_rows = [{"conceptId": "e1", "term": "asthma"}, {"conceptId": "e2", "term": "asthma"}]
+    FakeTx.contains_rows = [{"conceptId": "e1", "term": "asthma x"}] + [
+        {"conceptId": f"c{i}", "term": f"asthma {i}"} for i in range(10)]
+    rows = neo4j_repository.lookup_concept_ids("asthma")
+    assert [r["conceptId"] for r in rows] == ["e1", "e2", "c0", "c1", "c2"]
+    assert len(rows) == neo4j_repository.LOOKUP_LIMIT
+
+
+def test_term_norm_readiness_is_rechecked_after_a_negative_answer(driver, monkeypatch):
+    monkeypatch.setattr(neo4j_repository, "_TERM_NORM_READY", None)
+    assert neo4j_repository.term_norm_ready() is False
+    FakeTx.indexes_online = 2
+    # 間隔內沿用否定結果，不重查
+    assert neo4j_repository.term_norm_ready() is False
+    monkeypatch.setattr(neo4j_repository, "_TERM_NORM_CHECKED_AT",
+                        time.monotonic() - neo4j_repository.TERM_NORM_RECHECK_S)
+    assert neo4j_repository.term_norm_ready() is True
+    checks = len(driver.log)
+    assert neo4j_repository.term_norm_ready() is True
+    assert len(driver.log) == checks
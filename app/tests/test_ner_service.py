@@ -0,0 +1,134 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.settings import settings
+from services import ner_service, nlp_service
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Runs the "worker process" in a thread and records every nlp.pipe batch."""
+    seen: list[list[str]] = []
+
+    def fake_pipe(texts):
+        seen.append(list(texts))
+        if any(t == "boom" for t in texts):
+            raise RuntimeError("model crashed")
+        return [[t.upper()] for t in texts]
+
+    monkeypatch.setattr(ner_service, "ProcessPoolExecutor",
+                        lambda max_workers, **kwargs: ThreadPoolExecutor(max_workers))
+    monkeypatch.setattr(ner_service, "_pipe_entities", fake_pipe)
+    return seen
+
+
+def _submit_together(batcher, texts):
+    gate = threading.Barrier(len(texts))
+    futures = [None] * len(texts)
+
+    def one(i):
+        gate.wait()
+        futures[i] = batcher.submit(texts[i])
+
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(len(texts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return futures
+
+
+def test_texts_within_the_window_share_one_batch(batches):
+    b = ner_service.NerBatcher(workers=1, window_ms=200, max_batch=32)
+    try:
+        futures = _submit_together(b, ["asthma", "copd", "flu"])
+        # 每個呼叫端只拿到自己那句的結果
+        assert [f.result(timeout=5) for f in futures] == [["ASTHMA"], ["COPD"], ["FLU"]]
+    finally:
+        b.shutdown()
+    assert len(batches) == 1 and sorted(batches[0]) == ["asthma", "copd", "flu"]
+    assert b.batches == 1 and b.items == 3
+
+
+def test_max_batch_splits_batches(batches):
+    b = ner_service.NerBatcher(workers=1, window_ms=200, max_batch=2)
+    try:
+        futures = _submit_together(b, ["a", "b", "c", "d", "e"])
+        assert sorted(f.result(timeout=5)[0] for f in futures) == ["A", "B", "C", "D", "E"]
+    finally:
+        b.shutdown()
+    assert all(len(batch) <= 2 for batch in batches)
+    assert sum(len(batch) for batch in batches) == 5
+
+
+def test_worker_error_fails_every_caller_in_the_batch(batches):
+    b = ner_service.NerBatcher(workers=1, window_ms=200, max_batch=32)
+    try:
+        futures = _submit_together(b, ["boom", "asthma"])
+        for f in futures:
+            with pytest.raises(RuntimeError, match="model crashed"):
+                f.result(timeout=5)
+        # 之後的批次不受影響
+        assert b.entities("copd", timeout=5) == ["COPD"]
+    finally:
+        b.shutdown()
+
+
+def test_ner_workers_zero_runs_inline(monkeypatch):
+    class FakeDoc:
+        ents = [type("Ent", (), {"text": "Asthma"})()]
+
+    monkeypatch.setattr(settings, "NER_WORKERS", 0)
+    monkeypatch.setattr(nlp_service, "get_nlp", lambda: lambda text: FakeDoc())
+    assert ner_service.get_batcher() is None
+    assert "asthma" in nlp_service.extract_terms("what is asthma")
+
+
+def test_warm_up_skips_parent_model_when_batched(monkeypatch):
+    monkeypatch.setattr(settings, "NER_WORKERS", 2)
+    monkeypatch.setattr(nlp_service, "get_nlp", lambda: pytest.fail("parent loaded scispaCy"))
+    monkeypatch.setattr(nlp_service, "_VOCAB_READY", True)
+    assert nlp_service.warm_up()["ner"] == "batched"
+
+
+def test_broken_pool_is_replaced_and_serves_the_next_batch(monkeypatch):
+    from concurrent.futures.process import BrokenProcessPool
+
+    class DyingPool(ThreadPoolExecutor):
+        """Like a ProcessPoolExecutor whose worker died: fails its batch, then refuses work."""
+
+        def __init__(self, max_workers):
+            super().__init__(max_workers)
+            self.broken = False
+
+        def submit(self, fn, *args):
+            if self.broken:
+                raise BrokenProcessPool("pool is broken")
+            if args[0] == ["die"]:
+                self.broken = True
+                return super().submit(lambda: (_ for _ in ()).throw(BrokenProcessPool("worker died")))
+            return super().submit(fn, *args)
+
+    pools = []
+
+    def factory(max_workers, **kwargs):
+        pools.append(DyingPool(max_workers))
+        return pools[-1]
+
+    monkeypatch.setattr(ner_service, "ProcessPoolExecutor", factory)
+    monkeypatch.setattr(ner_service, "_pipe_entities", lambda texts: [[t.upper()] for t in texts])
+    b = ner_service.NerBatcher(workers=1, window_ms=0)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            b.entities("die", timeout=5)
+        assert b.entities("asthma", timeout=5) == ["ASTHMA"]
+        assert b.restarts == 1 and len(pools) == 2 and b._pool is pools[1]
+
+        # submit() 本身就發現 pool 壞掉時，同一批直接改送新 pool
+        pools[1].broken = True
+        assert b.entities("copd", timeout=5) == ["COPD"]
+        assert b.restarts == 2 and b._pool is pools[2]
+    finally:
+        b.shutdown()
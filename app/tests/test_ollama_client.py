@@ -0,0 +1,116 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from clients import llm_scheduler, ollama_client
+from services import prompt_builder
+
+TOKENS = ["[根據知識圖譜]\n", "定義。\n", "\n[一般性補充]\n", "- a\n", "- b\n", "- c\n", "- d\n", "- e\n"]
+# 串流結束時回報的 done_reason（Ollama 在自然結束 / EOS 時也回 "stop"）
+FINAL_REASON = {"value": "length"}
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            requests_seen.append(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            if not body.get("stream"):
+                self.wfile.write(json.dumps({
+                    "response": "".join(TOKENS[:2]), "done": True,
+                    "done_reason": "stop", "eval_count": 2,
+                }).encode())
+                return
+            try:
+                for tok in TOKENS:
+                    self.wfile.write(json.dumps({"response": tok, "done": False}).encode() + b"\n")
+                    self.wfile.flush()
+                self.wfile.write(json.dumps({
+                    "response": "", "done": True, "done_reason": FINAL_REASON["value"],
+                    "eval_count": len(TOKENS),
+                }).encode() + b"\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(ollama_client.settings, "OLLAMA_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(llm_scheduler, "scheduler", llm_scheduler.LLMScheduler(0))
+    yield requests_seen
+    server.shutdown()
+
+
+def test_research_stop_sequence_seen_in_stream_aborts(fake_ollama):
+    stop = prompt_builder.stop_sequences("research", "definition")
+    with ollama_client.track_generations() as log:
+        ans = ollama_client.call_llm("q", model_name=None, num_predict=200, stop=stop)
+    assert ans == "[根據知識圖譜]\n定義。"
+    assert fake_ollama[0]["stream"] is True
+    assert "stop" not in fake_ollama[0]["options"]
+    assert log[0]["done_reason"] == "cancelled"
+    assert log[0]["eval_count"] == 3
+    assert log[0]["tokens_saved"] == 197
+    assert prompt_builder.stop_sequences("user", "definition") == []
+
+
+def test_natural_end_with_stop_sequences_saves_nothing(fake_ollama, monkeypatch):
+    monkeypatch.setitem(FINAL_REASON, "value", "stop")
+    with ollama_client.track_generations() as log:
+        ans = ollama_client.call_llm("q", num_predict=200, stop=["\n## 一般性補充"])
+    assert ans.endswith("- e")
+    assert log[0]["done_reason"] == "stop"
+    assert log[0]["tokens_saved"] == 0
+
+
+def test_stream_cancelled_once_predicate_holds(fake_ollama):
+    def enough(text):
+        return text.count("\n- ") >= 2
+
+    with ollama_client.track_generations() as log:
+        ans = ollama_client.call_llm("q", num_predict=100, cancel=enough)
+    assert fake_ollama[0]["stream"] is True
+    assert ans.endswith("- b")
+    assert log[0]["done_reason"] == "cancelled"
+    assert log[0]["eval_count"] == 5
+    assert log[0]["tokens_saved"] == 95
+
+
+def test_stream_runs_to_completion_without_savings(fake_ollama):
+    with ollama_client.track_generations() as log:
+        ans = ollama_client.call_llm("q", num_predict=100, cancel=lambda text: False)
+    assert ans.endswith("- e")
+    assert log[0]["done_reason"] == "length"
+    assert log[0]["tokens_saved"] == 0
+
+
+def test_batch_prompts_each_count_against_inflight_limit(monkeypatch):
+    sched = llm_scheduler.LLMScheduler(2)
+    chunks = []
+
+    class FakeBackend:
+        name = "openai"
+
+        def generate_batch(self, prompts, model, num_predict, timeout, stop=None, keep_alive=None):
+            chunks.append((len(prompts), sched.stats()["inflight"]))
+            return [{"text": p.upper(), "eval_count": 1, "done_reason": "stop"} for p in prompts]
+
+    monkeypatch.setattr(llm_scheduler, "scheduler", sched)
+    monkeypatch.setattr(ollama_client.llm_backends, "get_backend", lambda: FakeBackend())
+    answers = ollama_client.call_llm_batch(["a", "b", "c", "d", "e"])
+    assert answers == ["A", "B", "C", "D", "E"]
+    assert chunks == [(2, 2), (2, 2), (1, 1)]
+    assert sched.stats()["inflight"] == 0
@@ -1,3 +1,5 @@
+import time
+
 from fastapi.testclient import TestClient
 
 import routers.api as api_router_module
@@ -109,3 +111,126 @@ def test_demo_search_post_smoke(monkeypatch):
     resp = client.post("/demo/search", json={"question": "asthma symptoms"})
     assert resp.status_code == 200
     assert resp.json()["answers"]["a_text"] == "stubbed post demo answer"
+
+
+def _fake_core(request, question, **kwargs):
+    return {
+        "question": question,
+        "qtype": "definition",
+        "extracted_terms": ["asthma"],
+        "debug": [{"input_term": "asthma", "match_count": 1}],
+        "results": [{"term": "Asthma", "conceptId": "195967001", "subgraph_size": 3,
+                     "subgraph_summary": ["Asthma → Disorder of lung"] * 40,
+                     "answer": "stubbed core answer", "relevance": 1.0}],
+    }
+
+
+def test_query_lean_mode_omits_diagnostics(monkeypatch):
+    monkeypatch.setattr(api_router_module.query_service, "_query", _fake_core)
+    full = client.get("/query", params={"question": "what is asthma"}).json()
+    lean = client.get("/query", params={"question": "what is asthma", "debug": 0}).json()
+    assert full["debug"] == [{"input_term": "asthma", "match_count": 1}]
+    assert "debug" not in lean
+    # 未回傳的欄位（note / job）不以 null 輸出
+    assert "job" not in lean and "note" not in lean["results"][0]
+    assert lean["results"] == full["results"]
+
+
+def test_large_responses_are_compressed(monkeypatch):
+    monkeypatch.setattr(api_router_module.query_service, "_query", _fake_core)
+    resp = client.get("/query", params={"question": "what is asthma"}, headers={"Accept-Encoding": "gzip"})
+    assert resp.headers.get("content-encoding") == "gzip"
+    assert resp.json()["results"][0]["answer"] == "stubbed core answer"
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+def test_responses_carry_server_build():
+    build = client.get("/health").headers.get("X-Server-Build")
+    assert build and client.get("/health").headers["X-Server-Build"] == build
+
+
+def test_query_timing_breaks_out_fallback_generation(monkeypatch):
+    qs = api_router_module.query_service
+    monkeypatch.setattr(qs.nlp_service, "detect_qtype", lambda q: "definition")
+    monkeypatch.setattr(qs.nlp_service, "extract_terms", lambda q, deadline=None: ["asthma"])
+    monkeypatch.setattr(qs.nlp_service, "lookup_concept_ids",
+                        lambda term, allow_fuzzy=True: [{"conceptId": "195967001", "term": "asthma"}])
+    monkeypatch.setattr(qs.neo4j_repository, "get_subgraph",
+                        lambda cid: [{"sourceTerm": "Asthma", "targetTerm": "Disorder of lung"}])
+    monkeypatch.setattr(qs.nlp_service, "rerank_pairs", lambda pairs, q, qtype: pairs)
+    monkeypatch.setattr(qs.nlp_service, "overlap_ratio", lambda q, pairs, topn=8: 1.0)
+    monkeypatch.setattr(qs.nlp_service, "facet_evidence_level", lambda pairs, qtype: "strong")
+    monkeypatch.setattr(qs, "_call_llm_or_lite", lambda *a, **k: "bad")
+    monkeypatch.setattr(qs.nlp_service, "is_bad_answer", lambda ans: ans == "bad")
+
+    def slow_llm_only(**kwargs):
+        time.sleep(0.02)
+        return {"results": [{"answer": "regenerated answer"}]}
+
+    monkeypatch.setattr(qs, "llm_only", slow_llm_only)
+    body = client.get("/query", params={"question": "what is asthma"}).json()
+    timing = next(d["timing_ms"] for d in body["debug"] if "timing_ms" in d)
+    assert body["results"][0]["note"] == "fallback_llm_only_after_bad_llm"
+    assert set(timing) == {"lookup", "generation", "fallback_llm", "total"}
+    assert 20 <= timing["fallback_llm"] <= timing["generation"] <= timing["total"]
+
+
+def test_generate_sends_prompt_without_answer_template(monkeypatch):
+    import services.query_service as qs
+
+    sent = []
+
+    def fake_complete(prompt, model_name=None, num_predict=256, stop=None, **kwargs):
+        sent.append((prompt, num_predict, stop))
+        return {"text": "What are the signs of asthma?"}
+
+    monkeypatch.setattr(qs.nlp_service, "detect_qtype", lambda q: (_ for _ in ()).throw(AssertionError))
+    monkeypatch.setattr(qs.ollama_client, "complete", fake_complete)
+    monkeypatch.setattr(qs.ollama_client, "complete_batch",
+                        lambda prompts, **kwargs: [{"text": "ok"}, {"error": "timeout"}])
+
+    body = client.post("/generate", json={"prompt": "Paraphrase: asthma symptoms?", "num_predict": 5000,
+                                          "stop": ["\n"]}).json()
+    assert sent == [("Paraphrase: asthma symptoms?", qs.GENERATE_MAX_TOKENS, ["\n"])]
+    assert body["results"] == [{"text": "What are the signs of asthma?"}]
+
+    batch = client.post("/generate", json={"prompts": ["a", "b"]}).json()
+    assert batch["results"] == [{"text": "ok"}, {"text": "", "error": "timeout"}]
+    assert client.post("/generate", json={"prompt": "  "}).status_code == 400
+    assert client.post("/generate", json={"prompt": "hi", "num_predict": "many"}).status_code == 422
+    assert client.post("/generate", json={"prompts": "not a list"}).status_code == 422
+
+
+def test_unknown_model_is_rejected_before_generation(monkeypatch):
+    import services.query_service as qs
+
+    monkeypatch.setattr(qs.ollama_client, "call_llm", lambda *a, **k: (_ for _ in ()).throw(AssertionError))
+    resp = client.get("/llm_only", params={"question": "what is asthma", "model": "not-allowed:1b"})
+    assert resp.status_code == 400
+    assert "not-allowed:1b" in resp.json()["detail"]
+    assert client.post("/generate", json={"prompt": "hi", "model": "not-allowed:1b"}).status_code == 400
+
+
+def test_llm_only_without_question_is_not_a_server_error(monkeypatch):
+    import services.query_service as qs
+
+    monkeypatch.setattr(qs.nlp_service, "detect_qtype", lambda q: "definition")
+    monkeypatch.setattr(qs.ollama_client, "call_llm", lambda *a, **k: "stubbed")
+    resp = client.get("/llm_only")
+    assert resp.status_code == 200
+    assert resp.json()["question"] is None
+
+
+def test_demo_search_post_tolerates_null_and_rejects_bad_ints(monkeypatch):
+    seen = {}
+
+    def fake_demo_search(**kwargs):
+        seen.update(kwargs)
+        return {"question": kwargs["question"], "results": []}
+
+    monkeypatch.setattr(api_router_module.query_service, "demo_search_compat_response", fake_demo_search)
+    resp = client.post("/demo/search", json={"question": "asthma", "debug": None, "lite": None, "max_k": ""})
+    assert resp.status_code == 200
+    assert (seen["debug"], seen["lite"], seen["max_k"]) == (1, 0, 1)
+    assert client.post("/demo/search", json={"question": "asthma", "debug": "yes"}).status_code == 422
@@ -3,95 +3,10 @@
 import argparse
 import json
 import csv
+import os
 import time
-import re
-import requests
-from collections import Counter
-from math import log, exp
-
-# ============ Tokenization ============
-
-
-def tokenize(text: str):
-    text = (text or "").lower()
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    return [t for t in text.split() if t]
-
-# ============ ROUGE-1 / ROUGE-L ============
-
-
-def rouge1(pred: str, gold: str):
-    p_toks, g_toks = tokenize(pred), tokenize(gold)
-    if not p_toks or not g_toks:
-        return 0.0, 0.0, 0.0
-    pc, gc = Counter(p_toks), Counter(g_toks)
-    overlap = sum((pc & gc).values())
-    prec = overlap / len(p_toks)
-    rec = overlap / len(g_toks)
-    f1 = 0.0 if prec + rec == 0 else 2 * prec * rec / (prec + rec)
-    return prec, rec, f1
-
-
-def lcs_len(a, b):
-    n, m = len(a), len(b)
-    dp = [0]*(m+1)
-    for i in range(1, n+1):
-        prev = 0
-        for j in range(1, m+1):
-            tmp = dp[j]
-            if a[i-1] == b[j-1]:
-                dp[j] = prev + 1
-            else:
-                dp[j] = max(dp[j], dp[j-1])
-            prev = tmp
-    return dp[m]
-
-
-def rougeL(pred: str, gold: str):
-    p_toks, g_toks = tokenize(pred), tokenize(gold)
-    if not p_toks or not g_toks:
-        return 0.0, 0.0, 0.0
-    lcs = lcs_len(p_toks, g_toks)
-    prec = lcs / len(p_toks)
-    rec = lcs / len(g_toks)
-    f1 = 0.0 if prec + rec == 0 else 2 * prec * rec / (prec + rec)
-    return prec, rec, f1
-
-# ============ BLEU-4（原生實作，無需外部套件） ============
-
-
-def ngrams(tokens, n):
-    return [tuple(tokens[i:i+n]) for i in range(len(tokens)-n+1)]
-
-
-def clipped_precision(candidate, reference, n):
-    cand_ngrams = Counter(ngrams(candidate, n))
-    ref_ngrams = Counter(ngrams(reference, n))
-    if not cand_ngrams:
-        return 0.0
-    overlap = 0
-    for g, c in cand_ngrams.items():
-        overlap += min(c, ref_ngrams.get(g, 0))
-    return overlap / sum(cand_ngrams.values())
-
-
-def bleu4(pred: str, gold: str):
-    cand = tokenize(pred)
-    ref = tokenize(gold)
-    if not cand or not ref:
-        return 0.0
-    # Brevity penalty
-    c = len(cand)
-    r = len(ref)
-    bp = 1.0 if c > r else exp(1 - r / max(c, 1))
-    # Modified precisions with smoothing
-    precisions = []
-    eps = 1e-9
-    for n in range(1, 5):
-        p_n = clipped_precision(cand, ref, n)
-        precisions.append(max(p_n, eps))
-    geo_mean = exp(sum(log(p) for p in precisions) / 4.0)
-    return bp * geo_mean
+from predictions_store import add_store_args, fetch, open_store
+from scoring import METRICS, metric_triplet, score_all
 
 # ============ Utils ============
 
@@ -105,6 +20,26 @@ def trim_words(text, max_words, hard_cap=2000):
 def ensure_leading_slash(path: str) -> str:
     return path if path.startswith("/") else "/" + path
 
+
+# 伺服器 debug.timing_ms 的階段（毫秒）；fallback_llm 為 fallback 重新生成的時間，已含在 generation 內
+TIMING_STAGES = ("lookup", "generation", "fallback_llm", "total")
+TIMING_COLS = ["fallback"] + [f"server_{s}_ms" for s in TIMING_STAGES]
+
+
+def server_timing(data) -> list:
+    """[fallback path, *stage ms] from the debug list of a /query response ('' / None when absent)."""
+    debug = data.get("debug") if isinstance(data, dict) else None
+    fallback, timing = "", {}
+    for d in debug if isinstance(debug, list) else []:
+        if isinstance(d, dict):
+            fallback = d.get("fallback") or fallback
+            timing = d.get("timing_ms") or timing
+    if not fallback:
+        results = (data.get("results") or [{}]) if isinstance(data, dict) else [{}]
+        note = (results[0] or {}).get("note") or ""
+        fallback = note if "fallback" in note else ""
+    return [fallback] + [timing.get(s) for s in TIMING_STAGES]
+
 # ============ Main ============
 
 
@@ -121,12 +56,14 @@ def main():
                     help="HTTP timeout seconds")
     ap.add_argument("--out", default="results.csv", help="Output CSV")
     ap.add_argument(
-        "--metric", choices=["rouge1", "rougeL", "bleu4"], default="rougeL")
+        "--metric", choices=METRICS, default="rougeL")
     ap.add_argument("--gold_max_words", type=int, default=120)
     ap.add_argument("--lite", action="store_true",
                     help="Pass lite=1 to API (skip LLM on server if supported)")
     ap.add_argument("--save_extra", type=str, default="",
                     help="Comma-separated JSONPaths from API response to save as columns, e.g. 'results.0.note,results.0.subgraph_summary'")
+    ap.add_argument("--api_key", default=os.getenv("APP_API_KEY", ""), help="API key sent as X-API-KEY header")
+    add_store_args(ap)
     args = ap.parse_args()
     # parse extra jsonpaths, and precompute csv-safe column names
     extra_paths = [p.strip()
@@ -151,16 +88,9 @@ def main():
     endpoint = ensure_leading_slash(args.endpoint)
     base = args.host.rstrip("/")
 
-    # Pick scorer
-    if args.metric == "rouge1":
-        def scorer(p, g): return rouge1(p, g)
-    elif args.metric == "rougeL":
-        def scorer(p, g): return rougeL(p, g)
-    else:  # bleu4
-        # store BLEU in F1 column
-        def scorer(p, g): return (0.0, 0.0, bleu4(p, g))
-
-    rows, n = [], 0
+    # 已存過的答案（同題、同參數、同 server build）直接讀 predictions store，不再呼叫 API
+    store, build = open_store(args, base, args.api_key)
+    rows, n, calls = [], 0, 0
 
     with open(args.input, "r", encoding="utf-8") as f:
         for line in f:
@@ -179,21 +109,20 @@ def main():
             err = ""
             qtype = ""
             note = ""
+            timing_vals = [""] + [None] * len(TIMING_STAGES)
             latency = 0.0
+            cached = args.offline
 
             try:
-                params = {"question": q}
-                if args.lite:
-                    params["lite"] = 1
-
+                params = {"lite": 1} if args.lite else {}
                 t0 = time.time()
-                r = requests.get(f"{base}{endpoint}",
-                                 params=params, timeout=args.timeout)
-                latency = time.time() - t0
-                r.raise_for_status()
-                data = r.json()
+                data, latency, cached = fetch(store, base, endpoint, q, params, build,
+                                              timeout=args.timeout, api_key=args.api_key,
+                                              offline=args.offline, refresh=args.refresh)
+                calls += 0 if cached else 1
                 results = data.get("results") or []
                 qtype = data.get("qtype")  # << 新增：題型
+                timing_vals = server_timing(data)
                 if results:
                     top = results[0]
                     pred = (top.get("answer") or "").strip()
@@ -209,9 +138,9 @@ def main():
                 if latency == 0.0:
                     latency = time.time() - t0 if 't0' in locals() else 0.0
 
-            prec, rec, f1 = scorer(pred, gold)
+            # 分數在全部題目跑完後整批計算（scoring.py），先放佔位
             base_row = [q, gold, pred,
-                        f1, prec, rec,
+                        0.0, 0.0, 0.0,
                         latency,
                         len(pred) if isinstance(pred, str) else 0,
                         top_concept, subgraph_size,
@@ -230,9 +159,22 @@ def main():
                 except Exception:
                     extra_vals = [None] * len(extra_paths)
 
-            rows.append(base_row + extra_vals)
+            rows.append(base_row + extra_vals + timing_vals)
             n += 1
-            time.sleep(args.sleep)
+            if not cached:
+                time.sleep(args.sleep)
+
+    if store is not None:
+        store.close()
+        print(f"API calls: {calls}; read from store: {n - calls} ({args.store}, build={build or 'newest'})")
+
+    # 一次 tokenize、整批計算所有指標；--metric 決定 f1/precision/recall 欄，
+    # 其餘指標另存欄位，換指標可用 scoring.py 離線重算，不需重跑 API
+    scores = score_all([r[2] for r in rows], [r[1] for r in rows])
+    f1s, precs, recs = metric_triplet(scores, args.metric)
+    for i, r in enumerate(rows):
+        r[3], r[4], r[5] = float(f1s[i]), float(precs[i]), float(recs[i])
+        r.extend(float(scores[col][i]) for col in scores)
 
     with open(args.out, "w", encoding="utf-8", newline="") as wf:
         w = csv.writer(wf)
@@ -245,6 +187,8 @@ def main():
         ]
         if extra_cols:
             header += extra_cols
+        header += TIMING_COLS
+        header += list(scores)
         w.writerow(header)
         w.writerows(rows)
 
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# bench_ner_batching.py
+# 比較 scispaCy NER：逐題 inline 呼叫 vs. NerBatcher 在不同 batch window 下的吞吐量與延遲。
+import argparse
+import csv
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.ner_service import MODEL_PATH, NerBatcher  # noqa: E402
+
+SAMPLE_QUESTIONS = [
+    "What is asthma?",
+    "What are the symptoms of chronic obstructive pulmonary disease?",
+    "How is type 2 diabetes mellitus treated?",
+    "What is gastroesophageal reflux disease?",
+    "What are the symptoms of Parkinson's disease?",
+    "How is hypertension treated?",
+    "What is iron deficiency anemia?",
+    "What are the symptoms of urinary tract infection?",
+]
+
+
+def load_questions(path: str, limit: int) -> list[str]:
+    if not path:
+        return SAMPLE_QUESTIONS
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            q = (json.loads(line).get("question") or "").strip()
+            if q:
+                out.append(q)
+            if limit and len(out) >= limit:
+                break
+    return out or SAMPLE_QUESTIONS
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = min(len(s) - 1, max(0, int(round(p / 100.0 * (len(s) - 1)))))
+    return s[k]
+
+
+def run_clients(call, questions: list[str], clients: int, total: int) -> dict:
+    latencies: list[float] = []
+    lock = threading.Lock()
+    counter = {"next": 0}
+
+    def worker():
+        while True:
+            with lock:
+                i = counter["next"]
+                if i >= total:
+                    return
+                counter["next"] += 1
+            q = questions[i % len(questions)]
+            t0 = time.perf_counter()
+            call(q)
+            dt = time.perf_counter() - t0
+            with lock:
+                latencies.append(dt)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    return {
+        "n": len(latencies),
+        "wall_sec": round(wall, 3),
+        "throughput_qps": round(len(latencies) / max(wall, 1e-9), 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark NER throughput vs. batch window.")
+    ap.add_argument("--model", default=str(MODEL_PATH), help="scispaCy model directory")
+    ap.add_argument("--input", default="", help="Optional JSONL with a question field")
+    ap.add_argument("--limit", type=int, default=200)
+    ap.add_argument("--total", type=int, default=400, help="Requests per configuration")
+    ap.add_argument("--clients", type=int, default=16, help="Concurrent caller threads")
+    ap.add_argument("--workers", type=int, default=2, help="NER worker processes")
+    ap.add_argument("--max_batch", type=int, default=32)
+    ap.add_argument("--windows", default="0,2,5,10,20,50", help="Comma-separated batch windows (ms)")
+    ap.add_argument("--out", default="", help="Optional CSV output")
+    args = ap.parse_args()
+
+    questions = load_questions(args.input, args.limit)
+    rows = []
+
+    # Baseline: current behaviour, nlp(text) on each request thread
+    from spacy.util import load_model_from_path
+    nlp = load_model_from_path(Path(args.model))
+    nlp(questions[0])
+    res = run_clients(lambda q: [e.text for e in nlp(q).ents], questions, args.clients, args.total)
+    rows.append({"mode": "inline", "workers": 0, "window_ms": "", **res})
+    print(rows[-1])
+
+    for w in [int(x) for x in args.windows.split(",") if x.strip()]:
+        batcher = NerBatcher(workers=args.workers, window_ms=w,
+                             max_batch=args.max_batch, model_path=args.model)
+        # warm-up: every worker loads the model before measuring
+        for f in [batcher.submit(questions[0]) for _ in range(args.workers * 2)]:
+            f.result(timeout=600)
+        b0, i0 = batcher.batches, batcher.items
+        res = run_clients(batcher.entities, questions, args.clients, args.total)
+        n_batches = batcher.batches - b0
+        res["mean_batch"] = round((batcher.items - i0) / max(1, n_batches), 2)
+        batcher.shutdown()
+        rows.append({"mode": "batched", "workers": args.workers, "window_ms": w, **res})
+        print(rows[-1])
+
+    cols = ["mode", "workers", "window_ms", "n", "wall_sec",
+            "throughput_qps", "p50_ms", "p95_ms", "mean_batch"]
+    print()
+    print("  ".join(f"{c:>14}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{str(r.get(c, '')):>14}" for c in cols))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=cols)
+            w.writeheader()
+            w.writerows(rows)
+        print("Saved:", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import os
+import argparse
 import pandas as pd
-import numpy as np
+
+from bootstrap_stats import CI_METHODS, N_BOOT, run_many
 
 # 四組比較：(資料集, 指標, 純LLM檔, v5c檔, 輸出delta分布檔名)
 pairs = [
@@ -15,39 +17,62 @@ pairs = [
 ]
 
 
-def bootstrap_ci(a_csv, b_csv, col="f1", n_boot=2000, seed=0):
-    a = pd.read_csv(a_csv)[col].values
-    b = pd.read_csv(b_csv)[col].values
+def load_pair(a_csv, b_csv, cols, strata_col=None):
+    a = pd.read_csv(a_csv)
+    b = pd.read_csv(b_csv)
     if len(a) != len(b):
         raise ValueError(
             f"Length mismatch: {a_csv}({len(a)}) vs {b_csv}({len(b)})")
-    rng = np.random.default_rng(seed)
-    diffs = []
-    n = len(a)
-    for _ in range(n_boot):
-        idx = rng.integers(0, n, n)
-        diffs.append(b[idx].mean() - a[idx].mean())
-    diffs = np.array(diffs)
-    lo, hi = np.percentile(diffs, [2.5, 97.5])
-    return float(diffs.mean()), float(lo), float(hi), diffs
-
-
-rows = []
-seed = 0
-for ds, metric, a_csv, b_csv, out_csv in pairs:
-    if not (os.path.exists(a_csv) and os.path.exists(b_csv)):
-        print(f"[SKIP] {ds} {metric}: missing files ({a_csv} / {b_csv})")
-        continue
-    mean, lo, hi, diffs = bootstrap_ci(a_csv, b_csv, seed=seed)
-    seed += 1
-    print(f"{ds} {metric}: ΔF1 mean={mean:.4f}  95% CI [{lo:.4f}, {hi:.4f}]")
-    pd.DataFrame({"deltaF1": diffs}).to_csv(out_csv, index=False)
-    rows.append({
-        "dataset": ds, "metric": metric,
-        "deltaF1_mean": round(mean, 4), "ci_lo": round(lo, 4), "ci_hi": round(hi, 4),
-        "n_boot": len(diffs)
-    })
-
-if rows:
-    pd.DataFrame(rows).to_csv("ci_summary.csv", index=False)
-    print("Saved: ci_summary.csv")
+    cols = [c for c in cols if c in a.columns and c in b.columns]
+    job = {"a": a[cols], "b": b[cols]}
+    if strata_col:
+        job["strata"] = a[strata_col].fillna("").astype(str).values
+    return job
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Paired bootstrap CIs of ΔF1 (LLM+KG - LLM only).")
+    ap.add_argument("--cols", default="f1",
+                    help="逗號分隔的分數欄位，一次 bootstrap 全部，例如 f1,precision,recall,rouge1_f1,bleu4")
+    ap.add_argument("--n_boot", type=int, default=N_BOOT)
+    ap.add_argument("--ci", choices=CI_METHODS, default="percentile")
+    ap.add_argument("--strata", default="", help="分層抽樣欄位，例如 qtype（預設不分層）")
+    ap.add_argument("--workers", type=int, default=1, help="平行處理的比較組數（process 數）")
+    args = ap.parse_args()
+    cols = [c.strip() for c in args.cols.split(",") if c.strip()]
+
+    todo, jobs = [], []
+    for ds, metric, a_csv, b_csv, out_csv in pairs:
+        if not (os.path.exists(a_csv) and os.path.exists(b_csv)):
+            print(f"[SKIP] {ds} {metric}: missing files ({a_csv} / {b_csv})")
+            continue
+        job = load_pair(a_csv, b_csv, cols, args.strata)
+        # 固定 seed 與舊版相同：第 i 個「實際執行」的比較用 seed=i（跳過的組不佔 seed）
+        job["seed"] = len(jobs)
+        todo.append((ds, metric, out_csv))
+        jobs.append(job)
+
+    results = run_many(jobs, n_boot=args.n_boot, ci=args.ci, workers=args.workers)
+
+    rows = []
+    for (ds, metric, out_csv), res in zip(todo, results):
+        for r in res.rows():
+            print(f"{ds} {metric} {r['metric']}: Δ mean={r['boot_mean']:.4f}  "
+                  f"95% CI [{r['ci_lo']:.4f}, {r['ci_hi']:.4f}] ({r['method']})")
+            # 舊版欄位（dataset..n_boot）名稱與順序不變，deltaF1_mean 為 col 欄位的 Δ 平均；新欄位附加在後
+            rows.append({
+                "dataset": ds, "metric": metric,
+                "deltaF1_mean": round(r["boot_mean"], 4), "ci_lo": round(r["ci_lo"], 4),
+                "ci_hi": round(r["ci_hi"], 4), "n_boot": r["n_boot"],
+                "col": r["metric"], "n": r["n"], "method": r["method"], "strata": args.strata,
+            })
+        pd.DataFrame({("deltaF1" if m == "f1" else f"delta_{m}"): res.distribution(m)
+                      for m in res.metrics}).to_csv(out_csv, index=False)
+
+    if rows:
+        pd.DataFrame(rows).to_csv("ci_summary.csv", index=False)
+        print("Saved: ci_summary.csv")
+
+
+if __name__ == "__main__":
+    main()
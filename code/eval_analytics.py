@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# eval_analytics.py
+# 評估結果的共用分析層：每個 run（batch_eval_client / latency / judge 的輸出）只 ingest 一次，
+# 存進欄式 store（<root>/items.parquet，所有 run 的逐題資料一張表 + run_id 欄）與 run catalog
+# （<root>/catalog.json：run_id → 來源檔、資料集、系統、指標、檔案 hash、筆數）。
+# facet / fallback / latency / evidence reuse / bottom-N / judge 報表都從同一個 in-memory frame 計算；
+# 新增一個 run = 一次 ingest，不用改任何腳本。
+#
+#   python eval_analytics.py ingest res105_v5c_rouge1_fix_b.csv --run "105 / v5c / R1" --dataset 105 --system v5c --metric rouge1
+#   python eval_analytics.py ingest judge_105.jsonl --run "105 / v5c / judge" --gold medline_eval_105.jsonl
+#   python eval_analytics.py ingest-defaults          # 舊分析腳本用到、且存在於目前目錄的檔案
+#   python eval_analytics.py runs
+#   python eval_analytics.py report facets --runs "105 / v5c / R1" "858 / v5c / R1"
+#   python eval_analytics.py report all --out_dir reports/
+#   python eval_analytics.py report stages --baseline "105 / v5c / R1"   # 各階段 p50/p90/p99 與回歸差異
+#
+# 衍生欄位（fallback_on、reuse_rate、answer_len）在 ingest 時算一次。
+# Parquet 需要 pyarrow；缺少時改存 pickle（只有本機 pandas 讀得到）。
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+DEFAULT_ROOT = os.getenv("EVAL_RUNS", "eval_runs")
+FACETS = ["definition", "symptoms", "treatments"]
+SCORE_COLS = ["precision", "recall", "f1"]
+_FALLBACK = re.compile(r"fallback|lite", re.I)
+_WORD = re.compile(r"[a-z]+")
+
+# 舊分析腳本各自寫死的檔案，集中成預設 catalog：(run_id, 檔案, dataset, system, metric)
+DEFAULT_RUNS = [
+    ("105 / v5c / R1", "res105_v5c_rouge1_fix_b.csv", "105", "v5c", "rouge1"),
+    ("105 / v5c / RL", "res105_v5c_rougel_fix.csv", "105", "v5c", "rougeL"),
+    ("858 / v5c / R1", "res969_v5c_rouge1.csv", "858", "v5c", "rouge1"),
+    ("858 / v5c / RL", "res969_v5c_rougel.csv", "858", "v5c", "rougeL"),
+    ("105 / v5c-before / R1", "res105_v5c_rouge1.csv", "105", "v5c-before", "rouge1"),
+    ("105 / v5c-before / RL", "res105_v5c_rougel.csv", "105", "v5c-before", "rougeL"),
+    ("105 / llm_only / latency", "res105_llm_only_latency.csv", "105", "llm_only", "latency"),
+    ("105 / v5c / latency", "res105_v5c_latency.csv", "105", "v5c", "latency"),
+    ("858 / llm_only / latency", "res969_llm_only_latency.csv", "858", "llm_only", "latency"),
+    ("858 / v5c / latency", "res969_v5c_latency.csv", "858", "v5c", "latency"),
+]
+
+
+# ============ ingest 時的衍生欄位 ============
+
+
+def _evidence_text(row) -> str:
+    for col in ("results_0_subgraph_summary", "subgraph_summary"):
+        v = row.get(col)
+        if isinstance(v, str) and v:
+            return v
+    return ""
+
+
+def reuse_rate(pred: str, evidence: str) -> float:
+    """Share of answer words that also appear in the evidence ("A → B|C → D" term bag)."""
+    ev = (evidence or "").lower()
+    if not ev:
+        return 0.0
+    terms = []
+    for seg in ev.split("|"):
+        seg = seg.strip()
+        if not seg:
+            continue
+        if "→" in seg:
+            a, b = seg.split("→", 1)
+            terms.extend([a.strip(), b.strip()])
+        else:
+            terms.append(seg)
+    E = set()
+    for t in terms:
+        E |= set(_WORD.findall(t))
+    P = set(_WORD.findall((pred or "").lower()))
+    if not P or not E:
+        return 0.0
+    return len(P & E) / max(1, len(P))
+
+
+def _derive(df: pd.DataFrame) -> pd.DataFrame:
+    note_col = "results_0_note" if "results_0_note" in df.columns else ("note" if "note" in df.columns else None)
+    df["fallback_on"] = (df[note_col].fillna("").astype(str).str.contains(_FALLBACK)
+                         if note_col else False)
+    if "pred_answer" in df.columns:
+        if "answer_len" not in df.columns:
+            df["answer_len"] = df["pred_answer"].fillna("").astype(str).str.len()
+        if "subgraph_summary" not in df.columns and "top_conceptId" in df.columns:
+            # 沿用 evidence_reuse_correlation.py：沒有 subgraph_summary 時以 top_conceptId 代替
+            df["subgraph_summary"] = df["top_conceptId"].fillna("").astype(str)
+        df["reuse_rate"] = [reuse_rate(p, _evidence_text(r))
+                            for p, r in zip(df["pred_answer"].fillna("").astype(str),
+                                            df.to_dict("records"))]
+    return df
+
+
+def _read_jsonl(path: str, gold: str | None = None) -> pd.DataFrame:
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    df = pd.DataFrame(rows)
+    if gold:
+        # judge 輸出與 gold 逐行對齊（同 judge_stats_105.py）
+        with open(gold, "r", encoding="utf-8") as f:
+            golds = [json.loads(line) for line in f if line.strip()]
+        n = min(len(golds), len(df))
+        df = df.iloc[:n].copy()
+        df["qtype"] = [g.get("qtype", "unknown") for g in golds[:n]]
+    return df
+
+
+def _text_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # 混合型別（None / 數字 / 字串）及其他 run 沒有的欄位統一成字串，Parquet 才存得下
+    for col in df.columns:
+        if pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].fillna("").astype(str)
+    return df
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+# ============ store ============
+
+
+class EvalStore:
+    """Run catalog + one columnar table of every ingested item (see module header)."""
+
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.catalog_path = os.path.join(root, "catalog.json")
+        self.catalog: dict[str, dict] = {}
+        if os.path.exists(self.catalog_path):
+            with open(self.catalog_path, "r", encoding="utf-8") as f:
+                self.catalog = json.load(f)
+        self._frame: pd.DataFrame | None = None
+
+    # ---- 儲存格式 ----
+
+    def _items_path(self) -> str:
+        try:
+            import pyarrow  # noqa: F401
+            return os.path.join(self.root, "items.parquet")
+        except ImportError:
+            return os.path.join(self.root, "items.pkl")
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """Every ingested item of every run (loaded once per process)."""
+        if self._frame is None:
+            path = self._items_path()
+            if not os.path.exists(path):
+                self._frame = pd.DataFrame({"run_id": pd.Series(dtype=str)})
+            elif path.endswith(".parquet"):
+                self._frame = pd.read_parquet(path)
+            else:
+                self._frame = pd.read_pickle(path)
+        return self._frame
+
+    def save(self) -> None:
+        path = self._items_path()
+        tmp = path + ".tmp"
+        if path.endswith(".parquet"):
+            self._frame.to_parquet(tmp, index=False)
+        else:
+            self._frame.to_pickle(tmp)
+        os.replace(tmp, path)
+        tmp = self.catalog_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.catalog, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.catalog_path)
+
+    # ---- ingest ----
+
+    def ingest(self, path: str, run_id: str | None = None, dataset: str = "", system: str = "",
+               metric: str = "", gold: str | None = None, force: bool = False, save: bool = True) -> bool:
+        """Adds (or replaces) one run; returns False when the file is unchanged since its last ingest.
+
+        save=False defers writing the store (call save() after a batch of ingests)."""
+        run_id = run_id or os.path.splitext(os.path.basename(path))[0]
+        digest = _file_hash(path)
+        prev = self.catalog.get(run_id)
+        if prev and prev.get("sha256") == digest and not force:
+            return False
+        df = _read_jsonl(path, gold) if path.endswith(".jsonl") else pd.read_csv(path)
+        df = _derive(df)
+        df.insert(0, "run_id", run_id)
+        df.insert(1, "item", range(len(df)))
+        others = self.frame[self.frame["run_id"] != run_id]
+        self._frame = _text_columns(pd.concat([others, df], ignore_index=True) if len(others) else df)
+        self.catalog[run_id] = {
+            "source": os.path.abspath(path), "sha256": digest, "dataset": str(dataset),
+            "system": system, "metric": metric, "gold": gold or "", "n": len(df),
+            "columns": [c for c in df.columns if c not in ("run_id", "item")],
+            "ingested_at": time.time(),
+        }
+        if save:
+            self.save()
+        return True
+
+    def remove(self, run_id: str) -> None:
+        self._frame = self.frame[self.frame["run_id"] != run_id].reset_index(drop=True)
+        self.catalog.pop(run_id, None)
+        self.save()
+
+    # ---- 讀取 ----
+
+    def runs(self) -> pd.DataFrame:
+        rows = [{"run_id": k, **{c: v[c] for c in ("dataset", "system", "metric", "n", "source")}}
+                for k, v in self.catalog.items()]
+        return pd.DataFrame(rows, columns=["run_id", "dataset", "system", "metric", "n", "source"])
+
+    def select(self, runs=None, metric: str | None = None) -> pd.DataFrame:
+        """Items of the given runs (default: all), optionally only runs of one metric, in catalog order."""
+        ids = list(runs) if runs else list(self.catalog)
+        if metric:
+            ids = [r for r in ids if self.catalog.get(r, {}).get("metric") == metric]
+        missing = [r for r in ids if r not in self.catalog]
+        if missing:
+            raise KeyError(f"runs not ingested: {missing}")
+        df = self.frame[self.frame["run_id"].isin(ids)]
+        order = {r: i for i, r in enumerate(ids)}
+        return df.sort_values(["run_id", "item"], key=lambda s: s.map(order) if s.name == "run_id" else s)
+
+
+def ingest_defaults(store: EvalStore, directory: str = ".") -> list[str]:
+    """Ingests every DEFAULT_RUNS file present in `directory` (unchanged files are skipped)."""
+    added = []
+    for run_id, fname, dataset, system, metric in DEFAULT_RUNS:
+        path = os.path.join(directory, fname)
+        if os.path.exists(path) and store.ingest(path, run_id, dataset, system, metric, save=False):
+            added.append(run_id)
+    if added:
+        store.save()
+    return added
+
+
+# ============ 報表（皆以 store.select() 的 frame 為輸入） ============
+
+
+def facet_means(df: pd.DataFrame) -> pd.DataFrame:
+    """precision / recall / f1 mean per run and qtype."""
+    return df.groupby(["run_id", "qtype"], sort=False)[SCORE_COLS].mean().reset_index()
+
+
+def facet_delta(df: pd.DataFrame, before: str, after: str, label: str = "") -> pd.DataFrame:
+    """Per-qtype precision / recall / f1 of two runs and their difference (after - before)."""
+    means = facet_means(df[df["run_id"].isin([before, after])]).round(3)
+    b = means[means["run_id"] == before].drop(columns="run_id").set_index("qtype")
+    a = means[means["run_id"] == after].drop(columns="run_id").set_index("qtype")
+    j = b.join(a, lsuffix="_before", rsuffix="_after")
+    for col in SCORE_COLS:
+        j[f"{col}_Δ"] = (j[f"{col}_after"] - j[f"{col}_before"]).round(3)
+    j.insert(0, "metric", label)
+    return j.reset_index()
+
+
+def fallback_split(df: pd.DataFrame, facets=FACETS) -> pd.DataFrame:
+    """Mean scores per run × qtype (plus ALL) × fallback on/off."""
+    out = []
+    for run_id, run in df.groupby("run_id", sort=False):
+        for facet in list(facets) + ["ALL"]:
+            sub = run if facet == "ALL" else run[run["qtype"] == facet]
+            for on in [True, False]:
+                s = sub[sub["fallback_on"] == on]
+                if len(s) == 0:
+                    continue
+                out.append({"run": run_id, "qtype": facet, "fallback_on": on, "n": len(s),
+                            **{c: s[c].mean() for c in SCORE_COLS}})
+    return pd.DataFrame(out, columns=["run", "qtype", "fallback_on", "n"] + SCORE_COLS)
+
+
+def latency_summary(df: pd.DataFrame, catalog: dict | None = None) -> pd.DataFrame:
+    """n, mean / p95 latency and mean answer length per run."""
+    rows = []
+    for run_id, run in df.groupby("run_id", sort=False):
+        lat = run["latency_sec"] if "latency_sec" in run.columns else None
+        ans = run["answer_len"] if "answer_len" in run.columns else None
+        rows.append({
+            "run": run_id,
+            "file": os.path.basename((catalog or {}).get(run_id, {}).get("source", "")),
+            "n": len(run),
+            "latency_mean": round(lat.mean(), 3) if lat is not None and lat.notna().any() else None,
+            "latency_p95": round(lat.quantile(0.95), 3) if lat is not None and lat.notna().any() else None,
+            "ans_len_mean": round(ans.mean(), 1) if ans is not None and ans.notna().any() else None,
+        })
+    return pd.DataFrame(rows)
+
+
+def reuse_correlation(df: pd.DataFrame) -> pd.DataFrame:
+    """Pearson correlation of evidence reuse rate and f1 per run (p-value needs scipy)."""
+    try:
+        from scipy.stats import pearsonr
+    except ImportError:
+        pearsonr = None
+    rows = []
+    for run_id, run in df.groupby("run_id", sort=False):
+        if pearsonr is not None:
+            r, p = pearsonr(run["reuse_rate"], run["f1"])
+        else:
+            r, p = run["reuse_rate"].corr(run["f1"]), float("nan")
+        rows.append({"run": run_id, "n": len(run), "pearson_r": r, "p_value": p})
+    return pd.DataFrame(rows)
+
+
+BOTTOM_COLS = ["question", "gold_answer", "pred_answer", "f1", "precision", "recall", "qtype", "note"]
+
+
+def bottom_n(df: pd.DataFrame, n: int = 20, facets=FACETS) -> pd.DataFrame:
+    """Lowest-f1 items per run and facet."""
+    missing = [c for c in BOTTOM_COLS if c not in df.columns]
+    if missing:
+        raise ValueError(f"missing cols: {missing}")
+    frames = []
+    for run_id, run in df.groupby("run_id", sort=False):
+        for facet in facets:
+            sub = run[run["qtype"] == facet].sort_values("f1", kind="stable").head(n).copy()
+            sub.insert(0, "facet", facet)
+            frames.append(sub[["run_id", "facet"] + BOTTOM_COLS])
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["run_id", "facet"] + BOTTOM_COLS)
+
+
+def judge_summary(df: pd.DataFrame, n_boot: int = 2000) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(per-qtype mean score with bootstrap CI incl. an ALL row, 1..5 score distribution) per run."""
+    from bootstrap_stats import group_means
+
+    means, dists = [], []
+    for run_id, run in df.groupby("run_id", sort=False):
+        scores = pd.to_numeric(run["score"], errors="coerce")
+        valid = run.assign(score=scores)[scores.notna()]
+        if not len(valid):
+            continue
+        valid = valid.assign(qtype=valid["qtype"].replace("", "unknown") if "qtype" in valid else "unknown")
+        m = group_means(valid, "score", "qtype", n_boot=n_boot)
+        m.insert(0, "run", run_id)
+        means.append(m)
+        counts = valid["score"].value_counts()
+        dists.append(pd.DataFrame({"run": run_id, "score": range(1, 6),
+                                   "count": [int(counts.get(s, 0)) for s in range(1, 6)]})
+                     .assign(ratio=lambda d: (d["count"] / len(valid)).round(3)))
+    return (pd.concat(means, ignore_index=True) if means else pd.DataFrame(),
+            pd.concat(dists, ignore_index=True) if dists else pd.DataFrame())
+
+
+# 伺服器 debug.timing_ms 各階段（batch_eval_client 的 server_<stage>_ms 欄）與用戶端量到的 latency
+STAGES = ("lookup", "generation", "fallback_llm", "total")
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def _stage_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Long format: run_id, qtype, fallback_path, stage, ms (one row per item and measured stage)."""
+    cols = {f"server_{s}_ms": s for s in STAGES if f"server_{s}_ms" in df.columns}
+    base = df.assign(client=pd.to_numeric(df["latency_sec"], errors="coerce") * 1000
+                     if "latency_sec" in df.columns else float("nan"))
+    # fallback 路徑：伺服器 debug 的 fallback，沒有時用結果的 note；都沒有為 none
+    path = base["fallback"] if "fallback" in base.columns else pd.Series("", index=base.index)
+    note = base["note"] if "note" in base.columns else pd.Series("", index=base.index)
+    path = path.fillna("").astype(str).where(lambda p: p != "", note.fillna("").astype(str))
+    base = base.assign(fallback_path=path.replace("", "none"),
+                       qtype=base["qtype"].fillna("").astype(str).replace("", "unknown")
+                       if "qtype" in base.columns else "unknown")
+    long = base.melt(id_vars=["run_id", "qtype", "fallback_path"], value_vars=list(cols) + ["client"],
+                     var_name="stage", value_name="ms")
+    long["stage"] = long["stage"].map(lambda c: cols.get(c, c))
+    long["ms"] = pd.to_numeric(long["ms"], errors="coerce")
+    return long[long["ms"].notna()]
+
+
+def stage_percentiles(df: pd.DataFrame) -> pd.DataFrame:
+    """p50 / p90 / p99 (and mean, n) of every stage per run, split by qtype and by fallback path (plus ALL)."""
+    long = _stage_frame(df)
+    out = []
+    for split in ("ALL", "qtype", "fallback_path"):
+        keys = ["run_id", "stage"] + ([] if split == "ALL" else [split])
+        g = long.groupby(keys, sort=False)["ms"]
+        q = g.quantile(list(PERCENTILES)).unstack()
+        q.columns = [f"p{round(p * 100)}" for p in PERCENTILES]
+        t = q.join(g.agg(["mean", "count"]).rename(columns={"count": "n"})).reset_index()
+        t.insert(2, "split", split)
+        t.insert(3, "group", "ALL" if split == "ALL" else t.pop(split))
+        out.append(t)
+    res = pd.concat(out, ignore_index=True)
+    order = {s: i for i, s in enumerate(STAGES + ("client",))}
+    res["_o"] = res["stage"].map(order)
+    return (res.sort_values(["run_id", "split", "group", "_o"], kind="stable")
+            .drop(columns="_o").reset_index(drop=True).round(1))
+
+
+def stage_regression(percentiles: pd.DataFrame, baseline: str) -> pd.DataFrame:
+    """Percentile deltas of every other run against `baseline` (same split / group / stage).
+
+    delta = run - baseline in ms; pct = delta / baseline."""
+    cols = [f"p{round(p * 100)}" for p in PERCENTILES]
+    keys = ["split", "group", "stage"]
+    base = percentiles[percentiles["run_id"] == baseline].set_index(keys)[cols + ["n"]]
+    if base.empty:
+        raise KeyError(f"baseline run has no timing data: {baseline}")
+    out = []
+    for run_id, run in percentiles[percentiles["run_id"] != baseline].groupby("run_id", sort=False):
+        j = run.set_index(keys)[cols + ["n"]].join(base, rsuffix="_base", how="inner")
+        for c in cols:
+            j[f"{c}_delta"] = (j[c] - j[f"{c}_base"]).round(1)
+            j[f"{c}_pct"] = (j[f"{c}_delta"] / j[f"{c}_base"].where(j[f"{c}_base"] > 0)).round(3)
+        j = j.reset_index()
+        j.insert(0, "baseline", baseline)
+        j.insert(0, "run_id", run_id)
+        out.append(j)
+    return pd.concat(out, ignore_index=True) if out else pd.DataFrame()
+
+
+REPORTS = ("facets", "fallback", "latency", "reuse", "bottom", "judge", "stages")
+
+
+def write_reports(store: EvalStore, names, runs=None, out_dir: str = ".", baseline: str | None = None) -> list[str]:
+    """Computes the requested reports from the shared frame and writes one CSV each.
+
+    With `baseline`, the stages report also writes percentile deltas of every run against it."""
+    os.makedirs(out_dir, exist_ok=True)
+    df = store.select(runs)
+    has = lambda *cols: all(c in df.columns for c in cols)  # noqa: E731
+    scored = df[df["f1"].notna()] if has("f1", "qtype") else df.iloc[0:0]
+    saved = []
+
+    def save(frame, name):
+        path = os.path.join(out_dir, name)
+        frame.to_csv(path, index=False)
+        print(f"\n=== {name} ===\n{frame.to_string(index=False)}")
+        saved.append(path)
+
+    for name in names:
+        if name == "facets" and len(scored):
+            save(facet_means(scored), "facet_means.csv")
+        elif name == "fallback" and len(scored):
+            save(fallback_split(scored), "fallback_split_summary.csv")
+        elif name == "latency" and has("latency_sec"):
+            save(latency_summary(df[df["latency_sec"].notna()], store.catalog), "efficiency_summary.csv")
+        elif name == "reuse" and has("reuse_rate") and len(scored):
+            save(reuse_correlation(scored[scored["reuse_rate"].notna()]), "evidence_reuse_correlation.csv")
+        elif name == "bottom" and has(*BOTTOM_COLS) and len(scored):
+            save(bottom_n(scored), "bottom20_by_facet_all.csv")
+        elif name == "judge" and has("score"):
+            means, dist = judge_summary(df[df["score"].notna()])
+            if len(means):
+                save(means, "judge_stats_by_qtype.csv")
+                save(dist, "judge_stats_dist.csv")
+        elif name == "stages" and (has("latency_sec") or has("server_total_ms")):
+            pct = stage_percentiles(df)
+            save(pct, "stage_latency_percentiles.csv")
+            if baseline:
+                save(stage_regression(pct, baseline), "stage_latency_regression.csv")
+    return saved
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingest evaluation runs once and build every report from one frame.")
+    ap.add_argument("--root", default=DEFAULT_ROOT, help="store directory (env EVAL_RUNS)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("ingest", help="add or replace one run")
+    p.add_argument("path", help="results CSV (batch_eval_client / latency) or judge JSONL")
+    p.add_argument("--run", default=None, help="run id (default: file name)")
+    p.add_argument("--dataset", default="")
+    p.add_argument("--system", default="")
+    p.add_argument("--metric", default="")
+    p.add_argument("--gold", default=None, help="gold JSONL aligned line by line (judge runs; adds qtype)")
+    p.add_argument("--force", action="store_true", help="re-ingest even if the file is unchanged")
+
+    p = sub.add_parser("ingest-defaults", help="ingest the runs the legacy analysis scripts used")
+    p.add_argument("--dir", default=".")
+
+    sub.add_parser("runs", help="list the run catalog")
+
+    p = sub.add_parser("remove", help="drop a run")
+    p.add_argument("run")
+
+    p = sub.add_parser("report", help="compute reports from the store")
+    p.add_argument("names", nargs="+", choices=REPORTS + ("all",))
+    p.add_argument("--runs", nargs="*", default=None, help="run ids (default: all)")
+    p.add_argument("--out_dir", default=".")
+    p.add_argument("--baseline", default=None, help="stages: run id to compute regression deltas against")
+    args = ap.parse_args()
+
+    store = EvalStore(args.root)
+    if args.cmd == "ingest":
+        changed = store.ingest(args.path, args.run, args.dataset, args.system, args.metric,
+                               gold=args.gold, force=args.force)
+        print(("Ingested" if changed else "Unchanged, skipped") + f": {args.path}")
+    elif args.cmd == "ingest-defaults":
+        added = ingest_defaults(store, args.dir)
+        print(f"Ingested {len(added)} runs" + (f": {added}" if added else " (all present files unchanged)"))
+    elif args.cmd == "runs":
+        print(store.runs().to_string(index=False))
+    elif args.cmd == "remove":
+        store.remove(args.run)
+        print("Removed:", args.run)
+    else:
+        names = REPORTS if "all" in args.names else args.names
+        for path in write_reports(store, names, args.runs, args.out_dir, args.baseline):
+            print("Saved:", path)
+
+
+if __name__ == "__main__":
+    main()
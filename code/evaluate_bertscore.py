@@ -1,10 +1,19 @@
 # evaluate_bertscore.py (patched)
+# BERTScore：reference 端 embedding 以 text hash 永久快取，逐題分數寫入 items JSONL，
+# 重跑時只計算新的 (prediction, reference) 組合；數值與 bert_score.score(lang="en") 相同（未 rescale、無 idf）。
 import argparse
+import hashlib
 import json
 import time
 import os
-import requests
-from bert_score import score
+from collections import defaultdict
+
+import numpy as np
+import torch
+from torch.nn.utils.rnn import pad_sequence
+from bert_score.utils import (get_bert_embedding, get_model, get_tokenizer,
+                              greedy_cos_idf, lang2model, model2layers)
+from predictions_store import add_store_args, fetch, open_store
 
 COMMON_KEYS = [
     "answer", "output", "result", "text", "response", "content"
@@ -60,17 +69,118 @@ def iter_jsonl(path):
             yield json.loads(line)
 
 
-def call_api(base_url, endpoint, question, timeout=90, api_key=None):
-    url = base_url.rstrip("/") + endpoint
-    headers = {"X-API-KEY": api_key} if api_key else None
-    r = requests.get(
-        url,
-        params={"question": question},
-        headers=headers,
-        timeout=timeout,
-    )
-    r.raise_for_status()
-    return r.json()
+def _sha(*parts) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class CachedBertScorer:
+    """BERTScore with a persistent reference-embedding cache.
+
+    Same computation as bert_score.score (embeddings per sentence, then
+    greedy_cos_idf per batch); reference embeddings are stored as
+    <cache_dir>/<model>_L<layers>/<sha256(text)>.npz and reused across runs."""
+
+    def __init__(self, model_type: str, num_layers: int, batch_size: int = 64,
+                 device: str | None = None, cache_dir: str = ""):
+        self.model_type = model_type
+        self.num_layers = num_layers
+        self.batch_size = batch_size
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.tokenizer = get_tokenizer(model_type, False)
+        self.model = get_model(model_type, num_layers).to(self.device)
+        # 與 bert_score.score(idf=False) 相同：[CLS] / [SEP] 權重為 0
+        self.idf_dict = defaultdict(lambda: 1.0)
+        self.idf_dict[self.tokenizer.sep_token_id] = 0
+        self.idf_dict[self.tokenizer.cls_token_id] = 0
+        self.cache_dir = ""
+        if cache_dir:
+            self.cache_dir = os.path.join(cache_dir, f"{model_type.strip('/').replace('/', '_')}_L{num_layers}")
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self.ref_cache_hits = 0
+        self.ref_cache_misses = 0
+
+    def _embed(self, texts) -> dict:
+        """{text: (embedding [len, dim], idf [len])}, computed in length-sorted batches."""
+        out = {}
+        texts = sorted(set(texts), key=lambda x: len(x.split(" ")), reverse=True)
+        with torch.no_grad():
+            for i in range(0, len(texts), self.batch_size):
+                batch = texts[i:i + self.batch_size]
+                embs, masks, idf = get_bert_embedding(batch, self.model, self.tokenizer, self.idf_dict,
+                                                      device=self.device)
+                embs, masks, idf = embs.cpu(), masks.cpu(), idf.cpu()
+                for j, sen in enumerate(batch):
+                    n = int(masks[j].sum().item())
+                    out[sen] = (embs[j, :n], idf[j, :n])
+        return out
+
+    def _cache_path(self, text: str) -> str:
+        return os.path.join(self.cache_dir, _sha(text) + ".npz")
+
+    def reference_stats(self, refs) -> dict:
+        stats, missing = {}, []
+        for ref in set(refs):
+            path = self._cache_path(ref) if self.cache_dir else ""
+            if path and os.path.exists(path):
+                with np.load(path) as z:
+                    stats[ref] = (torch.from_numpy(z["emb"]), torch.from_numpy(z["idf"]))
+                self.ref_cache_hits += 1
+            else:
+                missing.append(ref)
+        self.ref_cache_misses += len(missing)
+        new = self._embed(missing)
+        if self.cache_dir:
+            for ref, (emb, idf) in new.items():
+                path = self._cache_path(ref)
+                tmp = path + ".tmp.npz"
+                np.savez(tmp, emb=emb.numpy(), idf=idf.numpy())
+                os.replace(tmp, path)
+        stats.update(new)
+        return stats
+
+    def _pad(self, stats):
+        emb = [e.to(self.device) for e, _ in stats]
+        idf = [i.to(self.device) for _, i in stats]
+        lens = torch.tensor([e.size(0) for e in emb], dtype=torch.long)
+        mask = torch.arange(int(lens.max()), dtype=torch.long).expand(len(lens), -1) < lens.unsqueeze(1)
+        return (pad_sequence(emb, batch_first=True, padding_value=2.0), mask.to(self.device),
+                pad_sequence(idf, batch_first=True))
+
+    def score(self, hyps, refs):
+        """(P, R, F1) numpy arrays for aligned hyps / refs."""
+        if not hyps:
+            return np.zeros(0), np.zeros(0), np.zeros(0)
+        ref_stats = self.reference_stats(refs)
+        hyp_stats = self._embed(hyps)
+        out = []
+        with torch.no_grad():
+            for i in range(0, len(refs), self.batch_size):
+                r = self._pad([ref_stats[x] for x in refs[i:i + self.batch_size]])
+                h = self._pad([hyp_stats[x] for x in hyps[i:i + self.batch_size]])
+                P, R, F1 = greedy_cos_idf(*r, *h, False)
+                out.append(torch.stack((P, R, F1), dim=-1).cpu())
+        scores = torch.cat(out).numpy()
+        return scores[:, 0], scores[:, 1], scores[:, 2]
+
+
+def item_key(model_type: str, num_layers: int, hyp: str, ref: str) -> str:
+    return _sha(model_type, str(num_layers), hyp, ref)
+
+
+def load_items(path: str) -> dict:
+    items = {}
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    items[rec["key"]] = rec
+    return items
+
+
+def default_items_path(out: str) -> str:
+    root, _ = os.path.splitext(out)
+    return root + ".items.jsonl"
 
 
 def main():
@@ -84,23 +194,39 @@ def main():
     ap.add_argument("--timeout", type=int, default=90)
     ap.add_argument("--resp_key", default=None, help="指定回傳欄位（支援 a.b.0.c 路徑）")
     ap.add_argument("--api_key", default=os.getenv("APP_API_KEY", ""), help="API key sent as X-API-KEY header")
+    ap.add_argument("--model_type", default=lang2model["en"], help="BERTScore model (default: bert_score's English model)")
+    ap.add_argument("--num_layers", type=int, default=None, help="default: bert_score's tuned layer for the model")
+    ap.add_argument("--batch_size", type=int, default=64)
+    ap.add_argument("--threads", type=int, default=0, help="CPU threads for torch (0 = torch default)")
+    ap.add_argument("--device", default=None, help="cuda / cpu (default: cuda if available)")
+    ap.add_argument("--cache_dir", default="bertscore_cache",
+                    help="reference embedding cache directory ('' = no cache)")
+    ap.add_argument("--items_out", default="",
+                    help="per-item scores JSONL (default: <out>.items.jsonl); existing items are reused")
+    add_store_args(ap)
     args = ap.parse_args()
 
-    refs, hyps = [], []
+    # 答案優先讀 predictions store（batch_eval_client 已生成過就不再呼叫 API）
+    store, build = open_store(args, args.base_url, args.api_key)
+
+    refs, hyps, questions = [], [], []
     empty_count = 0
     n = 0
     for ex in iter_jsonl(args.input):
         q, ref = ex.get("question", ""), ex.get("answer", "")
         if not q or not ref:
             continue
+        cached = args.offline
         try:
-            payload = call_api(args.base_url, args.endpoint,
-                               q, timeout=args.timeout, api_key=args.api_key)
+            payload, _, cached = fetch(store, args.base_url, args.endpoint, q, build=build,
+                                       timeout=args.timeout, api_key=args.api_key,
+                                       offline=args.offline, refresh=args.refresh)
         except Exception:
             payload = ""
         hyp = extract_text(payload, resp_key=args.resp_key)
         if not hyp.strip():
             empty_count += 1
+        questions.append(q)
         refs.append(ref)
         hyps.append(hyp)
         n += 1
@@ -108,17 +234,58 @@ def main():
             print(f"Fetched {n} responses... (empty so far: {empty_count})")
         if n >= args.limit:
             break
-        time.sleep(args.sleep)
+        if not cached:
+            time.sleep(args.sleep)
+    if store is not None:
+        store.close()
 
     print(
         f"Total: {n}, empty candidates: {empty_count} ({empty_count/max(1,n)*100:.1f}%)")
 
-    P, R, F1 = score(hyps, refs, lang="en", verbose=True)
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+    num_layers = args.num_layers or model2layers[args.model_type]
+    items_path = args.items_out or default_items_path(args.out)
+    previous = load_items(items_path)
+    keys = [item_key(args.model_type, num_layers, h, r) for h, r in zip(hyps, refs)]
+    todo = [i for i, k in enumerate(keys) if k not in previous]
+    print(f"Scoring {len(todo)} new items; reusing {n - len(todo)} from {items_path}")
+
+    scorer = None
+    if todo:
+        scorer = CachedBertScorer(args.model_type, num_layers, batch_size=args.batch_size,
+                                  device=args.device, cache_dir=args.cache_dir)
+        P, R, F1 = scorer.score([hyps[i] for i in todo], [refs[i] for i in todo])
+        for j, i in enumerate(todo):
+            previous[keys[i]] = {"key": keys[i], "precision": float(P[j]), "recall": float(R[j]),
+                                 "f1": float(F1[j])}
+
+    items = []
+    for i, k in enumerate(keys):
+        items.append({"question": questions[i], "key": k, "empty": not hyps[i].strip(),
+                      "precision": previous[k]["precision"], "recall": previous[k]["recall"],
+                      "f1": previous[k]["f1"]})
+    tmp = items_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for it in items:
+            f.write(json.dumps(it, ensure_ascii=False) + "\n")
+    os.replace(tmp, items_path)
+
+    def mean(col):
+        return float(np.mean([it[col] for it in items])) if items else float("nan")
+
     out = {
         "count": n,
-        "precision_mean": float(P.mean()),
-        "recall_mean": float(R.mean()),
-        "f1_mean": float(F1.mean())
+        "precision_mean": mean("precision"),
+        "recall_mean": mean("recall"),
+        "f1_mean": mean("f1"),
+        "model_type": args.model_type,
+        "num_layers": num_layers,
+        "scored": len(todo),
+        "reused": n - len(todo),
+        "ref_cache_hits": scorer.ref_cache_hits if scorer else 0,
+        "ref_cache_misses": scorer.ref_cache_misses if scorer else 0,
+        "items": items_path,
     }
     with open(args.out, "w", encoding="utf-8") as f:
         json.dump(out, f, indent=2)
@@ -1,16 +1,13 @@
+import asyncio
+import hashlib
 import json
+import random
 import time
 import argparse
 import os
-from openai import OpenAI
-
-OPENAI_API_KEY = (os.getenv("OPENAI_API_KEY") or "").strip()
-if not OPENAI_API_KEY:
-    raise RuntimeError(
-        "Missing OPENAI_API_KEY environment variable. "
-        "Please set it before running judge_eval.py."
-    )
-client = OpenAI(**{"api_key": OPENAI_API_KEY})
+import openai
+from openai import AsyncOpenAI
+from predictions_store import PredictionsStore
 
 # ===============================
 # 評分用的 Judge Prompt
@@ -42,33 +39,230 @@ REFERENCE ANSWER:
 {reference_answer}
 """.strip()
 
+JUDGE_MODEL = "gpt-4o-mini"
+# prompt 改變時快取自動失效
+PROMPT_VERSION = hashlib.sha256(JUDGE_PROMPT.encode("utf-8")).hexdigest()[:12]
 
-def run_judge(question: str, model_answer: str, reference_answer: str):
-    prompt = JUDGE_PROMPT.format(
-        question=question,
-        model_answer=model_answer,
-        reference_answer=reference_answer,
-    )
+# 可重試的錯誤：429、逾時、連線錯誤、5xx
+RETRYABLE = (openai.RateLimitError, openai.APITimeoutError,
+             openai.APIConnectionError, openai.InternalServerError)
 
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=64,
-        temperature=0,
-    )
 
-    text = resp.choices[0].message.content.strip()
+def _strip_code_fence(text: str) -> str:
+    # ```json\n{...}\n``` → {...}
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def parse_verdict(text: str):
+    # 盡量用 JSON 解析（容許 ```json 包起來）；如果失敗，就把原始文字放到 justification
+    for candidate in (text, _strip_code_fence(text)):
+        try:
+            data = json.loads(candidate)
+            return data.get("score", None), data.get("justification", "")
+        except Exception:
+            continue
+    return None, text
+
+
+def verdict_key(model: str, question: str, model_answer: str, reference_answer: str) -> str:
+    raw = json.dumps([model, PROMPT_VERSION, question, model_answer, reference_answer], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """Append-only JSONL of verdicts keyed by content hash.
+
+    Every verdict is flushed as soon as it arrives, so an interrupted run
+    resumes by simply running the same command again."""
 
-    # 盡量用 JSON 解析；如果失敗，就把原始文字放到 justification
+    def __init__(self, path: str):
+        self.path = path
+        self.verdicts: dict[str, dict] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    # 中斷時最後一行可能寫到一半
+                    if line.endswith("\n") and line.strip():
+                        rec = json.loads(line)
+                        self.verdicts[rec["key"]] = rec
+        self._fh = open(path, "a", encoding="utf-8") if path else None
+
+    def get(self, key: str) -> dict | None:
+        return self.verdicts.get(key)
+
+    def put(self, rec: dict) -> None:
+        self.verdicts[rec["key"]] = rec
+        if self._fh:
+            self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh:
+            self._fh.close()
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _retry_after(exc) -> float | None:
+    response = getattr(exc, "response", None)
     try:
-        data = json.loads(text)
-        score = data.get("score", None)
-        justification = data.get("justification", "")
-    except Exception:
-        score = None
-        justification = text
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
 
-    return score, justification
+
+class JudgeRunner:
+    """Judges items concurrently: at most `concurrency` requests in flight,
+    `rpm` requests per minute (token bucket), `retries` retries with
+    exponential backoff + jitter (or the server's Retry-After)."""
+
+    def __init__(self, client: AsyncOpenAI, cache: VerdictCache, model: str = JUDGE_MODEL,
+                 concurrency: int = 8, rpm: float = 500, retries: int = 5,
+                 backoff_s: float = 1.0, max_backoff_s: float = 60.0, max_tokens: int = 64):
+        self.client = client
+        self.cache = cache
+        self.model = model
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.max_tokens = max_tokens
+        self.bucket = TokenBucket(rpm / 60.0, burst=concurrency)
+        self.sem = asyncio.Semaphore(max(1, concurrency))
+        self.stats = {"cached": 0, "judged": 0, "retries": 0, "failed": 0, "unparsed": 0}
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def _call(self, prompt: str) -> str:
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            try:
+                resp = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=self.max_tokens,
+                    temperature=0,
+                )
+            except RETRYABLE as e:
+                if attempt == self.retries:
+                    raise
+                self.stats["retries"] += 1
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = self.backoff_s * 2 ** attempt * (0.5 + random.random() / 2)
+                await asyncio.sleep(min(delay, self.max_backoff_s))
+                continue
+            try:
+                content = resp.choices[0].message.content
+            except (AttributeError, IndexError, TypeError):
+                # 空的 choices / 缺 message：當成解析不出分數（不寫入快取，重跑時再評）
+                content = None
+            return (content or "").strip()
+
+    async def _judge(self, key: str, question: str, model_answer: str, reference_answer: str) -> dict:
+        prompt = JUDGE_PROMPT.format(
+            question=question,
+            model_answer=model_answer,
+            reference_answer=reference_answer,
+        )
+        try:
+            async with self.sem:
+                text = await self._call(prompt)
+        except (openai.OpenAIError, asyncio.TimeoutError) as e:
+            # 在 task 內計數：同一 triple 的所有等待者共用這筆失敗，只算一次
+            self.stats["failed"] += 1
+            return {"key": key, "score": None, "judge_note": f"error: {type(e).__name__}: {e}"}
+        score, justification = parse_verdict(text)
+        rec = {"key": key, "model": self.model, "prompt_version": PROMPT_VERSION,
+               "score": score, "judge_note": justification, "created_at": time.time()}
+        if score is None:
+            # 解析不出分數的回覆不寫入快取，重跑時會再評一次
+            self.stats["unparsed"] += 1
+            return rec
+        self.cache.put(rec)
+        self.stats["judged"] += 1
+        return rec
+
+    async def judge(self, question: str, model_answer: str, reference_answer: str) -> dict:
+        """Cached verdict, or one judge call shared by identical triples in this run.
+
+        Failures after all retries and replies without a parsable score are
+        returned as score=None and are not cached, so a rerun tries them again."""
+        key = verdict_key(self.model, question, model_answer, reference_answer)
+        rec = self.cache.get(key)
+        if rec is not None:
+            self.stats["cached"] += 1
+            return rec
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._judge(key, question, model_answer, reference_answer))
+            self._inflight[key] = task
+            # 完成後移除：成功的已在快取，失敗 / 解析不出的讓之後的同一 triple 重評
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        return await asyncio.shield(task)
+
+
+def extract_model_answer(pred: dict) -> str:
+    # 🔧 模型答案：支援多種欄位格式
+    if "model_answer" in pred:
+        return pred["model_answer"]
+    if "pred_answer" in pred:
+        return pred["pred_answer"]
+    if "results" in pred and isinstance(pred["results"], list) and pred["results"]:
+        return pred["results"][0].get("answer", "")
+    # 萬一格式怪怪的，先給空字串，至少不要讓程式 crash
+    return ""
+
+
+async def run(items: list[dict], runner: JudgeRunner, progress_every: int = 20) -> list[dict]:
+    done = 0
+
+    async def one(item):
+        nonlocal done
+        rec = await runner.judge(item["question"], item["model_answer"], item["reference_answer"])
+        done += 1
+        if done % progress_every == 0 or done == len(items):
+            print(f"[{done}/{len(items)}] {runner.stats}")
+        return rec
+
+    return await asyncio.gather(*(one(it) for it in items))
+
+
+def make_client(base_url: str | None, timeout: float) -> AsyncOpenAI:
+    api_key = (os.getenv("OPENAI_API_KEY") or "").strip()
+    if not api_key and not base_url:
+        raise RuntimeError(
+            "Missing OPENAI_API_KEY environment variable. "
+            "Please set it before running judge_eval.py."
+        )
+    # 重試由 JudgeRunner 負責（含 token bucket），關閉 SDK 內建重試
+    return AsyncOpenAI(api_key=api_key or "local", base_url=base_url or None,
+                       timeout=timeout, max_retries=0)
 
 
 def main():
@@ -78,11 +272,15 @@ def main():
         required=True,
         help="標準資料 jsonl，例如 medline_eval_105.jsonl",
     )
-    parser.add_argument(
+    answers = parser.add_mutually_exclusive_group(required=True)
+    answers.add_argument(
         "--answers",
-        required=True,
         help="模型答案 jsonl，例如 res105_kw_fix2_answers.jsonl",
     )
+    answers.add_argument(
+        "--store",
+        help="predictions store 目錄（batch_eval_client.py 產生），依題目讀取答案，不呼叫 QA API",
+    )
     parser.add_argument(
         "--out",
         required=True,
@@ -91,62 +289,89 @@ def main():
     parser.add_argument(
         "--sleep",
         type=float,
-        default=0.1,
-        help="每題之間的 sleep 秒數，避免太快打 API",
+        default=None,
+        help="（舊參數）每題間隔秒數；未指定 --rpm 時換算為 60/sleep 的速率上限",
     )
+    parser.add_argument("--endpoint", default="/query", help="--store 時讀取的 endpoint")
+    parser.add_argument("--params", default="{}", help='--store 時的查詢參數 JSON，例如 \'{"lite": 1}\'')
+    parser.add_argument("--build", default=None, help="--store 時的 server build（預設取最新）")
+    parser.add_argument("--model", default=JUDGE_MODEL, help="judge 模型")
+    parser.add_argument("--base_url", default=os.getenv("JUDGE_BASE_URL") or None,
+                        help="OpenAI 相容 API base URL（例如本機 stand-in：http://127.0.0.1:8900/v1）")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時進行的 judge 請求數上限")
+    parser.add_argument("--rpm", type=float, default=None, help="每分鐘請求數上限（token bucket，預設 500）")
+    parser.add_argument("--retries", type=int, default=5, help="429 / 5xx / 逾時的重試次數（指數退避）")
+    parser.add_argument("--timeout", type=float, default=60.0, help="單次請求逾時秒數")
+    parser.add_argument("--cache", default="judge_cache.jsonl",
+                        help="verdict 快取（依內容 hash，中斷後重跑即續跑）；'' 為不快取")
     args = parser.parse_args()
 
-    with open(args.input, "r", encoding="utf-8") as fin_gold, \
-            open(args.answers, "r", encoding="utf-8") as fin_pred, \
-            open(args.out, "w", encoding="utf-8") as fout:
+    rpm = args.rpm
+    if rpm is None:
+        rpm = 60.0 / args.sleep if args.sleep else 500.0
 
-        total = 0
-        for line_gold, line_pred in zip(fin_gold, fin_pred):
-            gold = json.loads(line_gold)
-            pred = json.loads(line_pred)
+    with open(args.input, "r", encoding="utf-8") as fin_gold:
+        golds = [json.loads(line) for line in fin_gold if line.strip()]
+    if args.store:
+        store = PredictionsStore(args.store)
+        params = json.loads(args.params)
+        preds = []
+        for gold in golds:
+            rec = store.get(gold.get("question", ""), args.endpoint, params, args.build)
+            preds.append({"model_answer": rec["answer"]} if rec else {})
+        missing = sum(1 for p in preds if not p)
+        if missing:
+            print(f"[WARN] {missing} questions have no stored prediction; judged with an empty answer")
+    else:
+        with open(args.answers, "r", encoding="utf-8") as fin_pred:
+            preds = [json.loads(line) for line in fin_pred]
 
+    items = []
+    for gold, pred in zip(golds, preds):
+        items.append({
             # 問題文字
-            question = gold.get("question", "")
-
+            "question": gold.get("question", ""),
             # 標準答案：先用 answer，沒有的話用 gold_answer
-            reference_answer = gold.get(
-                "answer") or gold.get("gold_answer", "")
-
-            # 🔧 模型答案：支援多種欄位格式
-            if "model_answer" in pred:
-                model_answer = pred["model_answer"]
-            elif "pred_answer" in pred:
-                model_answer = pred["pred_answer"]
-            elif "results" in pred and isinstance(pred["results"], list) and pred["results"]:
-                model_answer = pred["results"][0].get("answer", "")
-            else:
-                # 萬一格式怪怪的，先給空字串，至少不要讓程式 crash
-                model_answer = ""
-
-            score, justification = run_judge(
-                question=question,
-                model_answer=model_answer,
-                reference_answer=reference_answer,
-            )
+            "reference_answer": gold.get("answer") or gold.get("gold_answer", ""),
+            "model_answer": extract_model_answer(pred),
+        })
 
+    cache = VerdictCache(args.cache)
+    runner = JudgeRunner(make_client(args.base_url, args.timeout), cache, model=args.model,
+                         concurrency=args.concurrency, rpm=rpm, retries=args.retries)
+    t0 = time.time()
+    try:
+        verdicts = asyncio.run(run(items, runner))
+    except KeyboardInterrupt:
+        print(f"Interrupted; {runner.stats['judged']} new verdicts saved in {args.cache}. Re-run to resume.")
+        raise
+    finally:
+        cache.close()
+
+    # 依輸入順序輸出（欄位與舊版相同）
+    tmp = args.out + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fout:
+        for item, v in zip(items, verdicts):
             fout.write(
                 json.dumps(
                     {
-                        "question": question,
-                        "reference_answer": reference_answer,
-                        "model_answer": model_answer,
-                        "score": score,
-                        "judge_note": justification,
+                        "question": item["question"],
+                        "reference_answer": item["reference_answer"],
+                        "model_answer": item["model_answer"],
+                        "score": v.get("score"),
+                        "judge_note": v.get("judge_note", ""),
                     },
                     ensure_ascii=False,
                 )
                 + "\n"
             )
+    os.replace(tmp, args.out)
 
-            total += 1
-            print(f"[{total}] score={score}")
-            time.sleep(args.sleep)
-
+    print(f"Judged {len(items)} items in {time.time() - t0:.1f}s: {runner.stats}")
+    if runner.stats["failed"]:
+        print(f"[WARN] {runner.stats['failed']} items failed after retries (score=null); re-run to retry them.")
+    if runner.stats["unparsed"]:
+        print(f"[WARN] {runner.stats['unparsed']} judge replies had no parsable score (score=null); re-run to retry them.")
     print("Saved:", args.out)
 
 
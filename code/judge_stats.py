@@ -3,12 +3,16 @@ import json
 import argparse
 import pandas as pd
 
+from bootstrap_stats import CI_METHODS, N_BOOT, group_means
+
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--judge", required=True)
     ap.add_argument("--qtype_csv", required=True)
     ap.add_argument("--prefix", default="judge")
+    ap.add_argument("--n_boot", type=int, default=N_BOOT, help="bootstrap 次數（95%% CI）")
+    ap.add_argument("--ci", choices=CI_METHODS, default="percentile")
     args = ap.parse_args()
 
     # load judge results
@@ -31,13 +35,14 @@ def main():
     merged = judge_df.merge(
         q_df[["question", "qtype"]], on="question", how="left")
 
-    # overall mean
-    overall_mean = merged["score"].mean()
+    # per qtype + overall（bootstrap 95% CI；整體依 qtype 分層）
+    # 對不到 qtype 的題目不另成一列（與舊版 groupby 相同），但仍計入整體
+    grp = group_means(merged, "score", "qtype", n_boot=args.n_boot, ci=args.ci).set_index("qtype")
+    overall = grp.loc["ALL"]
+    grp = grp.drop(index="ALL")
     print("\n=== LLM-as-a-Judge 統計（GPT-4o mini）===")
-    print(f"整體平均分數：{overall_mean:.3f}")
+    print(f"整體平均分數：{overall['mean']:.3f}  95% CI [{overall['ci_lo']:.3f}, {overall['ci_hi']:.3f}]")
 
-    # per qtype
-    grp = merged.groupby("qtype")["score"].agg(["mean", "count"])
     print("\n--- 各題型平均分數 ---")
     print(grp)
 
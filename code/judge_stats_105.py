@@ -3,6 +3,8 @@ import argparse
 import collections
 import pandas as pd
 
+from bootstrap_stats import CI_METHODS, N_BOOT, group_means
+
 
 def load_gold(path):
     items = []
@@ -30,6 +32,8 @@ def main():
                         help="例如 judge_105_kw_fix2_gpt4omini.jsonl")
     parser.add_argument("--out", required=True,
                         help="輸出統計 CSV，例如 judge_105_stats.csv")
+    parser.add_argument("--n_boot", type=int, default=N_BOOT, help="bootstrap 次數（95%% CI）")
+    parser.add_argument("--ci", choices=CI_METHODS, default="percentile")
     args = parser.parse_args()
 
     gold_items = load_gold(args.gold)
@@ -55,17 +59,17 @@ def main():
     # 只保留有分數的
     df_valid = df[df["score"].notna()].copy()
     n = len(df_valid)
-    overall_mean = df_valid["score"].mean()
+    # 各 qtype 平均與整體平均（bootstrap 95% CI；整體依 qtype 分層）
+    by_qtype = group_means(df_valid, "score", "qtype", n_boot=args.n_boot, ci=args.ci)
+    overall = by_qtype[by_qtype["qtype"] == "ALL"].iloc[0]
+    by_qtype = by_qtype[by_qtype["qtype"] != "ALL"]
 
     print("=== LLM-as-a-Judge 統計（GPT-4o mini）===")
     print(f"總題數 (有分數)：{n}")
-    print(f"整體平均分數：{overall_mean:.3f}")
+    print(f"整體平均分數：{overall['mean']:.3f}  95% CI [{overall['ci_lo']:.3f}, {overall['ci_hi']:.3f}]")
 
     # 各 qtype 平均
     print("\n--- 各題型平均分數 ---")
-    by_qtype = df_valid.groupby("qtype")["score"].agg(
-        ["mean", "count"]).reset_index()
-    by_qtype = by_qtype.sort_values("qtype")
     print(by_qtype.to_string(index=False))
 
     # 分數分佈
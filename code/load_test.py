@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# load_test.py
+# API 壓力測試：以 MedlinePlus 評估集的問題重播 /query、/llm_only、/demo/search，
+#   open loop  ：依目標到達率（Poisson）送出請求，不等回應；延遲從「預定送出時間」起算，
+#                避免 coordinated omission（伺服器變慢時不會因少送請求而低估尾延遲）
+#   closed loop：固定 N 個並行使用者，每個收到回應才送下一題
+# 每個負載等級記錄 HDR 式延遲直方圖（對數分桶、相對誤差 < 1%）與錯誤 / 逾時率，
+# 多個等級組成飽和曲線（throughput、p50/p90/p99/p99.9 vs. 負載），找出吞吐上限與拐點。
+#
+#   python load_test.py run --host http://localhost:8000 --endpoint /llm_only \
+#       --input medline_eval_105.jsonl --rates 0.5,1,2,4 --duration 60 --out load_llm_only
+#   python load_test.py run --endpoint /query --concurrency 1,2,4,8 --duration 60 --out load_query
+#
+# 不想動到真正的 Ollama 時，可用本機 stand-in（/api/generate，固定 prefill + 每 token 延遲）：
+#   python load_test.py standin-ollama --port 11500 --token_ms 20
+#   OLLAMA_BASE_URL=http://127.0.0.1:11500 OLLAMA_WARMUP=0 uvicorn main:app --app-dir app
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENDPOINTS = ("/query", "/llm_only", "/demo/search")
+PERCENTILES = (50, 90, 99, 99.9)
+SAMPLE_QUESTIONS = [
+    "What is asthma?",
+    "What are the symptoms of chronic obstructive pulmonary disease?",
+    "How is type 2 diabetes mellitus treated?",
+    "What is gastroesophageal reflux disease?",
+    "What are the symptoms of Parkinson's disease?",
+    "How is hypertension treated?",
+]
+
+
+# ============ HDR 式直方圖 ============
+
+
+class LatencyHistogram:
+    """Log-linear histogram of integer microseconds (HdrHistogram layout).
+
+    Values below 2**SUB_BITS are exact; above, each power-of-two range is split
+    into 2**(SUB_BITS-1) equal buckets, so any recorded value is reported within
+    1 / 2**(SUB_BITS-1) (< 0.8%) of its true value. Histograms merge by adding counts."""
+
+    SUB_BITS = 8
+    _HALF = 1 << (SUB_BITS - 1)
+
+    def __init__(self):
+        self.counts: dict[int, int] = {}
+        self.total = 0
+        self.min_us = None
+        self.max_us = 0
+        self.sum_us = 0
+
+    @classmethod
+    def _index(cls, v: int) -> int:
+        shift = max(0, v.bit_length() - cls.SUB_BITS)
+        if shift == 0:
+            return v
+        return (shift + 1) * cls._HALF + (v >> shift) - cls._HALF
+
+    @classmethod
+    def _value(cls, idx: int) -> int:
+        """Highest value that falls into bucket idx."""
+        if idx < 2 * cls._HALF:
+            return idx
+        shift = idx // cls._HALF - 1
+        sub = idx % cls._HALF + cls._HALF
+        return ((sub + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        v = max(0, int(seconds * 1e6))
+        i = self._index(v)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.total += 1
+        self.sum_us += v
+        self.max_us = max(self.max_us, v)
+        self.min_us = v if self.min_us is None else min(self.min_us, v)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for i, c in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + c
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def percentile_ms(self, p: float) -> float | None:
+        if not self.total:
+            return None
+        rank = max(1, math.ceil(p / 100.0 * self.total))
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(self._value(i), self.max_us) / 1000.0
+        return self.max_us / 1000.0
+
+    def mean_ms(self) -> float | None:
+        return self.sum_us / self.total / 1000.0 if self.total else None
+
+    def to_dict(self) -> dict:
+        return {"sub_bits": self.SUB_BITS, "unit": "us", "total": self.total, "min": self.min_us,
+                "max": self.max_us, "sum": self.sum_us, "counts": {str(k): v for k, v in sorted(self.counts.items())}}
+
+
+# ============ 負載產生 ============
+
+
+def load_questions(path: str, limit: int = 0) -> list[str]:
+    if not path:
+        return SAMPLE_QUESTIONS
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            q = (json.loads(line).get("question") or "").strip()
+            if q:
+                out.append(q)
+            if limit and len(out) >= limit:
+                break
+    if not out:
+        raise SystemExit(f"no questions in {path}")
+    return out
+
+
+class Stats:
+    """Outcomes of one load level."""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()   # 從預定送出時間起算（open loop 含排隊）
+        self.service = LatencyHistogram()   # 從實際送出起算
+        self.ok = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.dropped = 0
+        self.ok_in_window = 0   # 在量測時段內完成的成功請求（throughput 只算這些）
+        self.window_end = float("inf")
+        self.status: dict[str, int] = {}
+
+    def summary(self, duration_s: float) -> dict:
+        sent = self.ok + self.errors + self.timeouts
+        row = {
+            "sent": sent, "ok": self.ok, "errors": self.errors, "timeouts": self.timeouts,
+            "dropped": self.dropped,
+            "arrival_rps": round((sent + self.dropped) / duration_s, 3) if duration_s > 0 else None,
+            "throughput_rps": round(self.ok_in_window / duration_s, 3) if duration_s > 0 else None,
+            "error_rate": round((self.errors + self.timeouts) / sent, 4) if sent else None,
+            "mean_ms": _round(self.latency.mean_ms()),
+        }
+        for p in PERCENTILES:
+            row[f"p{p:g}_ms"] = _round(self.latency.percentile_ms(p))
+        row["max_ms"] = _round(self.latency.max_us / 1000.0 if self.latency.total else None)
+        row["service_p99_ms"] = _round(self.service.percentile_ms(99))
+        return row
+
+
+def _round(v):
+    return None if v is None else round(v, 2)
+
+
+class LoadRunner:
+    def __init__(self, base_url: str, endpoint: str, questions: list[str], params: dict | None = None,
+                 api_key: str = "", timeout: float = 60.0, seed: int = 0):
+        self.url = base_url.rstrip("/") + endpoint
+        self.questions = questions
+        self.params = params or {}
+        self.headers = {"X-API-KEY": api_key} if api_key else {}
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+
+    def _next_question(self) -> str:
+        return self.rng.choice(self.questions)
+
+    async def _one(self, client, stats: Stats | None, intended: float) -> None:
+        params = {"question": self._next_question(), **self.params}
+        start = time.perf_counter()
+        try:
+            r = await client.get(self.url, params=params, headers=self.headers, timeout=self.timeout)
+            ok = r.status_code < 400
+            code = str(r.status_code)
+        except Exception as e:  # noqa: BLE001 — 任何傳輸錯誤都算一次失敗
+            import httpx
+
+            ok = False
+            code = "timeout" if isinstance(e, httpx.TimeoutException) else type(e).__name__
+        end = time.perf_counter()
+        if stats is None:
+            return
+        stats.status[code] = stats.status.get(code, 0) + 1
+        if ok:
+            stats.ok += 1
+            stats.ok_in_window += end <= stats.window_end
+            stats.latency.record(end - intended)
+            stats.service.record(end - start)
+        elif code == "timeout":
+            stats.timeouts += 1
+        else:
+            stats.errors += 1
+
+    async def open_loop(self, rate: float, duration_s: float, warmup_s: float = 0.0,
+                        max_inflight: int = 1000) -> tuple[Stats, float]:
+        """Poisson arrivals at `rate` req/s. Arrivals beyond max_inflight are dropped (counted)."""
+        import httpx
+
+        stats = Stats()
+        limits = httpx.Limits(max_connections=max_inflight, max_keepalive_connections=max_inflight)
+        async with httpx.AsyncClient(limits=limits) as client:
+            tasks: set[asyncio.Task] = set()
+            t0 = time.perf_counter()
+            measure_from = t0 + warmup_s
+            end = stats.window_end = measure_from + duration_s
+            next_at = t0
+            while next_at < end:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                measured = next_at >= measure_from
+                if len(tasks) >= max_inflight:
+                    if measured:
+                        stats.dropped += 1
+                else:
+                    task = asyncio.create_task(self._one(client, stats if measured else None, next_at))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                next_at += self.rng.expovariate(rate)
+            if tasks:
+                await asyncio.wait(tasks)
+        return stats, duration_s
+
+    async def closed_loop(self, concurrency: int, duration_s: float, warmup_s: float = 0.0,
+                          think_s: float = 0.0) -> tuple[Stats, float]:
+        """`concurrency` users, each sending the next request when the previous one returns."""
+        import httpx
+
+        stats = Stats()
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits) as client:
+            t0 = time.perf_counter()
+            measure_from = t0 + warmup_s
+            end = stats.window_end = measure_from + duration_s
+
+            async def user():
+                while True:
+                    now = time.perf_counter()
+                    if now >= end:
+                        return
+                    await self._one(client, stats if now >= measure_from else None, now)
+                    if think_s:
+                        await asyncio.sleep(think_s)
+
+            await asyncio.gather(*(user() for _ in range(concurrency)))
+        return stats, duration_s
+
+
+def _knee(rows: list[dict], slo_ms: float | None) -> dict | None:
+    """First level where throughput stops tracking the load: open loop completes
+    < 90% of the arrivals within the window, closed loop gains < 10% throughput
+    from more users; or the error rate passes 1%, or p99 exceeds the SLO."""
+    prev = None
+    for row in rows:
+        thr = row["throughput_rps"] or 0.0
+        if "offered_rps" in row:
+            if row["arrival_rps"] and thr < 0.9 * row["arrival_rps"]:
+                return {**row, "reason": "throughput < 90% of arrivals"}
+        elif prev is not None and thr < 1.1 * (prev["throughput_rps"] or 0.0):
+            return {**row, "reason": "throughput plateau (< 10% gain)"}
+        prev = row
+        if row["error_rate"] and row["error_rate"] > 0.01:
+            return {**row, "reason": "error rate > 1%"}
+        if slo_ms and row["p99_ms"] is not None and row["p99_ms"] > slo_ms:
+            return {**row, "reason": f"p99 > {slo_ms:g} ms"}
+    return None
+
+
+def run_sweep(args) -> list[dict]:
+    questions = load_questions(args.input, args.limit)
+    params = json.loads(args.params) if args.params else {}
+    levels = [float(x) for x in (args.rates or args.concurrency).split(",") if x.strip()]
+    mode = "open" if args.rates else "closed"
+    rows, histograms = [], {}
+    for level in levels:
+        runner = LoadRunner(args.host, args.endpoint, questions, params, args.api_key, args.timeout, args.seed)
+        if mode == "open":
+            stats, dur = asyncio.run(runner.open_loop(level, args.duration, args.warmup, args.max_inflight))
+        else:
+            stats, dur = asyncio.run(runner.closed_loop(int(level), args.duration, args.warmup, args.think_ms / 1000))
+        row = {"endpoint": args.endpoint, "mode": mode,
+               ("offered_rps" if mode == "open" else "concurrency"): level, **stats.summary(dur)}
+        rows.append(row)
+        histograms[f"{mode}:{level:g}"] = {"latency": stats.latency.to_dict(), "service": stats.service.to_dict(),
+                                          "status": stats.status}
+        print(f"[{mode} {level:g}] ok={row['ok']} err={row['errors']} timeout={row['timeouts']} "
+              f"dropped={row['dropped']} thr={row['throughput_rps']} rps "
+              f"p50={row['p50_ms']} p99={row['p99_ms']} p99.9={row['p99.9_ms']} ms")
+        if args.cooldown:
+            time.sleep(args.cooldown)
+
+    knee = _knee(rows, args.slo_ms)
+    best = max(rows, key=lambda r: r["throughput_rps"] or 0)
+    print(f"\nPeak throughput {best['throughput_rps']} rps at {mode} level "
+          f"{best.get('offered_rps', best.get('concurrency')):g}")
+    if knee:
+        print(f"Saturation at {mode} level {knee.get('offered_rps', knee.get('concurrency')):g}: {knee['reason']}")
+
+    if args.out:
+        with open(args.out + ".csv", "w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=list(rows[0]))
+            w.writeheader()
+            w.writerows(rows)
+        with open(args.out + ".json", "w", encoding="utf-8") as f:
+            json.dump({"endpoint": args.endpoint, "host": args.host, "mode": mode, "params": params,
+                       "duration_s": args.duration, "warmup_s": args.warmup, "curve": rows,
+                       "knee": knee, "histograms": histograms}, f, ensure_ascii=False, indent=2)
+        print(f"Saved: {args.out}.csv, {args.out}.json")
+    return rows
+
+
+# ============ stand-in Ollama ============
+
+
+STANDIN_ANSWER = ("[根據知識圖譜]\n氣喘是一種慢性呼吸道發炎疾病。\n\n"
+                  "[一般性補充（LLM 常識，非知識圖譜證據）]\n- 常見症狀包括喘鳴與咳嗽。\n- 請諮詢醫師。\n- 避免誘發因子。\n")
+
+
+def make_ollama_handler(prefill_ms: float, token_ms: float, max_concurrent: int):
+    slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+    tokens = [t for t in STANDIN_ANSWER.replace("\n", "\n ").split(" ") if t]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            body = json.dumps({"models": [{"name": "standin"}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            n = min(len(tokens), int((req.get("options") or {}).get("num_predict") or len(tokens)))
+            # 一個 GPU 一次只跑 max_concurrent 個生成，其餘排隊（模擬 OLLAMA_NUM_PARALLEL）
+            if slots:
+                slots.acquire()
+            try:
+                time.sleep(prefill_ms / 1000)
+                stream = req.get("stream", True)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                done = {"response": "", "done": True, "done_reason": "stop" if n == len(tokens) else "length",
+                        "eval_count": n, "load_duration": 0, "model": req.get("model", "standin")}
+                if not stream:
+                    time.sleep(n * token_ms / 1000)
+                    self.wfile.write(json.dumps({**done, "response": " ".join(tokens[:n])}).encode())
+                    return
+                for tok in tokens[:n]:
+                    time.sleep(token_ms / 1000)
+                    self.wfile.write(json.dumps({"response": tok + " ", "done": False}).encode() + b"\n")
+                    self.wfile.flush()
+                self.wfile.write(json.dumps(done).encode() + b"\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                if slots:
+                    slots.release()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve_ollama(host: str = "127.0.0.1", port: int = 11500, prefill_ms: float = 50.0,
+                 token_ms: float = 20.0, max_concurrent: int = 1) -> ThreadingHTTPServer:
+    """Starts the stand-in Ollama in a daemon thread (port 0 picks a free port)."""
+    server = ThreadingHTTPServer((host, port), make_ollama_handler(prefill_ms, token_ms, max_concurrent))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Open/closed-loop load generator with saturation curves.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("run", help="sweep load levels against one endpoint")
+    p.add_argument("--host", default=os.getenv("API_BASE", "http://localhost:8000"))
+    p.add_argument("--endpoint", choices=ENDPOINTS, default="/llm_only")
+    p.add_argument("--input", default="", help="MedlinePlus eval JSONL (question field); default: built-in sample")
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--params", default="", help='extra query params JSON, e.g. \'{"lite": 1, "debug": 0}\'')
+    levels = p.add_mutually_exclusive_group(required=True)
+    levels.add_argument("--rates", default="", help="open loop: comma-separated arrival rates (req/s)")
+    levels.add_argument("--concurrency", default="", help="closed loop: comma-separated user counts")
+    p.add_argument("--duration", type=float, default=60.0, help="measured seconds per level")
+    p.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before each level")
+    p.add_argument("--cooldown", type=float, default=2.0, help="pause between levels")
+    p.add_argument("--timeout", type=float, default=60.0)
+    p.add_argument("--max_inflight", type=int, default=1000, help="open loop: drop arrivals above this")
+    p.add_argument("--think_ms", type=float, default=0.0, help="closed loop: pause between a user's requests")
+    p.add_argument("--slo_ms", type=float, default=None, help="p99 SLO used to mark the saturation point")
+    p.add_argument("--api_key", default=os.getenv("APP_API_KEY", ""))
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default="", help="write <out>.csv (curve) and <out>.json (curve + histograms)")
+
+    p = sub.add_parser("standin-ollama", help="local Ollama /api/generate stand-in")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=11500)
+    p.add_argument("--prefill_ms", type=float, default=50.0)
+    p.add_argument("--token_ms", type=float, default=20.0)
+    p.add_argument("--max_concurrent", type=int, default=1, help="generations served at once (0 = unlimited)")
+    args = ap.parse_args()
+
+    if args.cmd == "run":
+        run_sweep(args)
+        return
+    server = serve_ollama(args.host, args.port, args.prefill_ms, args.token_ms, args.max_concurrent)
+    print(f"stand-in Ollama on http://{args.host}:{server.server_address[1]} "
+          f"(prefill {args.prefill_ms:g} ms, {args.token_ms:g} ms/token, {args.max_concurrent or 'unlimited'} at once)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pathlib import Path
+import heapq
 import json
 import re
+import threading
 from typing import Dict, List, Any, Tuple
 
 app = FastAPI()
@@ -45,27 +47,100 @@ def jaccard_similarity(a: set, b: set) -> float:
     union = len(a | b)
     return inter / union if union else 0.0
 
-def find_best_match(user_question: str, bank: List[Dict[str, Any]]) -> Tuple[Dict[str, Any] | None, float]:
+# ========== In-memory bank index (rebuilt when demo_bank.json changes) ==========
+# 幾乎每題都有的字不進倒排索引：只靠這些字重疊的題目不算候選，否則每次查詢都要掃過大半個題庫
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "with", "and", "or", "in", "on", "to", "by", "at", "from",
+    "what", "which", "who", "how", "why", "when", "where",
+    "is", "are", "was", "were", "be", "do", "does", "can", "i", "my", "it", "its",
+}
+# 出現在超過此比例題目中的 token 也視同 stopword（題庫太小時不套用）
+MAX_DF_RATIO = 0.2
+MIN_DF_BANK_SIZE = 50
+
+# 索引是不可變的 dict：重建時建立新物件後整個換掉參照，讀取端不會看到建到一半的索引
+_BANK_INDEX: Dict[str, Any] = {
+    "stamp": None,
+    "bank": [],
+    "token_sets": [],
+    "postings": {},
+}
+_BANK_INDEX_LOCK = threading.Lock()
+
+
+def build_bank_index(bank: List[Dict[str, Any]], stamp: Any = None) -> Dict[str, Any]:
+    """預先計算每題的 token set，並建立 token -> bank 位置 的倒排索引（不含 stopword 與高 DF token）。"""
+    token_sets = [token_set(item.get("question", "")) for item in bank]
+    postings: Dict[str, List[int]] = {}
+    for pos, toks in enumerate(token_sets):
+        for tok in toks:
+            if tok not in STOPWORDS:
+                postings.setdefault(tok, []).append(pos)
+    if len(bank) >= MIN_DF_BANK_SIZE:
+        max_df = MAX_DF_RATIO * len(bank)
+        postings = {tok: ps for tok, ps in postings.items() if len(ps) <= max_df}
+    return {"stamp": stamp, "bank": bank, "token_sets": token_sets, "postings": postings}
+
+
+def load_demo_bank_index() -> Dict[str, Any]:
+    """只在 demo_bank.json 的 mtime / size 變動時重新讀檔建索引。"""
+    global _BANK_INDEX
+    try:
+        st = DEMO_BANK_PATH.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        stamp = None
+
+    index = _BANK_INDEX
+    if index["stamp"] == stamp:
+        return index
+
+    with _BANK_INDEX_LOCK:
+        index = _BANK_INDEX
+        if index["stamp"] != stamp:
+            bank = load_demo_bank() if stamp is not None else []
+            index = build_bank_index(bank, stamp)
+            _BANK_INDEX = index
+    return index
+
+
+def top_k_matches(user_question: str, index: Dict[str, Any], k: int = 5) -> List[Tuple[int, float]]:
+    """只對至少共用一個索引 token 的題目計算 Jaccard（以完整 token set 計分）。"""
     user_tokens = token_set(user_question)
-    best_item = None
-    best_score = -1.0
+    token_sets = index["token_sets"]
+    postings = index["postings"]
 
-    for item in bank:
-        q = item.get("question", "")
-        score = jaccard_similarity(user_tokens, token_set(q))
-        if score > best_score:
-            best_score = score
-            best_item = item
+    candidates = set()
+    for tok in user_tokens:
+        candidates.update(postings.get(tok, ()))
 
-    return best_item, best_score
+    scored = [
+        (pos, jaccard_similarity(user_tokens, token_sets[pos]))
+        for pos in sorted(candidates)
+    ]
+    # nlargest 對同分保持原順序，與逐題線性比對時「先出現者勝」一致
+    return heapq.nlargest(k, scored, key=lambda x: x[1])
+
+
+def find_best_match(user_question: str, bank: List[Dict[str, Any]] | Dict[str, Any]) -> Tuple[Dict[str, Any] | None, float]:
+    index = bank if isinstance(bank, dict) else build_bank_index(bank)
+    if not index["bank"]:
+        return None, -1.0
+
+    top = top_k_matches(user_question, index, k=1)
+    if not top:
+        # 沒有共同的索引 token（只重疊 stopword 也算）：回傳第一題且分數為 0
+        return index["bank"][0], 0.0
+    pos, score = top[0]
+    return index["bank"][pos], score
 
 @app.get("/demo/search")
 def demo_search(question: str) -> Dict[str, Any]:
-    bank = load_demo_bank()
-    if not bank:
+    index = load_demo_bank_index()
+    if not index["bank"]:
         return {"error": "demo_bank.json not found or empty"}
 
-    best_item, score = find_best_match(question, bank)
+    best_item, score = find_best_match(question, index)
     if best_item is None:
         return {"error": "no match found"}
 
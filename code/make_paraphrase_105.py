@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
 # make_paraphrase_105.py
+# 透過 POST /generate 直接送出改寫指令（不經 /llm_only 的回答模板與 qtype 判斷），
+# 以 --concurrency 個 worker 同時生成；每題結果即時寫入 paraphrase cache，
+# 中斷後以相同指令重跑只會補齊尚未完成的題目，輸出順序與輸入相同。
 import argparse
+import hashlib
 import json
-import time
+import os
 import random
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import requests
@@ -15,47 +22,92 @@ PARA_PROMPT_TMPL = (
     "(definition / symptoms / treatments). Keep it concise and natural. Output only the paraphrased question, "
     "no quotes, no prefixes.\n\nQ: {q}\nParaphrase:"
 )
-
-
-def paraphrase_once(base_url: str, question: str, timeout: float) -> str:
-    """Call /llm_only to get a paraphrase for a single question."""
-    prompt = PARA_PROMPT_TMPL.format(q=question)
-    r = requests.get(
-        f"{base_url}/llm_only",
-        params={"question": prompt},
-        timeout=timeout,
-    )
-    r.raise_for_status()
-    data = r.json()
-    ans = (data.get("results") or [{}])[0].get("answer", "").strip()
-    # sanitize: take first non-empty line, strip quotes and label-y prefixes
-    if not ans:
+# 改寫 prompt 或清理規則變更時遞增，使舊的 cache 失效
+PROMPT_VERSION = 2
+NUM_PREDICT = 96
+STOP = ["\nQ:", "\n\n"]
+
+
+def cache_key(question: str, model: str) -> str:
+    raw = json.dumps([PROMPT_VERSION, model, question], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ParaphraseCache:
+    """Append-only JSONL of paraphrases keyed by (prompt version, model, question) hash.
+
+    Every paraphrase is flushed as soon as it arrives, so an interrupted run
+    resumes by running the same command again."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.items: dict[str, dict] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    # 中斷時最後一行可能寫到一半
+                    if line.endswith("\n") and line.strip():
+                        rec = json.loads(line)
+                        self.items[rec["key"]] = rec
+        self._fh = open(path, "a", encoding="utf-8") if path else None
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        return self.items.get(key)
+
+    def put(self, rec: dict) -> None:
+        with self._lock:
+            self.items[rec["key"]] = rec
+            if self._fh:
+                self._fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh:
+            self._fh.close()
+
+
+def clean_paraphrase(text: str) -> str:
+    """First non-empty line without surrounding quotes or label-y prefixes."""
+    lines = [ln.strip() for ln in (text or "").splitlines() if ln.strip()]
+    if not lines:
         return ""
-    line = ans.splitlines()[0].strip()
-    # remove leading quotes or "Paraphrase:" etc.
+    line = lines[0]
     for bad in ('"', "“", "”", "Paraphrase:", "Paraphrase -", "Q:", "A:"):
         if line.startswith(bad):
             line = line[len(bad):].strip()
-    return line
+    return line.strip('"“” ')
 
 
-def paraphrase_with_retry(base_url: str, question: str, timeout: float, retries: int, backoff: float) -> str:
-    """Retry wrapper with exponential backoff."""
-    last_err = None
+def paraphrase_once(session: requests.Session, base_url: str, question: str, model: str,
+                    timeout: float, headers: dict) -> str:
+    """Call POST /generate to get a paraphrase for a single question."""
+    payload = {"prompt": PARA_PROMPT_TMPL.format(q=question), "num_predict": NUM_PREDICT, "stop": STOP}
+    if model:
+        payload["model"] = model
+    r = session.post(f"{base_url}/generate", json=payload, timeout=timeout, headers=headers)
+    r.raise_for_status()
+    res = (r.json().get("results") or [{}])[0]
+    if res.get("error"):
+        raise RuntimeError(res["error"])
+    return clean_paraphrase(res.get("text", ""))
+
+
+def paraphrase_with_retry(session, base_url: str, question: str, model: str, timeout: float,
+                          retries: int, backoff: float, headers: dict) -> tuple[str, str | None]:
+    """(paraphrase, None) on success; (original question, last error) when every try failed."""
+    last_err = "empty paraphrase"
     for i in range(retries + 1):
         try:
-            out = paraphrase_once(base_url, question, timeout)
+            out = paraphrase_once(session, base_url, question, model, timeout, headers)
             if out:
-                return out
+                return out, None
         except Exception as e:
-            last_err = e
-        # backoff
-        sleep_s = backoff * (2 ** i)
-        time.sleep(sleep_s)
-    # if all failed, fall back to original question
-    if last_err:
-        print(f"[WARN] paraphrase failed after {retries+1} tries: {last_err}", file=sys.stderr)
-    return question
+            last_err = str(e)
+        if i < retries:
+            # 指數退避加 jitter，避免同時失敗的 worker 一起重試
+            time.sleep(backoff * (2 ** i) * (0.5 + random.random()))
+    return question, last_err
 
 
 def iter_jsonl(path: Path):
@@ -67,14 +119,18 @@ def iter_jsonl(path: Path):
 
 
 def main():
-    ap = argparse.ArgumentParser(description="Generate paraphrased version of 105 QA questions via /llm_only.")
+    ap = argparse.ArgumentParser(description="Generate paraphrased version of 105 QA questions via POST /generate.")
     ap.add_argument("--input", default="medline_eval_105.jsonl", help="Input JSONL (original 105)")
     ap.add_argument("--output", default="paraphrase_105.jsonl", help="Output JSONL (paraphrased questions)")
     ap.add_argument("--base", default="http://localhost:8000", help="Base URL of your FastAPI server")
+    ap.add_argument("--api_key", default=os.getenv("APP_API_KEY", ""), help="API key sent as X-API-KEY header")
+    ap.add_argument("--model", default="", help="LLM model name (default: server's default model)")
     ap.add_argument("--timeout", type=float, default=60.0, help="HTTP timeout (seconds)")
-    ap.add_argument("--sleep", type=float, default=0.8, help="Sleep between requests (seconds)")
+    ap.add_argument("--concurrency", type=int, default=4, help="Concurrent requests in flight")
+    ap.add_argument("--sleep", type=float, default=0.0, help="Optional pause per worker between requests (seconds)")
     ap.add_argument("--retries", type=int, default=2, help="Max retries per item (exponential backoff)")
     ap.add_argument("--backoff", type=float, default=0.5, help="Initial backoff seconds for retry")
+    ap.add_argument("--cache", default="paraphrase_cache.jsonl", help="Paraphrase cache JSONL ('' to disable)")
     ap.add_argument("--limit", type=int, default=0, help="Process at most N items (0 = all)")
     ap.add_argument("--start", type=int, default=0, help="Start index (0-based) for processing")
     ap.add_argument("--shuffle", action="store_true", help="Shuffle order before processing")
@@ -96,33 +152,68 @@ def main():
     if args.limit and args.limit > 0:
         idxs = idxs[:args.limit]
 
-    outp = Path(args.output)
-    done = 0
-    t0 = time.time()
-
-    with outp.open("w", encoding="utf-8") as fout:
-        for n, i in enumerate(idxs, start=1):
-            obj = items[i]
-            q = obj.get("question", "").strip()
-            if not q:
-                # keep item as-is if no question field
-                fout.write(json.dumps(obj, ensure_ascii=False) + "\n")
-                continue
-
-            new_q = paraphrase_with_retry(args.base, q, args.timeout, args.retries, args.backoff)
-            obj2 = dict(obj)
-            obj2["question"] = new_q
-            fout.write(json.dumps(obj2, ensure_ascii=False) + "\n")
-            done += 1
-
-            # progress
-            if n % 10 == 0 or n == len(idxs):
-                elapsed = time.time() - t0
-                print(f"[{n}/{len(idxs)}] saved… avg {elapsed/max(1,n):.2f}s/it")
-
+    cache = ParaphraseCache(args.cache)
+    headers = {"X-API-KEY": args.api_key} if args.api_key else {}
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(1, args.concurrency))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    # 同一問題只送一次；已在 cache 的直接沿用
+    out_q: dict[int, str] = {}
+    todo: dict[str, list[int]] = {}
+    for i in idxs:
+        q = (items[i].get("question") or "").strip()
+        if not q:
+            continue
+        hit = cache.get(cache_key(q, args.model))
+        if hit:
+            out_q[i] = hit["paraphrase"]
+        else:
+            todo.setdefault(q, []).append(i)
+    print(f"[INFO] {len(idxs)} items: {len(out_q)} cached, {len(todo)} to generate "
+          f"(concurrency={args.concurrency})")
+
+    def work(q: str):
+        out, err = paraphrase_with_retry(session, args.base, q, args.model, args.timeout,
+                                         args.retries, args.backoff, headers)
+        if args.sleep > 0:
             time.sleep(args.sleep)
+        return q, out, err
+
+    failed = 0
+    t0 = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as ex:
+            futures = [ex.submit(work, q) for q in todo]
+            for n, fut in enumerate(as_completed(futures), start=1):
+                q, out, err = fut.result()
+                if err:
+                    # 失敗的題目不寫入 cache，輸出暫用原題，重跑時會再試
+                    failed += 1
+                    print(f"[WARN] paraphrase failed after {args.retries + 1} tries: {err}", file=sys.stderr)
+                else:
+                    cache.put({"key": cache_key(q, args.model), "question": q, "paraphrase": out,
+                               "model": args.model, "prompt_version": PROMPT_VERSION})
+                for i in todo[q]:
+                    out_q[i] = out
+                if n % 10 == 0 or n == len(futures):
+                    elapsed = time.time() - t0
+                    print(f"[{n}/{len(futures)}] done… {n / max(elapsed, 1e-9):.2f} it/s")
+    finally:
+        cache.close()
 
-    print(f"Saved: {outp} (items={done})")
+    outp = Path(args.output)
+    tmp = outp.with_name(outp.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as fout:
+        for i in idxs:
+            obj = dict(items[i])
+            if i in out_q:
+                obj["question"] = out_q[i]
+            fout.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    os.replace(tmp, outp)
+
+    print(f"Saved: {outp} (items={len(idxs)}, failed={failed})")
 
 
 if __name__ == "__main__":
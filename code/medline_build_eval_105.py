@@ -8,21 +8,18 @@ Patched generator: 35 topics × 3 QAs (definition / symptoms / treatments) = 105
 Output: ./data/medline_eval_35x3.jsonl
 """
 
-import requests
-import time
+import argparse
 import re
 import json
 import logging
-import xml.etree.ElementTree as ET
 from pathlib import Path
-from urllib.parse import urlencode
+
+from medline_fetch import add_fetch_args, fetcher_from_args
 
 # ---------------- Config ----------------
 logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s - %(levelname)s - %(message)s")
-API_BASE = "https://wsearch.nlm.nih.gov/ws/query"
 OUT_PATH = Path("./data/medline_eval_35x3.jsonl")
-OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 STUB = "No summary is available from MedlinePlus for this specific aspect. Please refer to the condition overview."
 
@@ -156,15 +153,6 @@ def first_definition_sentences(full_summary: str, avoid_keywords: list[str], max
     return out if len(out.split()) >= min_words else None
 
 
-def fetch_docs_by_term(term: str):
-    params = {"db": "healthTopics", "term": term, "rettype": "all"}
-    url = f"{API_BASE}?{urlencode(params)}"
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    root = ET.fromstring(r.text)
-    return root.findall(".//document")
-
-
 def parse_document_contents(doc_elem):
     contents = {}
     for c in doc_elem.findall("./content"):
@@ -267,46 +255,56 @@ def build_three_qa(doc_elem, canonical_topic: str, max_words=120):
 # ---------------- Main ----------------
 
 
+def resolve_topic(fetcher, canonical: str):
+    """Three QA items for one topic, from the best-matching document of its aliases (or STUB)."""
+    aliases = ALIASES.get(canonical, [canonical])
+    logging.info(f"[Topic] {canonical} | aliases={aliases}")
+    best_doc = None
+
+    # 逐一以別名查詢，挑最匹配的一份 document
+    for term in aliases:
+        try:
+            docs = fetcher.documents(term)
+        except Exception as e:
+            logging.error(f"  fetch failed for '{term}': {e}")
+            continue
+        if not docs:
+            continue
+        cand = choose_best_document(docs, aliases)
+        if cand is not None:
+            best_doc = cand
+            break
+
+    if best_doc is None:
+        logging.warning(
+            f"  -> No document chosen for '{canonical}'. Using STUB.")
+        return [
+            {"question": f"What is {canonical}?",
+                "answer": STUB, "topic_name": canonical},
+            {"question": f"What are the symptoms of {canonical}?",
+                "answer": STUB, "topic_name": canonical},
+            {"question": f"How is {canonical} treated?",
+                "answer": STUB, "topic_name": canonical},
+        ]
+    return build_three_qa(best_doc, canonical_topic=canonical, max_words=120)
+
+
 def main():
+    ap = argparse.ArgumentParser(description="Build the 35 topics × 3 QA MedlinePlus eval set.")
+    ap.add_argument("--out", default=str(OUT_PATH))
+    add_fetch_args(ap)
+    args = ap.parse_args()
+    fetcher = fetcher_from_args(args)
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # 各主題並行查詢（同時請求數與速率由 fetcher 限制），依原順序寫出
+    all_triples = fetcher.map(lambda c: resolve_topic(fetcher, c), CANON_TOPICS)
+
     total = 0
     empty_cnt = 0
-    with open(OUT_PATH, "w", encoding="utf-8") as out:
-        for canonical in CANON_TOPICS:
-            aliases = ALIASES.get(canonical, [canonical])
-            logging.info(f"[Topic] {canonical} | aliases={aliases}")
-            best_doc = None
-
-            # 逐一以別名查詢，挑最匹配的一份 document
-            for term in aliases:
-                try:
-                    docs = fetch_docs_by_term(term)
-                except Exception as e:
-                    logging.error(f"  fetch failed for '{term}': {e}")
-                    continue
-                if not docs:
-                    time.sleep(0.2)
-                    continue
-                cand = choose_best_document(docs, aliases)
-                if cand is not None:
-                    best_doc = cand
-                    break
-                time.sleep(0.2)
-
-            if best_doc is None:
-                logging.warning(
-                    f"  -> No document chosen for '{canonical}'. Using STUB.")
-                triples = [
-                    {"question": f"What is {canonical}?",
-                        "answer": STUB, "topic_name": canonical},
-                    {"question": f"What are the symptoms of {canonical}?",
-                        "answer": STUB, "topic_name": canonical},
-                    {"question": f"How is {canonical} treated?",
-                        "answer": STUB, "topic_name": canonical},
-                ]
-            else:
-                triples = build_three_qa(
-                    best_doc, canonical_topic=canonical, max_words=120)
-
+    with open(out_path, "w", encoding="utf-8") as out:
+        for canonical, triples in zip(CANON_TOPICS, all_triples):
             # 嚴格只寫 3 筆 & 非空檢查
             wrote = 0
             for it in triples[:3]:
@@ -319,9 +317,9 @@ def main():
                 wrote += 1
 
             logging.info(f"  -> wrote {wrote} QA for '{canonical}'")
-            time.sleep(0.3)
 
     logging.info("=== SUMMARY ===")
+    logging.info(f"Fetch: {fetcher.summary()}")
     logging.info(f"Total topics: {len(CANON_TOPICS)} (expected 35)")
     logging.info(f"Total QA written: {total} (expected 105)")
     logging.info(f"Hard-empty items forced to STUB: {empty_cnt}")
@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import argparse
 import itertools
-import requests, time, json, re, xml.etree.ElementTree as ET
-from urllib.parse import urlencode
+import json, re
 
-API_BASE = "https://wsearch.nlm.nih.gov/ws/query"
+from medline_fetch import add_fetch_args, fetcher_from_args
 
 # === 主題清單（7 + A + B + C）===
 TOPICS = [
@@ -42,15 +42,6 @@ def trim_words(text: str, max_words=120, hard_cap=2000) -> str:
         return text
     return " ".join(toks[:max_words])
 
-def fetch_health_topic(term: str):
-    params = {"db": "healthTopics", "term": term, "rettype": "all"}
-    url = f"{API_BASE}?{urlencode(params)}"
-    r = requests.get(url, timeout=20)
-    r.raise_for_status()
-    root = ET.fromstring(r.text)
-    docs = root.findall(".//document")
-    return docs
-
 def parse_document_contents(doc_elem):
     contents = {}
     for c in doc_elem.findall("./content"):
@@ -186,14 +177,20 @@ def build_qa_for_document(doc_elem, max_words=120):
     return items
 
 def main():
-    out_path = "medline_eval_full.jsonl"
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="medline_eval_full.jsonl")
+    add_fetch_args(ap)
+    args = ap.parse_args()
+    fetcher = fetcher_from_args(args)
+
+    out_path = args.out
     n_total = 0
+    # 所有主題先並行抓取（同時請求數與速率由 fetcher 限制），再依原順序寫出
+    term_docs = fetcher.documents_many(TOPICS)
     with open(out_path, "w", encoding="utf-8") as f:
-        for term in TOPICS:
-            try:
-                docs = fetch_health_topic(term)
-            except Exception as e:
-                print(f"[WARN] fetch '{term}' failed: {e}")
+        for term, docs in zip(TOPICS, term_docs):
+            if isinstance(docs, Exception):
+                print(f"[WARN] fetch '{term}' failed: {docs}")
                 continue
 
             for doc in docs:
@@ -204,8 +201,7 @@ def main():
                     f.write(json.dumps(item, ensure_ascii=False) + "\n")
                     n_total += 1
 
-            time.sleep(0.2)
-
+    print(f"Fetch: {fetcher.summary()}")
     print(f"Done. Wrote {n_total} QA items to {out_path}")
 
 if __name__ == "__main__":
@@ -1,18 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import itertools
-import requests
-import time
 import json
 import re
-import xml.etree.ElementTree as ET
-from urllib.parse import urlencode
 import argparse
 import random
 import hashlib
 
-API_BASE = "https://wsearch.nlm.nih.gov/ws/query"
-
+from medline_fetch import add_fetch_args, fetcher_from_args
 
 def qtype_from_q(q: str) -> str:
     s = (q or "").lower()
@@ -72,16 +67,6 @@ def trim_words(text: str, max_words=120, hard_cap=2000) -> str:
     return " ".join(toks[:max_words])
 
 
-def fetch_health_topic(term: str):
-    params = {"db": "healthTopics", "term": term, "rettype": "all"}
-    url = f"{API_BASE}?{urlencode(params)}"
-    r = requests.get(url, timeout=20)
-    r.raise_for_status()
-    root = ET.fromstring(r.text)
-    docs = root.findall(".//document")
-    return docs
-
-
 def parse_document_contents(doc_elem):
     contents = {}
     for c in doc_elem.findall("./content"):
@@ -233,19 +218,21 @@ def main():
     ap.add_argument("--seed", type=int, default=42)
     ap.add_argument("--per_title_cap", type=int, default=3)   # 同一頁面最多幾條
     ap.add_argument("--per_term_page_cap", type=int, default=10)  # 同一term最多取幾頁
+    add_fetch_args(ap)
     args = ap.parse_args()
     random.seed(args.seed)
+    fetcher = fetcher_from_args(args)
+    # 所有主題先並行抓取（同時請求數與速率由 fetcher 限制），再依原順序處理，抽樣結果與順序無關
+    term_docs = fetcher.documents_many(TOPICS)
 
     out_path = "medline_eval_full.jsonl"
     seen = set()  # 去重用
     n_total = 0
 
     with open(args.out, "w", encoding="utf-8") as f:
-        for term in TOPICS:
-            try:
-                docs = fetch_health_topic(term)
-            except Exception as e:
-                print(f"[WARN] fetch '{term}' failed: {e}")
+        for term, docs in zip(TOPICS, term_docs):
+            if isinstance(docs, Exception):
+                print(f"[WARN] fetch '{term}' failed: {docs}")
                 continue
 
             # 打亂後抽前 K 頁，提升可重現性與可控性
@@ -290,8 +277,7 @@ def main():
                     n_total += 1
                     written_for_this_page += 1
 
-            time.sleep(0.2)
-
+    print(f"Fetch: {fetcher.summary()}")
     print(f"Done. Wrote {n_total} QA items to {args.out}")
 
 
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# medline_fetch.py
+# MedlinePlus 資料集建置腳本共用的抓取層：
+#   - 以 URL hash 為 key 的磁碟快取（medline_cache/ab/<sha256>.json），重建資料集不再重新下載
+#   - 有禮貌的並行：同時請求數上限 + 全域速率限制（NLM 建議每 IP 每分鐘不超過 85 次）
+#   - 429 / 5xx / 連線錯誤以指數退避重試，遵守 Retry-After
+#   - --offline 只讀快取與錄製好的 fixtures 目錄，完全不連網；缺少的 URL 以 CacheMiss 回報
+#   - 給了 parse 時，回應要能解析才寫入快取；解析失敗的快取內容視同未快取
+#
+#   from medline_fetch import add_fetch_args, fetcher_from_args
+#   fetcher = fetcher_from_args(args)
+#   docs = fetcher.documents("asthma")            # wsearch healthTopics 的 <document> 元素
+#   pages = fetcher.fetch_many([search_url(t) for t in terms])
+#
+#   python code/medline_fetch.py stats
+#   python code/medline_fetch.py export fixtures/medline --match asthma
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlencode
+
+import requests
+
+API_BASE = "https://wsearch.nlm.nih.gov/ws/query"
+CACHE_DIR = os.getenv("MEDLINE_CACHE_DIR", "medline_cache")
+MODES = ("online", "refresh", "offline")
+# NLM 的使用規範：每 IP 每分鐘不超過 85 個請求
+DEFAULT_RATE = 85 / 60
+DEFAULT_CONCURRENCY = 2
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+USER_AGENT = "medline-eval-builder/1.0 (+python-requests)"
+
+
+class CacheMiss(LookupError):
+    """Offline mode and the URL is neither cached nor in the fixtures."""
+
+
+def search_url(term: str, db: str = "healthTopics", rettype: str = "all") -> str:
+    return f"{API_BASE}?{urlencode({'db': db, 'term': term, 'rettype': rettype})}"
+
+
+def parse_documents(body: str) -> list:
+    return ET.fromstring(body).findall(".//document")
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _entry_path(root: str, key: str) -> str:
+    return os.path.join(root, key[:2], key + ".json")
+
+
+class RateLimiter:
+    """At most `rate` request starts per second across all threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class MedlineFetcher:
+    """Cached, rate-limited GETs against the MedlinePlus web service.
+
+    mode "online" serves from cache and downloads misses, "refresh" always
+    downloads (and overwrites the cache), "offline" never touches the network.
+    `fixtures` is a read-only directory in the same layout as the cache (for
+    example one written by `export`), consulted after the cache."""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, mode: str = "online", fixtures: str | None = None,
+                 concurrency: int = DEFAULT_CONCURRENCY, rate: float = DEFAULT_RATE,
+                 timeout: float = 30.0, retries: int = 3, backoff: float = 1.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown fetch mode: {mode} (expected one of {MODES})")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.fixtures = fixtures
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._limiter = RateLimiter(rate)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._session = requests.Session()
+        self._session.headers["User-Agent"] = USER_AGENT
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.concurrency)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self.stats = {"cache_hits": 0, "fixture_hits": 0, "downloads": 0, "retries": 0, "misses": 0,
+                      "invalid": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    # ---------- cache ----------
+
+    def _read(self, root: str | None, key: str) -> dict | None:
+        if not root:
+            return None
+        path = _entry_path(root, key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, url: str, body: str) -> None:
+        if not self.cache_dir:
+            return
+        path = _entry_path(self.cache_dir, url_key(url))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                       "body": body}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    # ---------- fetch ----------
+
+    def fetch(self, url: str, parse=None):
+        """Response body of `url`, from cache / fixtures when possible.
+
+        With `parse`, returns `parse(body)` instead; a downloaded body is only
+        cached once it parses, and a cached one that does not parse is ignored
+        (downloaded again unless offline)."""
+        key = url_key(url)
+        if self.mode != "refresh":
+            for root, counter in ((self.cache_dir, "cache_hits"), (self.fixtures, "fixture_hits")):
+                hit = self._read(root, key)
+                if hit is None:
+                    continue
+                try:
+                    value = parse(hit["body"]) if parse else hit["body"]
+                except Exception:
+                    self._count("invalid")
+                    continue
+                self._count(counter)
+                return value
+        if self.mode == "offline":
+            self._count("misses")
+            raise CacheMiss(f"not cached (offline): {url}")
+        body = self._download(url)
+        try:
+            value = parse(body) if parse else body
+        except Exception:
+            self._count("invalid")
+            raise
+        self._write(url, body)
+        return value
+
+    def _download(self, url: str) -> str:
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+            with self._slots:
+                self._limiter.wait()
+                try:
+                    r = self._session.get(url, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.retries:
+                        raise
+                    r = None
+            if r is not None:
+                if r.status_code not in RETRYABLE_STATUS or attempt == self.retries:
+                    r.raise_for_status()
+                    self._count("downloads")
+                    return r.text
+                delay = max(delay, _retry_after(r.headers.get("Retry-After")))
+            self._count("retries")
+            time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    def fetch_many(self, urls: list[str], parse=None) -> list:
+        """Bodies (or `parse(body)`) in input order; a URL that fails to download
+        or to parse yields its exception instead."""
+        def one(url):
+            try:
+                return self.fetch(url, parse)
+            except Exception as e:
+                return e
+
+        return self.map(one, urls)
+
+    def map(self, fn, items) -> list:
+        """fn over items on `concurrency` threads, results in input order."""
+        items = list(items)
+        if self.concurrency <= 1 or len(items) <= 1:
+            return [fn(x) for x in items]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as ex:
+            return list(ex.map(fn, items))
+
+    def documents(self, term: str, db: str = "healthTopics") -> list:
+        """<document> elements of a wsearch query for `term`."""
+        return self.fetch(search_url(term, db), parse_documents)
+
+    def documents_many(self, terms: list[str], db: str = "healthTopics") -> list:
+        """documents() of every term, fetched concurrently; a failed term yields its exception."""
+        return self.fetch_many([search_url(t, db) for t in terms], parse_documents)
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"mode={self.mode} cache_hits={s['cache_hits']} fixture_hits={s['fixture_hits']} "
+                f"downloads={s['downloads']} retries={s['retries']} misses={s['misses']} invalid={s['invalid']}")
+
+
+def _retry_after(value: str | None) -> float:
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def add_fetch_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--cache_dir", default=CACHE_DIR, help="MedlinePlus 回應快取目錄（env MEDLINE_CACHE_DIR）")
+    ap.add_argument("--offline", action="store_true", help="只讀快取 / fixtures，不連網")
+    ap.add_argument("--refresh", action="store_true", help="忽略快取、重新下載並覆寫")
+    ap.add_argument("--fixtures", default="", help="唯讀的錄製回應目錄（與快取相同結構）")
+    ap.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="同時請求數上限")
+    ap.add_argument("--rate", type=float, default=DEFAULT_RATE, help="每秒請求數上限（預設 85/分鐘）")
+
+
+def fetcher_from_args(args) -> MedlineFetcher:
+    if args.offline and args.refresh:
+        raise SystemExit("--offline and --refresh are mutually exclusive")
+    mode = "offline" if args.offline else "refresh" if args.refresh else "online"
+    return MedlineFetcher(cache_dir=args.cache_dir, mode=mode, fixtures=args.fixtures or None,
+                          concurrency=args.concurrency, rate=args.rate)
+
+
+# ============ CLI ============
+
+
+def _entries(root: str):
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(".json"):
+                yield os.path.join(dirpath, name)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="MedlinePlus response cache utilities.")
+    ap.add_argument("--cache_dir", default=CACHE_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="快取中的回應數與大小")
+    p = sub.add_parser("export", help="把快取（可依 URL 子字串篩選）複製成 fixtures 目錄")
+    p.add_argument("dest")
+    p.add_argument("--match", default="", help="只匯出 URL 含此子字串的回應")
+    args = ap.parse_args()
+
+    if not os.path.isdir(args.cache_dir):
+        print(f"[ERR] cache not found: {args.cache_dir}", file=sys.stderr)
+        sys.exit(1)
+    if args.cmd == "stats":
+        paths = list(_entries(args.cache_dir))
+        size = sum(os.path.getsize(p) for p in paths)
+        print(f"{args.cache_dir}: {len(paths)} responses, {size / 1e6:.1f} MB")
+        return
+    n = 0
+    for path in _entries(args.cache_dir):
+        with open(path, "r", encoding="utf-8") as f:
+            url = json.load(f)["url"]
+        if args.match and args.match not in url:
+            continue
+        dst = _entry_path(args.dest, url_key(url))
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copyfile(path, dst)
+        n += 1
+    print(f"Exported {n} responses to {args.dest}")
+
+
+if __name__ == "__main__":
+    main()
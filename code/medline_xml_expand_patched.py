@@ -3,10 +3,11 @@ import random
 import json
 import argparse
 import re
-from collections import defaultdict
+from collections import defaultdict, deque
 from pathlib import Path
 
 # 預設的領域對應關鍵字（可擴充）
+# 關鍵字按原樣比對「轉小寫後的標題」，含大寫字母的關鍵字（HIV、AIDS、COVID）因此不會命中
 DOMAIN_KEYWORDS = {
     "cardiovascular": ["heart", "cardio", "stroke", "blood pressure"],
     "metabolic_endocrine": ["diabetes", "thyroid", "metabolic", "insulin"],
@@ -25,13 +26,64 @@ DOMAIN_KEYWORDS = {
     "immunology_allergy": ["immune", "allergy", "immunodeficiency"],
 }
 
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over every domain's keywords.
+
+    One pass over the text finds every label with a keyword occurring as a
+    substring anywhere in it, including overlapping keywords ("blood pressure"
+    and "blood"), i.e. the same result as `any(k in text for k in keywords)`
+    per label. Labels come back in the order they were given."""
+
+    def __init__(self, label_keywords: dict[str, list[str]]):
+        self.labels = list(label_keywords)
+        goto: list[dict[str, int]] = [{}]
+        out: list[set[int]] = [set()]
+        for li, keywords in enumerate(label_keywords.values()):
+            for kw in keywords:
+                s = 0
+                for ch in kw:
+                    nxt = goto[s].get(ch)
+                    if nxt is None:
+                        goto.append({})
+                        out.append(set())
+                        nxt = goto[s][ch] = len(goto) - 1
+                    s = nxt
+                out[s].add(li)
+        # BFS 建 failure link，並把 failure 狀態的輸出併入
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, t in goto[s].items():
+                f = fail[s]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[t] = goto[f].get(ch, 0)
+                out[t] |= out[fail[t]]
+                queue.append(t)
+        self._goto = goto
+        self._fail = fail
+        self._out = [frozenset(o) for o in out]
+
+    def match(self, text: str) -> list[str]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set(out[0])
+        s = 0
+        for ch in text:
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            if out[s]:
+                found |= out[s]
+        return [self.labels[i] for i in sorted(found)]
+
+
+_MATCHER = KeywordMatcher(DOMAIN_KEYWORDS)
+
+
 def classify_topic(title: str) -> list[str]:
-    title_lower = title.lower()
-    matched = []
-    for domain, keywords in DOMAIN_KEYWORDS.items():
-        if any(k in title_lower for k in keywords):
-            matched.append(domain)
-    return matched
+    return _MATCHER.match(title.lower())
 
 def clean_text(text: str, max_words=120) -> str:
     text = re.sub(r"<[^>]+>", "", text)  # remove HTML tags
@@ -46,6 +98,77 @@ def generate_questions(title: str) -> list[str]:
         f"How is {title} treated?"
     ]
 
+
+def _topic_fields(topic):
+    """(title, raw summary) of a <health-topic>, or None when either is missing."""
+    title_elem = topic.find("title")
+    summary_elem = topic.find("full-summary")
+    if title_elem is None or summary_elem is None:
+        return None
+    return (title_elem.text or "").strip(), summary_elem.text or ""
+
+
+def iter_topics(xml_path: str):
+    """Loads the whole XML and yields (title, raw summary) of each top-level <health-topic>."""
+    root = ET.parse(xml_path).getroot()
+    topics = root.findall("health-topic")
+    print("[INFO] Parsed topics:", len(topics))
+    for topic in topics:
+        fields = _topic_fields(topic)
+        if fields:
+            yield fields
+
+
+def iter_topics_stream(xml_path: str):
+    """Same as iter_topics with iterparse: each <health-topic> is cleared once read,
+    so memory does not grow with the size of the XML."""
+    depth = 0
+    root = None
+    n = 0
+    for event, elem in ET.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        # 只處理 root 的直接子元素（與 root.findall("health-topic") 相同）
+        if depth != 1 or elem.tag != "health-topic":
+            continue
+        n += 1
+        fields = _topic_fields(elem)
+        elem.clear()
+        root.clear()
+        if fields:
+            yield fields
+    print("[INFO] Streamed topics:", n)
+
+
+class Reservoir:
+    """Uniform sample of up to k items from a stream of unknown length (Algorithm R)."""
+
+    def __init__(self, k: int, rng: random.Random):
+        self.k = k
+        self.rng = rng
+        self.seen = 0
+        self.items = []
+
+    def add(self, item) -> None:
+        self.seen += 1
+        if len(self.items) < self.k:
+            self.items.append(item)
+            return
+        j = self.rng.randrange(self.seen)
+        if j < self.k:
+            self.items[j] = item
+
+    def sample(self) -> list:
+        # 與 random.sample 一樣回傳隨機順序
+        out = list(self.items)
+        self.rng.shuffle(out)
+        return out
+
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--xml", required=True)
@@ -54,6 +177,9 @@ def parse_args():
     parser.add_argument("--per_topic", type=int, default=3)
     parser.add_argument("--max_words", type=int, default=120)
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stream", action="store_true",
+                        help="iterparse + 每個 domain 以 reservoir 抽樣，記憶體不隨 XML 大小成長"
+                             "（同一 seed 抽到的 topic 與預設模式不同）")
     return parser.parse_args()
 
 def main():
@@ -62,47 +188,54 @@ def main():
     output_file = Path(args.out)
     output_file.parent.mkdir(parents=True, exist_ok=True)
 
-    # 解析 XML
-    print("[INFO] Loading XML:", args.xml)
-    tree = ET.parse(args.xml)
-    root = tree.getroot()
-    topics = root.findall("health-topic")
-    print("[INFO] Parsed topics:", len(topics))
-
     # 處理目標 domains
     target_domains = {}
     for item in args.domains.split(","):
         k, v = item.split("=")
         target_domains[k.strip()] = int(v.strip())
 
-    domain_topics = defaultdict(list)
+    # 解析 XML；只保留屬於目標 domain 的 topic
+    print("[INFO] Loading XML:", args.xml, "(streaming)" if args.stream else "")
+    if args.stream:
+        rng = random.Random(args.seed)
+        pools = {d: Reservoir(k, rng) for d, k in target_domains.items()}
+        topics = iter_topics_stream(args.xml)
+    else:
+        pools = defaultdict(list)
+        topics = iter_topics(args.xml)
 
-    for topic in topics:
-        title_elem = topic.find("title")
-        summary_elem = topic.find("full-summary")
-        if title_elem is None or summary_elem is None:
+    for title, raw_summary in topics:
+        if not title:
+            continue
+        domains = [d for d in classify_topic(title) if d in target_domains]
+        if not domains:
             continue
-        title = title_elem.text.strip()
-        summary = clean_text(summary_elem.text or "", args.max_words)
-        if not title or not summary:
+        summary = clean_text(raw_summary, args.max_words)
+        if not summary:
             continue
-        domains = classify_topic(title)
         for d in domains:
-            domain_topics[d].append((title, summary))
+            if args.stream:
+                pools[d].add((title, summary))
+            else:
+                pools[d].append((title, summary))
 
     # 分類統計
     print("[INFO] Domain candidate counts:")
     for domain in target_domains:
-        print(f"  - {domain}: {len(domain_topics[domain])} candidates")
+        n = pools[domain].seen if args.stream else len(pools[domain])
+        print(f"  - {domain}: {n} candidates")
 
     # 隨機選擇每個領域的代表 topic
     qa_items = []
     for domain, num_required in target_domains.items():
-        pool = domain_topics[domain]
-        if not pool:
+        if args.stream:
+            selected = pools[domain].sample()
+        else:
+            pool = pools[domain]
+            selected = random.sample(pool, min(len(pool), num_required)) if pool else []
+        if not selected:
             print(f"[WARN] domain '{domain}' has 0 candidates")
             continue
-        selected = random.sample(pool, min(len(pool), num_required))
         for title, summary in selected:
             questions = generate_questions(title)
             for q in questions[:args.per_topic]:
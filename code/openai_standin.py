@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# openai_standin.py
+# 本機 OpenAI 相容 stand-in（POST /v1/chat/completions），用來測試 judge_eval.py 的並行、限速、重試與續跑，
+# 不花 API 費用。verdict 由 MODEL ANSWER 與 REFERENCE ANSWER 的字詞重疊決定（固定、可重現）。
+#
+#   python openai_standin.py --port 8900 --latency_ms 200 --fail_rate 0.1
+#   python judge_eval.py --input gold.jsonl --answers answers.jsonl --out judge.jsonl \
+#       --base_url http://127.0.0.1:8900/v1
+#
+# --fail_rate 比例的請求回 429（帶 Retry-After）或 500；--max_inflight 超過時回 429，可觀察並行上限。
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_SECTION = re.compile(r"MODEL ANSWER:\s*(.*?)\s*REFERENCE ANSWER:\s*(.*)\Z", re.S)
+
+
+def fake_verdict(prompt: str) -> dict:
+    m = _SECTION.search(prompt)
+    if not m:
+        return {"score": 3, "justification": "stand-in: no answer sections found"}
+    pred, ref = (set(re.findall(r"[a-z0-9]+", part.lower())) for part in m.groups())
+    overlap = len(pred & ref) / max(1, len(ref))
+    return {"score": 1 + min(4, int(overlap * 5)), "justification": f"stand-in overlap {overlap:.2f}"}
+
+
+class StandinState:
+    def __init__(self, latency_ms: float, fail_rate: float, max_inflight: int, seed: int):
+        self.latency_s = latency_ms / 1000.0
+        self.fail_rate = fail_rate
+        self.max_inflight = max_inflight
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "500": 0, "peak_inflight": 0}
+
+
+def make_handler(state: StandinState):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, body: dict, headers: dict | None = None):
+            raw = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with state.lock:
+                    self._send(200, dict(state.stats))
+                return
+            self._send(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            with state.lock:
+                state.stats["requests"] += 1
+                state.inflight += 1
+                state.stats["peak_inflight"] = max(state.stats["peak_inflight"], state.inflight)
+                over = state.max_inflight and state.inflight > state.max_inflight
+                roll = state.rng.random()
+            try:
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "not found"}})
+                    return
+                time.sleep(state.latency_s)
+                if over or roll < state.fail_rate / 2:
+                    with state.lock:
+                        state.stats["429"] += 1
+                    self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                               {"Retry-After": "0.05"})
+                    return
+                if roll < state.fail_rate:
+                    with state.lock:
+                        state.stats["500"] += 1
+                    self._send(500, {"error": {"message": "stand-in failure", "type": "server_error"}})
+                    return
+                prompt = (body.get("messages") or [{}])[-1].get("content", "")
+                with state.lock:
+                    state.stats["ok"] += 1
+                self._send(200, {
+                    "id": f"chatcmpl-standin-{state.stats['requests']}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stand-in"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": json.dumps(fake_verdict(prompt))},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": 16,
+                              "total_tokens": len(prompt.split()) + 16},
+                })
+            finally:
+                with state.lock:
+                    state.inflight -= 1
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8900, latency_ms: float = 0.0, fail_rate: float = 0.0,
+          max_inflight: int = 0, seed: int = 0) -> tuple[ThreadingHTTPServer, StandinState]:
+    """Starts the stand-in in a daemon thread; returns (server, state). Port 0 picks a free port."""
+    state = StandinState(latency_ms, fail_rate, max_inflight, seed)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local OpenAI-compatible chat completions stand-in.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--latency_ms", type=float, default=0.0)
+    ap.add_argument("--fail_rate", type=float, default=0.0, help="fraction of requests answered with 429 / 500")
+    ap.add_argument("--max_inflight", type=int, default=0, help="answer 429 above this many concurrent requests")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    server, state = serve(args.host, args.port, args.latency_ms, args.fail_rate, args.max_inflight, args.seed)
+    print(f"stand-in on http://{args.host}:{server.server_address[1]}/v1 (GET /v1/stats for counters)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(state.stats)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
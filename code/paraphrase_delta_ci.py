@@ -1,6 +1,8 @@
 # paraphrase_delta_ci.py
+import argparse
 import pandas as pd
-import numpy as np
+
+from bootstrap_stats import CI_METHODS, N_BOOT, run_many
 
 
 R1_ORIG = "res105_v5c_rouge1_fix_b.csv"
@@ -9,25 +11,32 @@ R1_PARA = "res105_v5c_paraphrase_rouge1.csv"
 RL_PARA = "res105_v5c_paraphrase_rougel.csv"
 
 
-def delta_ci(orig_csv, para_csv, n_boot=2000, seed=0):
-    a = pd.read_csv(orig_csv)["f1"].values
-    b = pd.read_csv(para_csv)["f1"].values
+def delta_job(orig_csv, para_csv, strata_col=None):
+    a = pd.read_csv(orig_csv)
+    b = pd.read_csv(para_csv)
     assert len(a) == len(b), "length mismatch"
-    d = b - a
-    rng = np.random.default_rng(seed)
-    boot = []
-    n = len(d)
-    for _ in range(n_boot):
-        idx = rng.integers(0, n, n)
-        boot.append(d[idx].mean())
-    lo, hi = np.percentile(boot, [2.5, 97.5])
-    return float(d.mean()), float(lo), float(hi)
-
-
-for metric, (orig, para) in {
-    "ROUGE-1": (R1_ORIG, R1_PARA),
-    "ROUGE-L": (RL_ORIG, RL_PARA),
-}.items():
-    mean, lo, hi = delta_ci(orig, para, seed=42)
-    print(
-        f"{metric}  ΔF1 (paraphrase - original) = {mean:.4f}   95% CI [{lo:.4f}, {hi:.4f}]")
+    job = {"a": a["f1"], "b": b["f1"], "seed": 42}
+    if strata_col:
+        job["strata"] = a[strata_col].fillna("").astype(str).values
+    return job
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Paired bootstrap CI of ΔF1 (paraphrase - original).")
+    ap.add_argument("--n_boot", type=int, default=N_BOOT)
+    ap.add_argument("--ci", choices=CI_METHODS, default="percentile")
+    ap.add_argument("--strata", default="", help="分層抽樣欄位，例如 qtype")
+    ap.add_argument("--workers", type=int, default=1)
+    args = ap.parse_args()
+
+    metrics = {"ROUGE-1": (R1_ORIG, R1_PARA), "ROUGE-L": (RL_ORIG, RL_PARA)}
+    jobs = [delta_job(orig, para, args.strata) for orig, para in metrics.values()]
+    results = run_many(jobs, n_boot=args.n_boot, ci=args.ci, workers=args.workers)
+    for metric, res in zip(metrics, results):
+        r = res.rows()[0]
+        print(
+            f"{metric}  ΔF1 (paraphrase - original) = {r['mean']:.4f}   95% CI [{r['ci_lo']:.4f}, {r['ci_hi']:.4f}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# predictions_store.py
+# 共用的模型答案庫：生成端（batch_eval_client / evaluate_bertscore）每題只呼叫 API 一次並寫入，
+# 計分端（scoring.py / evaluate_bertscore / judge_eval）直接讀取，重跑指標不再呼叫伺服器。
+#
+# 目錄結構：
+#   <root>/predictions.jsonl   append-only，每行一筆完整紀錄（含原始 API 回應），為唯一事實來源
+#   <root>/index.parquet       欄式索引（不含原始回應）；需要 pyarrow，缺少時每次開啟改掃描 JSONL
+#
+# key = sha256(question, endpoint, params, server build)；server build 取自 API 的 X-Server-Build header，
+# 程式碼、prompt 或模型改變時 build 改變，舊答案不會被誤用。
+#
+#   python predictions_store.py predictions_store            # 摘要
+#   python predictions_store.py predictions_store --export res105.csv --endpoint /query
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+BUILD_HEADER = "X-Server-Build"
+UNKNOWN_BUILD = "unknown"
+INDEX_COLUMNS = ["key", "query_key", "question", "endpoint", "params", "build",
+                 "answer", "latency_s", "created_at", "offset"]
+
+
+def _canonical_params(params: dict | None) -> str:
+    params = {k: v for k, v in (params or {}).items() if k != "question" and v is not None}
+    return json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def query_key(question: str, endpoint: str, params: dict | None = None) -> str:
+    raw = json.dumps([question.strip(), endpoint, _canonical_params(params)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def prediction_key(question: str, endpoint: str, params: dict | None, build: str) -> str:
+    raw = query_key(question, endpoint, params) + "|" + (build or UNKNOWN_BUILD)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def top_answer(payload) -> str:
+    """results[0].answer of a /query, /llm_only or /demo/search response."""
+    if isinstance(payload, dict):
+        results = payload.get("results") or []
+        if results and isinstance(results[0], dict):
+            return (results[0].get("answer") or "").strip()
+        answers = payload.get("answers")
+        if isinstance(answers, dict):
+            return (answers.get("a_text") or "").strip()
+    return ""
+
+
+class PredictionsStore:
+    """Append-only JSONL of API responses with a Parquet index (see module header).
+
+    One writer process per store; readers may run at the same time."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.jsonl_path = os.path.join(root, "predictions.jsonl")
+        self.index_path = os.path.join(root, "index.parquet")
+        self._index: dict[str, dict] = {}
+        self._latest: dict[str, str] = {}
+        self._dirty = False
+        self._load()
+
+    # ---- index ----
+
+    def _add(self, row: dict) -> None:
+        self._index[row["key"]] = row
+        prev = self._latest.get(row["query_key"])
+        if prev is None or self._index[prev]["created_at"] <= row["created_at"]:
+            self._latest[row["query_key"]] = row["key"]
+
+    @staticmethod
+    def _index_row(rec: dict, offset: int) -> dict:
+        return {
+            "key": rec["key"], "query_key": rec["query_key"], "question": rec["question"],
+            "endpoint": rec["endpoint"], "params": rec["params"], "build": rec["build"],
+            "answer": rec.get("answer", ""), "latency_s": rec.get("latency_s"),
+            "created_at": rec["created_at"], "offset": offset,
+        }
+
+    def _load(self) -> None:
+        size = os.path.getsize(self.jsonl_path) if os.path.exists(self.jsonl_path) else 0
+        start = 0
+        indexed = self._read_index()
+        if indexed is not None:
+            rows, start = indexed
+            if start > size:
+                # JSONL 被換掉或截斷：索引作廢，整份重掃
+                rows, start = [], 0
+            for row in rows:
+                self._add(row)
+        if start < size:
+            self._scan(start)
+            self._dirty = True
+
+    def _read_index(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            return None
+        if not os.path.exists(self.index_path):
+            return None
+        table = pq.read_table(self.index_path)
+        meta = table.schema.metadata or {}
+        indexed_bytes = int(meta.get(b"jsonl_bytes", b"0"))
+        return table.to_pylist(), indexed_bytes
+
+    def _scan(self, start: int) -> None:
+        with open(self.jsonl_path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if line.endswith(b"\n") and line.strip():
+                    self._add(self._index_row(json.loads(line), offset))
+                offset += len(line)
+
+    def flush(self) -> None:
+        """Rewrites index.parquet if records were added since it was written."""
+        if not self._dirty:
+            return
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            return
+        rows = sorted(self._index.values(), key=lambda r: r["offset"])
+        table = pa.Table.from_pylist(rows, schema=pa.schema([
+            ("key", pa.string()), ("query_key", pa.string()), ("question", pa.string()),
+            ("endpoint", pa.string()), ("params", pa.string()), ("build", pa.string()),
+            ("answer", pa.string()), ("latency_s", pa.float64()), ("created_at", pa.float64()),
+            ("offset", pa.int64()),
+        ]))
+        size = os.path.getsize(self.jsonl_path) if os.path.exists(self.jsonl_path) else 0
+        table = table.replace_schema_metadata({"jsonl_bytes": str(size)})
+        tmp = self.index_path + ".tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, self.index_path)
+        self._dirty = False
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._index)
+
+    # ---- read / write ----
+
+    def get(self, question: str, endpoint: str, params: dict | None = None, build: str | None = None,
+            full: bool = False) -> dict | None:
+        """Stored prediction for this build; build=None returns the newest one of any build.
+
+        With full=True the JSONL record (including the raw `response`) is returned."""
+        if build is None:
+            key = self._latest.get(query_key(question, endpoint, params))
+        else:
+            key = prediction_key(question, endpoint, params, build)
+        row = self._index.get(key) if key else None
+        if row is None or not full:
+            return row
+        return self.read_record(row["offset"])
+
+    def read_record(self, offset: int) -> dict:
+        with open(self.jsonl_path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def put(self, question: str, endpoint: str, params: dict | None, build: str, response,
+            latency_s: float | None = None) -> dict:
+        build = build or UNKNOWN_BUILD
+        rec = {
+            "key": prediction_key(question, endpoint, params, build),
+            "query_key": query_key(question, endpoint, params),
+            "question": question.strip(),
+            "endpoint": endpoint,
+            "params": _canonical_params(params),
+            "build": build,
+            "answer": top_answer(response),
+            "latency_s": latency_s,
+            "created_at": time.time(),
+            "response": response,
+        }
+        line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.jsonl_path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        self._add(self._index_row(rec, offset))
+        self._dirty = True
+        return rec
+
+    def frame(self, endpoint: str | None = None, build: str | None = None, latest: bool = True):
+        """Index as a pandas DataFrame (optionally one endpoint / build; newest per query by default)."""
+        import pandas as pd
+
+        rows = list(self._index.values())
+        if latest and build is None:
+            rows = [self._index[k] for k in self._latest.values()]
+        df = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+        if endpoint:
+            df = df[df["endpoint"] == endpoint]
+        if build:
+            df = df[df["build"] == build]
+        return df.sort_values("offset").reset_index(drop=True)
+
+
+# ============ 生成端共用 ============
+
+
+def probe_build(base_url: str, timeout: float = 10.0, api_key: str | None = None) -> str:
+    """Server build id from the X-Server-Build header of GET /health ("unknown" if absent)."""
+    headers = {"X-API-KEY": api_key} if api_key else None
+    r = requests.get(base_url.rstrip("/") + "/health", headers=headers, timeout=timeout)
+    r.raise_for_status()
+    return r.headers.get(BUILD_HEADER) or UNKNOWN_BUILD
+
+
+def fetch(store: PredictionsStore | None, base_url: str, endpoint: str, question: str,
+          params: dict | None = None, build: str | None = None, timeout: float = 60.0,
+          api_key: str | None = None, offline: bool = False, refresh: bool = False):
+    """Returns (response, latency_s, from_store).
+
+    Uses the stored response for (question, endpoint, params, build) when there
+    is one; otherwise calls the API and stores the answer. offline=True never
+    calls the API (build=None then means the newest stored build); a missing
+    prediction raises KeyError. Failed calls are not stored."""
+    if store is not None and not refresh:
+        rec = store.get(question, endpoint, params, build, full=True)
+        if rec is not None:
+            return rec["response"], rec.get("latency_s") or 0.0, True
+    if offline:
+        raise KeyError(f"no stored prediction for {endpoint} {question!r}")
+    headers = {"X-API-KEY": api_key} if api_key else None
+    t0 = time.time()
+    r = requests.get(base_url.rstrip("/") + endpoint, params={"question": question, **(params or {})},
+                     headers=headers, timeout=timeout)
+    latency = time.time() - t0
+    r.raise_for_status()
+    data = r.json()
+    if store is not None:
+        store.put(question, endpoint, params, r.headers.get(BUILD_HEADER) or build or UNKNOWN_BUILD,
+                  data, latency)
+    return data, latency, False
+
+
+def add_store_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--store", default=os.getenv("PREDICTIONS_STORE", "predictions_store"),
+                    help="predictions store directory ('' = do not store)")
+    ap.add_argument("--offline", action="store_true",
+                    help="only read the store, never call the API")
+    ap.add_argument("--build", default=None,
+                    help="server build to read (default: the server's current build; offline: newest)")
+    ap.add_argument("--refresh", action="store_true", help="re-query the API even if stored")
+
+
+def open_store(args, base_url: str, api_key: str | None = None):
+    """(store, build) for a generator's parsed args (see add_store_args)."""
+    store = PredictionsStore(args.store) if args.store else None
+    build = args.build
+    if build is None and not args.offline:
+        try:
+            build = probe_build(base_url, api_key=api_key)
+        except requests.RequestException as e:
+            print(f"[WARN] could not read server build ({e}); using '{UNKNOWN_BUILD}'")
+            build = UNKNOWN_BUILD
+    return store, build
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or export a predictions store.")
+    ap.add_argument("root")
+    ap.add_argument("--endpoint", default=None)
+    ap.add_argument("--build", default=None)
+    ap.add_argument("--export", default="", help="write question/answer rows (newest per query) to CSV")
+    args = ap.parse_args()
+
+    with PredictionsStore(args.root) as store:
+        df = store.frame(endpoint=args.endpoint, build=args.build, latest=args.build is None)
+        print(f"{len(store)} predictions; {len(df)} selected")
+        if len(df):
+            print(df.groupby(["endpoint", "build"]).size().to_string())
+        if args.export:
+            df[["question", "answer", "endpoint", "params", "build", "latency_s"]].to_csv(
+                args.export, index=False, encoding="utf-8")
+            print("Saved:", args.export)
+
+
+if __name__ == "__main__":
+    main()
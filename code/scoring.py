@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# scoring.py
+# 整批計算 ROUGE-1 / ROUGE-L / BLEU-4：每筆 prediction / reference 只 tokenize 一次，
+# 所有指標以 NumPy 對整個資料集向量化計算；可離線重算已存的結果 CSV，不需再呼叫 API。
+#
+#   python scoring.py res105_llm_only.csv --out res105_llm_only_scored.csv
+#   python scoring.py res105_llm_only.csv --metric rouge1 --out res105_llm_only_rouge1.csv
+#
+# 數值與 batch_eval_client.py 原本的逐筆實作一致（相同 tokenizer、BLEU 平滑與 brevity penalty）。
+import argparse
+import re
+
+import numpy as np
+
+METRICS = ("rouge1", "rougeL", "bleu4")
+BLEU_EPS = 1e-9
+# LCS 每批的 pair 數：依 reference 長度排序後分批，減少 padding
+LCS_CHUNK = 256
+
+_NON_ALNUM = re.compile(r"[^a-z0-9\s]")
+
+
+def tokenize(text: str):
+    text = (text or "").lower()
+    text = _NON_ALNUM.sub(" ", text)
+    return [t for t in text.split() if t]
+
+
+class Encoded:
+    """Token ids of many texts in one flat int64 array; text k is ids[offsets[k]:offsets[k+1]]."""
+
+    def __init__(self, ids: np.ndarray, offsets: np.ndarray):
+        self.ids = ids
+        self.offsets = offsets
+        self.lengths = np.diff(offsets)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def doc(self, k: int) -> np.ndarray:
+        return self.ids[self.offsets[k]:self.offsets[k + 1]]
+
+
+def encode(texts, vocab: dict) -> Encoded:
+    """Tokenizes each text once and maps tokens to ids shared through `vocab`."""
+    ids, offsets = [], [0]
+    for text in texts:
+        toks = tokenize(text)
+        ids.extend(vocab.setdefault(t, len(vocab)) for t in toks)
+        offsets.append(len(ids))
+    return Encoded(np.asarray(ids, dtype=np.int64), np.asarray(offsets, dtype=np.int64))
+
+
+# ============ n-gram overlap（ROUGE-1 與 BLEU 的 clipped precision） ============
+
+
+def _ngram_codes(enc: Encoded, n: int, vocab_size: int, prev: np.ndarray | None):
+    """Dense codes of every n-gram that stays inside one text, plus its text index.
+
+    n-gram codes are built from the (n-1)-gram codes so they never overflow:
+    code_n = rank(code_{n-1}[i] * V + id[i+n-1])."""
+    starts = np.arange(len(enc.ids), dtype=np.int64)
+    doc = np.repeat(np.arange(len(enc), dtype=np.int64), enc.lengths)
+    valid = starts + n <= np.repeat(enc.offsets[1:], enc.lengths)
+    if n == 1:
+        codes = enc.ids.copy()
+    else:
+        codes = np.full(len(enc.ids), -1, dtype=np.int64)
+        ok = np.flatnonzero(valid & (prev >= 0))
+        if len(ok):
+            _, codes[ok] = np.unique(prev[ok] * vocab_size + enc.ids[ok + n - 1], return_inverse=True)
+    return codes, doc, valid
+
+
+def _pair_counts(doc: np.ndarray, codes: np.ndarray, n_codes: int):
+    keys, counts = np.unique(doc * n_codes + codes, return_counts=True)
+    return keys, counts
+
+
+def clipped_overlaps(pred: Encoded, ref: Encoded, vocab_size: int, max_n: int = 4):
+    """For n = 1..max_n: (overlap, pred_total) per pair, where overlap is the sum
+    over distinct n-grams of min(count in pred, count in ref)."""
+    out = []
+    both = Encoded(np.concatenate([pred.ids, ref.ids]),
+                   np.concatenate([pred.offsets, pred.offsets[-1] + ref.offsets[1:]]))
+    n_pairs = len(pred)
+    is_pred = np.arange(len(both)) < n_pairs
+    prev = None
+    for n in range(1, max_n + 1):
+        codes, doc, valid = _ngram_codes(both, n, vocab_size, prev)
+        prev = codes
+        n_codes = max(int(codes.max()) + 1 if len(codes) else 1, 1)
+        sel = valid & (codes >= 0)
+        from_pred = is_pred[doc]
+        pair = np.where(from_pred, doc, doc - n_pairs)
+        p_keys, p_counts = _pair_counts(pair[sel & from_pred], codes[sel & from_pred], n_codes)
+        r_keys, r_counts = _pair_counts(pair[sel & ~from_pred], codes[sel & ~from_pred], n_codes)
+        r_match = np.zeros(len(p_keys), dtype=np.int64)
+        if len(r_keys):
+            pos = np.minimum(np.searchsorted(r_keys, p_keys), len(r_keys) - 1)
+            hit = r_keys[pos] == p_keys
+            r_match[hit] = r_counts[pos[hit]]
+        clipped = np.minimum(p_counts, r_match)
+        p_pair = p_keys // n_codes
+        overlap = np.bincount(p_pair, weights=clipped, minlength=n_pairs)
+        total = np.bincount(p_pair, weights=p_counts, minlength=n_pairs)
+        out.append((overlap, total))
+    return out
+
+
+# ============ LCS（整批 prefix-max DP） ============
+
+
+def lcs_lengths(pred: Encoded, ref: Encoded, chunk: int = LCS_CHUNK) -> np.ndarray:
+    """LCS length of every (pred[k], ref[k]) pair.
+
+    Row i of the DP for all pairs of a chunk at once: with
+    cand[j] = max(dp[j], dp[j-1] + (a_i == b_j)), the new row is the running
+    maximum of cand (rows are non-decreasing in j), so each step is a few
+    array operations instead of an O(m) Python loop."""
+    n_pairs = len(pred)
+    out = np.zeros(n_pairs, dtype=np.int64)
+    order = np.argsort(ref.lengths, kind="stable")
+    for start in range(0, n_pairs, chunk):
+        idx = order[start:start + chunk]
+        idx = idx[(pred.lengths[idx] > 0) & (ref.lengths[idx] > 0)]
+        if not len(idx):
+            continue
+        n_max, m_max = int(pred.lengths[idx].max()), int(ref.lengths[idx].max())
+        # padding：pred 補 -1、ref 補 -2，永不相等，不影響 DP
+        a = np.full((len(idx), n_max), -1, dtype=np.int64)
+        b = np.full((len(idx), m_max), -2, dtype=np.int64)
+        for row, k in enumerate(idx):
+            a[row, :pred.lengths[k]] = pred.doc(k)
+            b[row, :ref.lengths[k]] = ref.doc(k)
+        dp = np.zeros((len(idx), m_max + 1), dtype=np.int32)
+        cand = np.empty_like(dp)
+        cand[:, 0] = 0
+        for i in range(n_max):
+            match = b == a[:, i:i + 1]
+            np.maximum(dp[:, 1:], dp[:, :-1] + match, out=cand[:, 1:])
+            np.maximum.accumulate(cand, axis=1, out=dp)
+        out[idx] = dp[np.arange(len(idx)), ref.lengths[idx]]
+    return out
+
+
+# ============ 整批計分 ============
+
+
+def _prf(hits: np.ndarray, pred_len: np.ndarray, ref_len: np.ndarray):
+    ok = (pred_len > 0) & (ref_len > 0)
+    prec = np.divide(hits, pred_len, out=np.zeros(len(hits)), where=ok)
+    rec = np.divide(hits, ref_len, out=np.zeros(len(hits)), where=ok)
+    s = prec + rec
+    f1 = np.divide(2 * prec * rec, s, out=np.zeros(len(hits)), where=s > 0)
+    return prec, rec, f1
+
+
+def score_all(preds, golds, metrics=METRICS) -> dict:
+    """Scores every (pred, gold) pair; returns {column: np.ndarray}.
+
+    Columns: rouge1_{p,r,f1}, rougeL_{p,r,f1}, bleu4 (only the requested metrics)."""
+    if len(preds) != len(golds):
+        raise ValueError(f"Length mismatch: {len(preds)} predictions vs {len(golds)} references")
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {sorted(unknown)}")
+    vocab: dict = {}
+    pred, ref = encode(preds, vocab), encode(golds, vocab)
+    p_len, r_len = pred.lengths.astype(float), ref.lengths.astype(float)
+    out = {}
+    if "rouge1" in metrics or "bleu4" in metrics:
+        overlaps = clipped_overlaps(pred, ref, max(len(vocab), 1), max_n=4 if "bleu4" in metrics else 1)
+    if "rouge1" in metrics:
+        out["rouge1_p"], out["rouge1_r"], out["rouge1_f1"] = _prf(overlaps[0][0], p_len, r_len)
+    if "rougeL" in metrics:
+        out["rougeL_p"], out["rougeL_r"], out["rougeL_f1"] = _prf(lcs_lengths(pred, ref).astype(float), p_len, r_len)
+    if "bleu4" in metrics:
+        log_p = np.zeros(len(pred))
+        for overlap, total in overlaps:
+            p_n = np.divide(overlap, total, out=np.zeros(len(pred)), where=total > 0)
+            log_p += np.log(np.maximum(p_n, BLEU_EPS))
+        bp = np.where(p_len > r_len, 1.0, np.exp(1 - r_len / np.maximum(p_len, 1)))
+        out["bleu4"] = np.where((p_len > 0) & (r_len > 0), bp * np.exp(log_p / 4.0), 0.0)
+    return out
+
+
+def metric_triplet(scores: dict, metric: str):
+    """(f1, precision, recall) columns of one metric in batch_eval_client's CSV layout."""
+    if metric == "bleu4":
+        # BLEU 放在 f1 欄；precision / recall 僅作佔位（0）
+        zeros = np.zeros(len(scores["bleu4"]))
+        return scores["bleu4"], zeros, zeros
+    return scores[f"{metric}_f1"], scores[f"{metric}_p"], scores[f"{metric}_r"]
+
+
+# ============ 逐筆版本（相容舊呼叫方式） ============
+
+
+def rouge1(pred: str, gold: str):
+    s = score_all([pred], [gold], ("rouge1",))
+    return float(s["rouge1_p"][0]), float(s["rouge1_r"][0]), float(s["rouge1_f1"][0])
+
+
+def rougeL(pred: str, gold: str):
+    s = score_all([pred], [gold], ("rougeL",))
+    return float(s["rougeL_p"][0]), float(s["rougeL_r"][0]), float(s["rougeL_f1"][0])
+
+
+def bleu4(pred: str, gold: str):
+    return float(score_all([pred], [gold], ("bleu4",))["bleu4"][0])
+
+
+# ============ 離線重算 ============
+
+
+def rescore_csv(path: str, out: str, metric: str | None = None,
+                pred_col: str = "pred_answer", gold_col: str = "gold_answer") -> dict:
+    """Adds every metric column to a results CSV; with `metric`, also rewrites
+    f1 / precision / recall for that metric. Returns the dataset means."""
+    import pandas as pd
+
+    df = pd.read_csv(path, keep_default_na=False)
+    scores = score_all(df[pred_col].astype(str).tolist(), df[gold_col].astype(str).tolist())
+    for col, values in scores.items():
+        df[col] = values
+    if metric:
+        df["f1"], df["precision"], df["recall"] = metric_triplet(scores, metric)
+    df.to_csv(out, index=False, encoding="utf-8")
+    valid = df[df["error"].astype(str) == ""] if "error" in df.columns else df
+    return {col: float(valid[col].mean()) if len(valid) else float("nan") for col in scores}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline ROUGE-1 / ROUGE-L / BLEU-4 rescoring of saved results CSVs.")
+    ap.add_argument("inputs", nargs="+", help="results CSV(s) from batch_eval_client.py")
+    ap.add_argument("--out", default="", help="output CSV (single input); default <input>_scored.csv")
+    ap.add_argument("--metric", choices=METRICS, default=None,
+                    help="also rewrite the f1/precision/recall columns with this metric")
+    ap.add_argument("--pred_col", default="pred_answer")
+    ap.add_argument("--gold_col", default="gold_answer")
+    args = ap.parse_args()
+    if args.out and len(args.inputs) > 1:
+        ap.error("--out only applies to a single input")
+
+    for path in args.inputs:
+        out = args.out or re.sub(r"\.csv$", "", path) + "_scored.csv"
+        means = rescore_csv(path, out, args.metric, args.pred_col, args.gold_col)
+        print(f"{path} -> {out}")
+        print("  " + "  ".join(f"{k}={v:.4f}" for k, v in means.items()))
+
+
+if __name__ == "__main__":
+    main()
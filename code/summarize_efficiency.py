@@ -1,37 +1,26 @@
 # summarize_efficiency.py
 import pandas as pd
-from pathlib import Path
 
-FILES = [
-    "res105_llm_only_latency.csv",
-    "res105_v5c_latency.csv",
-    "res969_llm_only_latency.csv",
-    "res969_v5c_latency.csv",
-]
+from eval_analytics import DEFAULT_RUNS, EvalStore, ingest_defaults, latency_summary
 
-
-def brief(path: str) -> dict:
-    p = Path(path)
-    if not p.exists():
-        return {"file": path, "n": 0, "latency_mean": None, "latency_p95": None, "ans_len_mean": None}
-    df = pd.read_csv(p)
-    latency_mean = round(df["latency_sec"].mean(),
-                         3) if "latency_sec" in df.columns else None
-    latency_p95 = round(df["latency_sec"].quantile(
-        0.95), 3) if "latency_sec" in df.columns else None
-    ans_len_mean = round(df["answer_len"].mean(),
-                         1) if "answer_len" in df.columns else None
-    return {
-        "file": path,
-        "n": len(df),
-        "latency_mean": latency_mean,
-        "latency_p95": latency_p95,
-        "ans_len_mean": ans_len_mean,
-    }
+# latency run（檔名見 eval_analytics.DEFAULT_RUNS）
+RUNS = [run_id for run_id, *_, metric in DEFAULT_RUNS if metric == "latency"]
+FILES = {run_id: fname for run_id, fname, *_ in DEFAULT_RUNS}
 
 
 def main():
-    rows = [brief(f) for f in FILES]
+    store = EvalStore()
+    ingest_defaults(store)
+    present = [r for r in RUNS if r in store.catalog]
+    summary = latency_summary(store.select(present), store.catalog) if present else pd.DataFrame()
+    rows = []
+    for run_id in RUNS:
+        if run_id in present:
+            row = summary[summary["run"] == run_id].iloc[0].to_dict()
+            rows.append({k: row[k] for k in ("n", "latency_mean", "latency_p95", "ans_len_mean")})
+        else:
+            rows.append({"n": 0, "latency_mean": None, "latency_p95": None, "ans_len_mean": None})
+        rows[-1] = {"file": FILES[run_id], **rows[-1]}
     out = pd.DataFrame(rows)
     print(out.to_string(index=False))
     out.to_csv("efficiency_summary.csv", index=False)